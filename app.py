@@ -1,26 +1,148 @@
 import os
+import re
+import sys
+import bisect
+import sqlite3
+import hashlib
 import uuid
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
+import secrets
+import threading
+import shutil
+import time
+import unicodedata
+from collections import namedtuple, deque, Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+from flask import Flask, Blueprint, render_template, request, url_for, session, jsonify, send_from_directory, g, has_request_context, abort, Response, before_render_template, template_rendered, current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, text, bindparam, create_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError, IntegrityError
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.pool import QueuePool
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 import json
+import click
 from functools import wraps
 
 # Configuración de la aplicación
-app = Flask(__name__)
-app.secret_key = 'clave_secreta_restaurante_2024'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///restaurante.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# ajustes guarda los valores por defecto, leídos del entorno al importar el
+# módulo. El módulo no crea ninguna app: create_app() arma una nueva, copia en
+# app.config los ajustes y los que reciba en config, y el resto del código lee
+# siempre current_app.config. Las cachés en memoria y las métricas sí son del
+# proceso; cada app valida las cachés contra sus propios archivos de versión
+# (VERSIONES_DIR), así que dos apps sobre bases distintas necesitan carpetas
+# de versión distintas.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
+ajustes = {}
+ajustes['SECRET_KEY'] = 'clave_secreta_restaurante_2024'
+ajustes['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///restaurante.db')
+ajustes['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+ajustes['UPLOAD_FOLDER'] = 'static/uploads'
+ajustes['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+ajustes['UPLOADS_MAX_AGE'] = 365 * 24 * 60 * 60  # 1 año de caché en el navegador
+# Los workers que solo atienden a clientes no registran el panel (PANEL_ADMIN=0)
+ajustes['PANEL_ADMIN'] = os.environ.get('PANEL_ADMIN', '1') == '1'
+# create_app() carga configuración, menú y costos antes de atender la primera petición
+ajustes['CALENTAR_CACHES'] = os.environ.get('CALENTAR_CACHES', '1') == '1'
 
-# Asegurar que la carpeta de uploads existe
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Hooks de todas las peticiones y comandos de flask; create_app() los registra
+# en cada app junto con las rutas
+nucleo = Blueprint('nucleo', __name__, cli_group=None)
+
+# Perfiles de base de datos
+# Con varios workers de gunicorn, SQLite necesita WAL y un busy timeout para
+# que las escrituras del panel y las de los clientes no choquen con
+# "database is locked". El perfil se elige con DB_PERFIL.
+PERFILES_BD = {
+    # Sin ajustes: el comportamiento por defecto de SQLite
+    'basico': {
+        'pragmas': {},
+        'engine': {},
+    },
+    'produccion': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,            # ms esperando un lock antes de fallar
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -16000,            # negativo = KiB (16 MB)
+            'temp_store': 'MEMORY',
+        },
+        'engine': {
+            'poolclass': QueuePool,
+            'pool_size': 5,
+            'max_overflow': 10,
+            'pool_timeout': 10,
+            'pool_recycle': 3600,
+            'connect_args': {'timeout': 5, 'check_same_thread': False},
+        },
+    },
+}
+ajustes['DB_PERFIL'] = os.environ.get('DB_PERFIL', 'produccion')
+# Pool aparte, de solo lectura, para las rutas públicas del menú
+ajustes['DB_POOL_LECTURA'] = os.environ.get('DB_POOL_LECTURA', '0') == '1'
+
+def _es_sqlite_en_archivo(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def _pragmas_sqlite(perfil):
+    """Oyente de 'connect' que aplica los pragmas del perfil a cada conexión SQLite"""
+    def aplicar_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        pragmas = dict(PERFILES_BD[perfil]['pragmas'])
+        if connection_record.info.get('solo_lectura'):
+            pragmas.pop('journal_mode', None)
+            pragmas['query_only'] = 'ON'
+        cursor = dbapi_connection.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+        cursor.close()
+    return aplicar_pragmas
 
 # Inicializar base de datos
-db = SQLAlchemy(app)
+db = SQLAlchemy()
+
+_engine_lectura_lock = threading.Lock()
+
+def engine_lectura():
+    """Engine con su propio pool que abre el mismo archivo en modo solo lectura"""
+    aplicacion = current_app._get_current_object()
+    engine = aplicacion.extensions.get('engine_lectura')
+    if engine is None:
+        with _engine_lectura_lock:
+            engine = aplicacion.extensions.get('engine_lectura')
+            if engine is None:
+                perfil = aplicacion.config['DB_PERFIL']
+                url = db.engine.url
+                url = url.set(database=f'file:{url.database}', query={'mode': 'ro', 'uri': 'true'})
+                engine = create_engine(url, **PERFILES_BD[perfil]['engine'])
+                event.listen(engine, 'connect', _pragmas_sqlite(perfil))
+                event.listen(engine, 'first_connect', _marcar_solo_lectura, insert=True)
+                event.listen(engine, 'connect', _marcar_solo_lectura, insert=True)
+                aplicacion.extensions['engine_lectura'] = engine
+    return engine
+
+def _marcar_solo_lectura(dbapi_connection, connection_record):
+    connection_record.info['solo_lectura'] = True
+
+@contextmanager
+def sesion_lectura():
+    """Sesión para consultas públicas; usa el pool de solo lectura si está activo"""
+    if not (current_app.config['DB_POOL_LECTURA'] and _es_sqlite_en_archivo(str(db.engine.url))):
+        yield db.session
+        return
+    with Session(engine_lectura()) as sesion:
+        yield sesion
 
 # Modelos de la base de datos
 class Configuracion(db.Model):
@@ -64,7 +186,9 @@ class Producto(db.Model):
     nombre = db.Column(db.String(100), nullable=False)
     precio_compra = db.Column(db.Float, nullable=False)
     unidad_medida = db.Column(db.String(50), nullable=False)
-    cantidad = db.Column(db.Float, nullable=False)
+    cantidad = db.Column(db.Float, nullable=False)  # presentación comprada por precio_compra
+    existencia = db.Column(db.Float)  # stock en unidad_medida; NULL si no se controla
+    stock_minimo = db.Column(db.Float, nullable=False, default=0.0)
     activo = db.Column(db.Boolean, default=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -75,6 +199,8 @@ class Producto(db.Model):
             'precio_compra': self.precio_compra,
             'unidad_medida': self.unidad_medida,
             'cantidad': self.cantidad,
+            'existencia': self.existencia,
+            'stock_minimo': self.stock_minimo,
             'activo': self.activo,
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None
         }
@@ -86,9 +212,11 @@ class Plato(db.Model):
     precio_venta = db.Column(db.Float, nullable=False)
     imagen = db.Column(db.String(200))
     activo = db.Column(db.Boolean, default=True)
+    agotado = db.Column(db.Boolean, nullable=False, default=False)  # desactivado por falta de stock
     categoria_id = db.Column(db.Integer, db.ForeignKey('categoria.id'))
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     ingredientes = db.relationship('IngredientePlato', backref='plato', lazy=True)
+    __table_args__ = (db.Index('ix_plato_activo_categoria', 'activo', 'categoria_id'),)
     
     def to_json(self):
         return {
@@ -105,8 +233,8 @@ class Plato(db.Model):
 
 class IngredientePlato(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    plato_id = db.Column(db.Integer, db.ForeignKey('plato.id'), nullable=False)
-    producto_id = db.Column(db.Integer, db.ForeignKey('producto.id'), nullable=False)
+    plato_id = db.Column(db.Integer, db.ForeignKey('plato.id'), nullable=False, index=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey('producto.id'), nullable=False, index=True)
     cantidad = db.Column(db.Float, nullable=False)
     producto = db.relationship('Producto', backref='ingredientes')
     
@@ -137,14 +265,17 @@ class Pedido(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(20), unique=True, nullable=False)
     cliente_nombre = db.Column(db.String(100))
-    cliente_telefono = db.Column(db.String(20), nullable=False)
+    cliente_telefono = db.Column(db.String(20), nullable=False, index=True)
     cliente_direccion = db.Column(db.Text, nullable=False)
     cliente_ubicacion = db.Column(db.Text)  # Coordenadas o referencia
     estado = db.Column(db.String(20), default='pendiente')  # pendiente, confirmado, preparando, enviado, entregado, cancelado
     total = db.Column(db.Float, nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    inventario_descontado = db.Column(db.Boolean, nullable=False, default=False)
     items = db.relationship('ItemPedido', backref='pedido', lazy=True)
     extras = db.relationship('ExtraPedido', backref='pedido', lazy=True)
+    __table_args__ = (db.Index('ix_pedido_estado_fecha', 'estado', 'fecha_creacion'),
+                      db.Index('ix_pedido_fecha', 'fecha_creacion'))
     
     def to_json(self):
         return {
@@ -163,8 +294,8 @@ class Pedido(db.Model):
 
 class ItemPedido(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False)
-    plato_id = db.Column(db.Integer, db.ForeignKey('plato.id'), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False, index=True)
+    plato_id = db.Column(db.Integer, db.ForeignKey('plato.id'), nullable=False, index=True)
     cantidad = db.Column(db.Integer, nullable=False)
     precio_unitario = db.Column(db.Float, nullable=False)
     personalizaciones = db.Column(db.Text)  # JSON con personalizaciones
@@ -183,8 +314,8 @@ class ItemPedido(db.Model):
 
 class ExtraPedido(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False)
-    extra_id = db.Column(db.Integer, db.ForeignKey('extra.id'), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False, index=True)
+    extra_id = db.Column(db.Integer, db.ForeignKey('extra.id'), nullable=False, index=True)
     cantidad = db.Column(db.Integer, nullable=False)
     precio_unitario = db.Column(db.Float, nullable=False)
     extra = db.relationship('Extra', backref='pedidos')
@@ -219,78 +350,1788 @@ class Usuario(db.Model):
             # No incluimos el password_hash por seguridad
         }
 
-# Decorador para requerir login
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+# Perfiles de carga
+# Cada ruta elige el perfil con las relaciones que va a recorrer, así los
+# to_json() y las plantillas no disparan una consulta por cada fila (N+1).
+PERFILES_CARGA = {
+    # Tarjetas del menú: ingredientes con su producto y la categoría
+    'carta': (
+        selectinload(Plato.ingredientes).joinedload(IngredientePlato.producto),
+        joinedload(Plato.categoria_obj),
+    ),
+    # Listado de categorías con el conteo de platos
+    'categorias': (
+        selectinload(Categoria.platos).load_only(Plato.id, Plato.categoria_id),
+    ),
+    # Detalle completo del pedido, suficiente para Pedido.to_json()
+    'detalle_pedido': (
+        selectinload(Pedido.items).joinedload(ItemPedido.plato)
+            .selectinload(Plato.ingredientes).joinedload(IngredientePlato.producto),
+        selectinload(Pedido.extras).joinedload(ExtraPedido.extra),
+    ),
+    # Ticket de cocina: solo qué platos y extras preparar
+    'ticket_cocina': (
+        selectinload(Pedido.items).joinedload(ItemPedido.plato)
+            .load_only(Plato.id, Plato.nombre, Plato.categoria_id),
+        selectinload(Pedido.extras).joinedload(ExtraPedido.extra),
+    ),
+}
 
-# Decorador para requerir admin
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        user = Usuario.query.get(session['user_id'])
-        if not user or user.rol != 'admin':
-            flash('Acceso denegado. Se requieren permisos de administrador.', 'error')
-            return redirect(url_for('index'))
-        return f(*args, **kwargs)
-    return decorated_function
+def con_perfil(query, perfil):
+    """Aplica a la consulta las opciones de carga del perfil indicado"""
+    return query.options(*PERFILES_CARGA[perfil])
 
-# Rutas de autenticación
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        user = Usuario.query.filter_by(username=username).first()
-        
-        if user and user.check_password(password):
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['rol'] = user.rol
-            flash('Inicio de sesión exitoso.', 'success')
-            return redirect(url_for('admin_panel'))
-        else:
-            flash('Usuario o contraseña incorrectos.', 'error')
-    
+# Presupuesto de sentencias SQL por endpoint
+# En modo debug se cuenta cada sentencia de la petición y se avisa en el log
+# cuando un endpoint supera su presupuesto (señal de un N+1 nuevo). Cada cifra
+# incluye reconstruir las cachés que usa el endpoint (menú, configuración,
+# costos, tablero de cocina), que es su peor caso; tests/test_presupuesto_sql.py
+# lo comprueba con las cachés vacías y llenas.
+PRESUPUESTO_SQL = {
+    'publico.index': 6,
+    'publico.api_platos': 6,
+    'publico.api_categorias': 5,
+    'publico.api_extras': 5,
+    'publico.api_buscar_platos': 6,
+    'publico.api_cotizar': 6,
+    'publico.realizar_pedido': 13,
+    'publico.confirmacion_pedido': 4,
+    'admin.admin_pedidos': 3,
+    'admin.admin_api_pedidos': 2,
+    'admin.admin_productos': 2,
+    'admin.admin_cocina': 6,
+    'admin.admin_api_cocina': 9,
+    'admin.admin_extras': 2,
+    'admin.ver_pedido': 6,
+    'admin.admin_platos': 6,
+    'admin.admin_categorias': 3,
+    'admin.admin_panel': 8,
+    'admin.admin_api_reporte_ventas': 2,
+}
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _contar_sentencia(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_sentencias = g.get('sql_sentencias', 0) + 1
+        if context is not None and 'perf_inicio' in g:
+            context._perf_inicio = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _medir_sentencia(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_perf_inicio', None)
+    if inicio is None or not has_request_context() or 'perf_inicio' not in g:
+        return
+    ms = (time.perf_counter() - inicio) * 1000
+    g.perf_sql += ms
+    if ms > g.perf_lenta[0]:
+        g.perf_lenta = (ms, statement)
+
+@nucleo.after_app_request
+def _verificar_presupuesto_sql(response):
+    if current_app.debug or current_app.config.get('SQL_PRESUPUESTO'):
+        limite = PRESUPUESTO_SQL.get(request.endpoint)
+        ejecutadas = g.get('sql_sentencias', 0)
+        if limite is not None and ejecutadas > limite:
+            current_app.logger.warning('%s ejecutó %d sentencias SQL (presupuesto: %d)',
+                               request.endpoint, ejecutadas, limite)
+    return response
+
+# Instrumentación de peticiones
+# Con PERFILADO=1 cada petición mide su duración total, el render de plantillas
+# y el SQL (sentencias, tiempo total y la más lenta, con los eventos del engine
+# de arriba). Se informa en la cabecera Server-Timing y se acumula en un
+# histograma en memoria por endpoint con ventanas de un minuto, que se consulta
+# en /admin/api/rendimiento (cada worker tiene el suyo). Si además hay un
+# PERFILADO_TOKEN, una petición con la cabecera X-Perfilar: <token> a una ruta
+# de PERFILADO_RUTAS (endpoints como publico.index) se muestrea con un
+# perfilador de pila y deja un archivo .folded en instance/perfiles, listo
+# para flamegraph.pl o speedscope. El muestreador corre en otro hilo, así que
+# no toma más de una muestra por intervalo de cambio del GIL (5 ms por
+# defecto) aunque se pida menos.
+ajustes['PERFILADO'] = os.environ.get('PERFILADO', '0') == '1'
+ajustes['PERFILADO_TOKEN'] = os.environ.get('PERFILADO_TOKEN')
+ajustes['PERFILADO_RUTAS'] = {r.strip() for r in os.environ.get('PERFILADO_RUTAS', '*').split(',') if r.strip()}
+ajustes['PERFILADO_INTERVALO'] = float(os.environ.get('PERFILADO_INTERVALO', 0.005))  # segundos entre muestras
+PERFILES_DIR = os.path.join(INSTANCE_DIR, 'perfiles')
+LIMITES_HISTOGRAMA = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # ms
+
+class HistogramaRodante:
+    """Duraciones por endpoint en ventanas de `duracion` segundos; conserva las últimas `ventanas`"""
+
+    def __init__(self, limites, ventanas=15, duracion=60):
+        self.limites = tuple(limites)
+        self.duracion = duracion
+        self.ventanas = ventanas
+        self._ventanas = deque(maxlen=ventanas)
+        self._lock = threading.Lock()
+
+    def registrar(self, endpoint, ms, sql_ms=0.0, sentencias=0, lenta=None):
+        inicio = int(time.time() // self.duracion) * self.duracion
+        with self._lock:
+            if not self._ventanas or self._ventanas[-1][0] != inicio:
+                self._ventanas.append((inicio, {}))
+            datos = self._ventanas[-1][1].get(endpoint)
+            if datos is None:
+                datos = self._ventanas[-1][1][endpoint] = {
+                    'cubetas': [0] * (len(self.limites) + 1), 'n': 0, 'total': 0.0, 'max': 0.0,
+                    'sql': 0.0, 'sentencias': 0, 'lenta': (0.0, None)}
+            datos['cubetas'][bisect.bisect_left(self.limites, ms)] += 1
+            datos['n'] += 1
+            datos['total'] += ms
+            datos['max'] = max(datos['max'], ms)
+            datos['sql'] += sql_ms
+            datos['sentencias'] += sentencias
+            if lenta and lenta[0] > datos['lenta'][0]:
+                datos['lenta'] = lenta
+
+    def _percentil(self, cubetas, n, q):
+        objetivo = q * n
+        acumulado = 0
+        for i, cantidad in enumerate(cubetas):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return self.limites[i] if i < len(self.limites) else None
+        return None
+
+    def resumen(self):
+        """Estadísticas por endpoint de las ventanas vigentes; los percentiles son el límite de la cubeta"""
+        corte = time.time() - self.duracion * self.ventanas
+        with self._lock:
+            ventanas = [datos for inicio, datos in self._ventanas if inicio >= corte]
+            acumulado = {}
+            for datos in ventanas:
+                for endpoint, d in datos.items():
+                    a = acumulado.setdefault(endpoint, {
+                        'cubetas': [0] * (len(self.limites) + 1), 'n': 0, 'total': 0.0, 'max': 0.0,
+                        'sql': 0.0, 'sentencias': 0, 'lenta': (0.0, None)})
+                    a['cubetas'] = [x + y for x, y in zip(a['cubetas'], d['cubetas'])]
+                    for clave in ('n', 'total', 'sql', 'sentencias'):
+                        a[clave] += d[clave]
+                    a['max'] = max(a['max'], d['max'])
+                    if d['lenta'][0] > a['lenta'][0]:
+                        a['lenta'] = d['lenta']
+        return {
+            endpoint: {
+                'peticiones': a['n'],
+                'promedio_ms': round(a['total'] / a['n'], 2),
+                'max_ms': round(a['max'], 2),
+                'p50_ms': self._percentil(a['cubetas'], a['n'], 0.5),
+                'p95_ms': self._percentil(a['cubetas'], a['n'], 0.95),
+                'p99_ms': self._percentil(a['cubetas'], a['n'], 0.99),
+                'sql_promedio_ms': round(a['sql'] / a['n'], 2),
+                'sentencias_promedio': round(a['sentencias'] / a['n'], 1),
+                'sql_mas_lenta_ms': round(a['lenta'][0], 2),
+                'sql_mas_lenta': a['lenta'][1],
+                'histograma': [{'hasta_ms': limite, 'peticiones': cantidad}
+                               for limite, cantidad in zip(self.limites + (None,), a['cubetas'])],
+            }
+            for endpoint, a in sorted(acumulado.items())
+        }
+
+histograma_peticiones = HistogramaRodante(LIMITES_HISTOGRAMA)
+
+class MuestreadorPila:
+    """Perfilador por muestreo de un hilo: cuenta sus pilas en formato folded"""
+
+    def __init__(self, hilo_id, intervalo):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='muestreador-pila', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._parar.set()
+        self._hilo.join()
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                frame = frame.f_back
+            if pila:
+                self.muestras[';'.join(reversed(pila))] += 1
+
+    def guardar(self, nombre):
+        os.makedirs(PERFILES_DIR, exist_ok=True)
+        with open(os.path.join(PERFILES_DIR, nombre), 'w', encoding='utf-8') as f:
+            for pila, cantidad in self.muestras.most_common():
+                f.write(f'{pila} {cantidad}\n')
+        return nombre
+
+def _perfilar_peticion():
+    token = current_app.config['PERFILADO_TOKEN']
+    rutas = current_app.config['PERFILADO_RUTAS']
+    return (token and secrets.compare_digest(request.headers.get('X-Perfilar', ''), token)
+            and ('*' in rutas or request.endpoint in rutas))
+
+@nucleo.before_app_request
+def _iniciar_perfilado():
+    if not current_app.config['PERFILADO']:
+        return
+    g.perf_inicio = time.perf_counter()
+    g.perf_sql = 0.0
+    g.perf_lenta = (0.0, None)
+    g.perf_plantillas = 0.0
+    if _perfilar_peticion():
+        g.perf_muestreador = MuestreadorPila(threading.get_ident(),
+                                             current_app.config['PERFILADO_INTERVALO']).iniciar()
+
+@before_render_template.connect
+def _inicio_plantilla(sender, template, context, **extra):
+    if 'perf_inicio' in g:
+        g.perf_plantilla_inicio = time.perf_counter()
+
+@template_rendered.connect
+def _fin_plantilla(sender, template, context, **extra):
+    inicio = g.pop('perf_plantilla_inicio', None)
+    if inicio is not None:
+        g.perf_plantillas += (time.perf_counter() - inicio) * 1000
+
+@nucleo.after_app_request
+def _registrar_perfilado(response):
+    inicio = g.pop('perf_inicio', None)
+    if inicio is None:
+        return response
+    total = (time.perf_counter() - inicio) * 1000
+    sentencias = g.get('sql_sentencias', 0)
+    lenta_ms, lenta = g.perf_lenta
+    response.headers['Server-Timing'] = ', '.join([
+        f'app;dur={total:.1f}',
+        f'sql;dur={g.perf_sql:.1f};desc="{sentencias} sentencias"',
+        f'sql-lenta;dur={lenta_ms:.1f}',
+        f'plantillas;dur={g.perf_plantillas:.1f}',
+    ])
+    endpoint = request.endpoint or 'sin_endpoint'
+    histograma_peticiones.registrar(endpoint, total, g.perf_sql, sentencias,
+                                    (lenta_ms, lenta[:500]) if lenta else None)
+    nombre = _guardar_muestreo()
+    if nombre:
+        response.headers['X-Perfil'] = nombre
+    return response
+
+@nucleo.teardown_app_request
+def _terminar_muestreo(error):
+    # Si la petición terminó con una excepción after_request puede no haber
+    # corrido; el hilo del muestreador no debe quedar tomando muestras
+    _guardar_muestreo()
+
+def _guardar_muestreo():
+    """Detiene el muestreador de la petición, si hay, y devuelve el nombre del perfil"""
+    muestreador = g.pop('perf_muestreador', None)
+    if muestreador is None:
+        return None
+    muestreador.detener()
+    endpoint = request.endpoint or 'sin_endpoint'
+    nombre = muestreador.guardar(f"{endpoint}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.folded")
+    current_app.logger.info('Perfil de %s guardado en %s (%d muestras)', endpoint, nombre,
+                    sum(muestreador.muestras.values()))
+    return nombre
+
+# Métricas para Prometheus
+# Contadores e histogramas de prometheus_client: cada proceso incrementa los
+# suyos en memoria, sin coordinarse con los demás. Con gunicorn, el archivo
+# gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR y cada worker escribe sus
+# valores en archivos mmap de esa carpeta; /metrics los suma al responder.
+# Sin prometheus_client instalado las métricas no hacen nada. /metrics exige
+# METRICAS_TOKEN; detrás de un proxy inverso todas las peticiones llegan desde
+# 127.0.0.1, así que la dirección de origen no sirve para restringirlo. Solo
+# con METRICAS_PUBLICAS=1 (una red donde nadie más llega al puerto) se sirve
+# sin token.
+try:
+    import prometheus_client as prom
+    from prometheus_client import multiprocess as prom_multiproceso
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # sin prometheus_client no hay /metrics
+    prom = None
+
+ajustes['METRICAS'] = prom is not None and os.environ.get('METRICAS', '1') == '1'
+ajustes['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+ajustes['METRICAS_PUBLICAS'] = os.environ.get('METRICAS_PUBLICAS', '0') == '1'
+# Una escritura que tarda más que esto casi siempre estuvo esperando el lock de SQLite
+ajustes['SQLITE_ESPERA_UMBRAL'] = float(os.environ.get('SQLITE_ESPERA_UMBRAL', 0.05))
+
+class _MetricaNula:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, cantidad=1):
+        pass
+
+    def observe(self, valor):
+        pass
+
+_METRICA_NULA = _MetricaNula()
+
+def _metrica(tipo, nombre, descripcion, etiquetas=(), **opciones):
+    if prom is None:
+        return _METRICA_NULA
+    return getattr(prom, tipo)(nombre, descripcion, etiquetas, **opciones)
+
+METRICA_DURACION = _metrica('Histogram', 'yekka_http_duracion_segundos', 'Duración de las peticiones',
+                            ('endpoint', 'metodo'),
+                            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+METRICA_RESPUESTAS = _metrica('Counter', 'yekka_http_respuestas', 'Respuestas por endpoint y código',
+                              ('endpoint', 'codigo'))
+METRICA_PEDIDOS = _metrica('Counter', 'yekka_pedidos_creados', 'Pedidos creados')
+METRICA_CAMBIOS_ESTADO = _metrica('Counter', 'yekka_pedidos_cambios_estado',
+                                  'Cambios de estado de pedidos, por estado nuevo', ('estado',))
+METRICA_CARRITO = _metrica('Histogram', 'yekka_carrito_unidades', 'Unidades del carrito al hacer el pedido',
+                           buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100))
+METRICA_CACHE = _metrica('Counter', 'yekka_cache_consultas', 'Consultas a las cachés en memoria',
+                         ('cache', 'resultado'))
+METRICA_SQLITE_ESPERAS = _metrica('Counter', 'yekka_sqlite_esperas_lock',
+                                  'Escrituras más lentas que SQLITE_ESPERA_UMBRAL (espera de lock)')
+METRICA_SQLITE_BLOQUEOS = _metrica('Counter', 'yekka_sqlite_bloqueos',
+                                   'Sentencias que fallaron con "database is locked"')
+METRICA_UPLOADS = _metrica('Counter', 'yekka_uploads_bytes', 'Bytes de imágenes recibidos y publicados',
+                           ('etapa',))
+
+_ESCRITURAS_SQL = ('INSERT', 'UPDATE', 'DELETE', 'REPLAC')
+
+def _medir_engine(engine, umbral):
+    """Cuenta las escrituras lentas (más de umbral segundos) y los bloqueos del engine"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _marcar_escritura(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and statement.lstrip()[:6].upper() in _ESCRITURAS_SQL:
+            context._metricas_inicio = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _medir_escritura(conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, '_metricas_inicio', None)
+        if inicio is not None and time.perf_counter() - inicio >= umbral:
+            METRICA_SQLITE_ESPERAS.inc()
+
+    @event.listens_for(engine, 'handle_error')
+    def _contar_bloqueo(contexto):
+        if 'database is locked' in str(contexto.original_exception):
+            METRICA_SQLITE_BLOQUEOS.inc()
+
+@nucleo.before_app_request
+def _iniciar_metricas():
+    if current_app.config['METRICAS']:
+        g.metricas_inicio = time.perf_counter()
+
+@nucleo.after_app_request
+def _registrar_metricas(response):
+    inicio = g.pop('metricas_inicio', None)
+    if inicio is not None:
+        endpoint = request.endpoint or 'desconocido'
+        METRICA_DURACION.labels(endpoint=endpoint, metodo=request.method).observe(
+            time.perf_counter() - inicio)
+        METRICA_RESPUESTAS.labels(endpoint=endpoint, codigo=str(response.status_code)).inc()
+    return response
+
+class ColectorPedidos:
+    """Pedidos por estado, leídos de la base al momento de cada scrape"""
+
+    def collect(self):
+        familia = GaugeMetricFamily('yekka_pedidos_por_estado', 'Pedidos por estado', labels=['estado'])
+        for estado, cantidad in db.session.query(Pedido.estado, func.count(Pedido.id)).group_by(Pedido.estado):
+            familia.add_metric([estado or 'sin_estado'], cantidad)
+        yield familia
+
+def acceso_metricas_permitido():
+    """Exige Authorization: Bearer METRICAS_TOKEN, salvo con METRICAS_PUBLICAS=1"""
+    token = current_app.config['METRICAS_TOKEN']
+    if token:
+        return secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return current_app.config['METRICAS_PUBLICAS']
+
+# Procesamiento de imágenes subidas
+# Las fotos llegan tal cual salen del teléfono: varios MB, con EXIF y a veces
+# con la ubicación. Se guardan primero en una carpeta del instance folder que
+# no se sirve y un hilo aparte las publica sin metadatos, junto con versiones
+# más chicas en WebP y JPEG para el srcset de las tarjetas del menú.
+#
+# El nombre publicado es el SHA-256 de lo subido, repartido en subcarpetas
+# (ab/cd/abcd….jpg): la misma foto subida dos veces, para otro plato o como
+# logo, se guarda una sola vez, y como un nombre nunca cambia de contenido se
+# puede cachear para siempre. Las rutas no borran archivos; `flask gc-uploads`
+# elimina los que ya no referencia ningún plato ni la configuración.
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # sin Pillow las imágenes se publican tal como llegan
+    Image = None
+
+IMAGEN_ANCHOS = (320, 640, 1024)
+IMAGEN_CALIDAD = 80
+IMAGENES_PENDIENTES = os.path.join(INSTANCE_DIR, 'imagenes_pendientes')
+_procesador_imagenes = ThreadPoolExecutor(max_workers=1, thread_name_prefix='imagenes')
+
+_VARIANTE_RE = re.compile(r'^(.+)\.\d+w\.(?:webp|jpg)$')
+
+def ruta_upload(nombre):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], nombre)
+
+def ruta_pendiente(nombre):
+    return os.path.join(IMAGENES_PENDIENTES, nombre)
+
+def nombre_por_contenido(digest, filename):
+    extension = os.path.splitext(secure_filename(filename))[1].lower()
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+def nombre_variante(nombre, ancho, extension):
+    return f'{os.path.splitext(nombre)[0]}.{ancho}w.{extension}'
+
+def srcset_imagen(nombre):
+    """srcset en WebP y JPEG con las variantes ya generadas, o None si no hay"""
+    if not nombre:
+        return None
+    srcset = {}
+    for formato, extension in (('webp', 'webp'), ('jpeg', 'jpg')):
+        partes = []
+        for ancho in IMAGEN_ANCHOS:
+            variante = nombre_variante(nombre, ancho, extension)
+            if os.path.exists(ruta_upload(variante)):
+                partes.append(f"{url_for('publico.uploaded_file', filename=variante)} {ancho}w")
+        if partes:
+            srcset[formato] = ', '.join(partes)
+    return srcset or None
+
+def _guardar_atomico(imagen, destino, formato, **opciones):
+    temporal = f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+    imagen.save(temporal, format=formato, **opciones)
+    os.replace(temporal, destino)
+    METRICA_UPLOADS.labels(etapa='publicado').inc(os.path.getsize(destino))
+
+def procesar_imagen(nombre):
+    """Publica la imagen sin metadatos y genera sus variantes; devuelve cuántos anchos generó"""
+    pendiente = ruta_pendiente(nombre)
+    destino = ruta_upload(nombre)
+    origen = pendiente if os.path.exists(pendiente) else destino
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    if Image is None:
+        if origen == pendiente:
+            shutil.move(pendiente, destino)
+        return 0
+    try:
+        with Image.open(origen) as original:
+            formato = original.format
+            imagen = ImageOps.exif_transpose(original)
+            imagen.load()
+    except (OSError, Image.DecompressionBombError):
+        current_app.logger.warning('No se pudo procesar la imagen %s; se publica sin cambios', nombre)
+        if origen == pendiente:
+            shutil.move(pendiente, destino)
+        return 0
+
+    # El original se reescribe sin EXIF (GIF animados y otros formatos se dejan igual)
+    if formato in ('JPEG', 'MPO'):
+        _guardar_atomico(imagen.convert('RGB'), destino, 'JPEG', quality=90, optimize=True)
+    elif formato in ('PNG', 'WEBP'):
+        _guardar_atomico(imagen, destino, formato)
+    elif origen == pendiente:
+        shutil.move(pendiente, destino)
+    if os.path.exists(pendiente):
+        os.remove(pendiente)
+
+    con_alfa = imagen.mode in ('RGBA', 'LA', 'P')
+    generadas = 0
+    for ancho in IMAGEN_ANCHOS:
+        if ancho >= imagen.width:
+            break
+        alto = round(imagen.height * ancho / imagen.width)
+        reducida = imagen.resize((ancho, alto), Image.LANCZOS, reducing_gap=3.0)
+        _guardar_atomico(reducida.convert('RGBA' if con_alfa else 'RGB'),
+                         ruta_upload(nombre_variante(nombre, ancho, 'webp')), 'WEBP',
+                         quality=IMAGEN_CALIDAD, method=4)
+        if con_alfa:
+            # JPEG no tiene transparencia: se apoya sobre fondo blanco
+            fondo = Image.new('RGB', reducida.size, 'white')
+            fondo.paste(reducida.convert('RGBA'), mask=reducida.convert('RGBA').split()[-1])
+            reducida = fondo
+        _guardar_atomico(reducida.convert('RGB'), ruta_upload(nombre_variante(nombre, ancho, 'jpg')),
+                         'JPEG', quality=IMAGEN_CALIDAD, optimize=True, progressive=True)
+        generadas += 1
+    return generadas
+
+def _procesar_en_segundo_plano(aplicacion, nombre):
+    with aplicacion.app_context():
+        try:
+            procesar_imagen(nombre)
+            invalidar_menu()
+        except Exception:
+            current_app.logger.exception('Error procesando la imagen %s', nombre)
+
+def guardar_imagen(archivo):
+    """Guarda la imagen subida bajo el hash de su contenido y encola su procesamiento
+
+    Si ese contenido ya estaba publicado (o en proceso) no se guarda otra vez.
+    Devuelve el nombre publicado.
+    """
+    os.makedirs(IMAGENES_PENDIENTES, exist_ok=True)
+    temporal = ruta_pendiente(f'subida-{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    with open(temporal, 'wb') as destino:
+        for bloque in iter(lambda: archivo.stream.read(1 << 16), b''):
+            digest.update(bloque)
+            destino.write(bloque)
+        METRICA_UPLOADS.labels(etapa='recibido').inc(destino.tell())
+    nombre = nombre_por_contenido(digest.hexdigest(), archivo.filename)
+    pendiente = ruta_pendiente(nombre)
+    existente = False
+    for ruta in (ruta_upload(nombre), pendiente):
+        try:
+            # Renueva el mtime para que gc-uploads --gracia no lo borre antes
+            # de que se guarde la fila que lo referencia
+            os.utime(ruta)
+            existente = True
+        except FileNotFoundError:
+            pass
+    if existente:
+        os.remove(temporal)
+        return nombre
+    os.makedirs(os.path.dirname(pendiente), exist_ok=True)
+    os.replace(temporal, pendiente)
+    _procesador_imagenes.submit(_procesar_en_segundo_plano, current_app._get_current_object(), nombre)
+    return nombre
+
+def _listar_archivos(raiz):
+    """Rutas relativas (con /) de todos los archivos bajo raiz"""
+    for carpeta, _, archivos in os.walk(raiz):
+        for archivo in archivos:
+            ruta = os.path.join(carpeta, archivo)
+            yield os.path.relpath(ruta, raiz).replace(os.sep, '/'), ruta
+
+def referencias_uploads():
+    """Cuántas filas referencian cada archivo subido"""
+    referencias = Counter(imagen for (imagen,) in db.session.query(Plato.imagen).filter(Plato.imagen != None))
+    referencias.update(logo for (logo,) in db.session.query(Configuracion.logo).filter(Configuracion.logo != None))
+    return referencias
+
+@nucleo.cli.command('procesar-imagenes')
+def procesar_imagenes_comando():
+    """Publica las imágenes pendientes y genera las variantes que falten"""
+    nombres = {nombre for nombre, _ in _listar_archivos(IMAGENES_PENDIENTES) if not nombre.endswith('.tmp')}
+    nombres.update(imagen for (imagen,) in db.session.query(Plato.imagen).filter(Plato.imagen != None))
+    generadas = sum(procesar_imagen(nombre) for nombre in sorted(nombres)
+                    if os.path.exists(ruta_pendiente(nombre)) or os.path.exists(ruta_upload(nombre)))
+    invalidar_menu()
+    print(f'{len(nombres)} imágenes revisadas, {generadas} anchos generados en WebP y JPEG.')
+
+@nucleo.cli.command('gc-uploads')
+@click.option('--gracia', default=60, show_default=True,
+              help='Minutos durante los que se respeta un archivo recién subido.')
+@click.option('--simular', is_flag=True, help='Solo lista lo que se borraría.')
+def gc_uploads_comando(gracia, simular):
+    """Borra las imágenes subidas que ya no referencia ningún plato ni el logo"""
+    referencias = referencias_uploads()
+    # Las variantes viven mientras su original tenga alguna referencia
+    bases = Counter()
+    for nombre, cantidad in referencias.items():
+        bases[os.path.splitext(nombre)[0]] += cantidad
+    limite = time.time() - gracia * 60
+
+    borrados, liberados = 0, 0
+    for raiz in (current_app.config['UPLOAD_FOLDER'], IMAGENES_PENDIENTES):
+        for nombre, ruta in list(_listar_archivos(raiz)):
+            if os.path.basename(nombre).startswith('.'):
+                continue
+            variante = _VARIANTE_RE.match(nombre)
+            en_uso = bases[variante.group(1)] if variante else referencias[nombre]
+            if en_uso or os.path.getmtime(ruta) > limite:
+                continue
+            liberados += os.path.getsize(ruta)
+            borrados += 1
+            print(f'{"Se borraría" if simular else "Borrado"}: {ruta}')
+            if not simular:
+                os.remove(ruta)
+        if not simular:
+            # Subcarpetas de shards que quedaron vacías
+            for carpeta, subcarpetas, archivos in os.walk(raiz, topdown=False):
+                if carpeta != raiz and not subcarpetas and not archivos:
+                    os.rmdir(carpeta)
+
+    faltantes = sorted(nombre for nombre in referencias
+                       if nombre != 'logo.png' and not os.path.exists(ruta_upload(nombre))
+                       and not os.path.exists(ruta_pendiente(nombre)))
+    for nombre in faltantes:
+        print(f'Referencia sin archivo: {nombre} ({referencias[nombre]} filas)')
+    print(f'{borrados} archivos {"por borrar" if simular else "borrados"}, '
+          f'{liberados / 1024 / 1024:.1f} MB, {len(faltantes)} referencias sin archivo.')
+
+# Proyecciones públicas
+# Las rutas públicas solo exponen los campos de la tarjeta del menú: nada de
+# precio de compra, stock ni fechas de los productos. Las filas se arman
+# directamente desde tuplas de columnas, sin instanciar objetos del ORM.
+CAMPOS_PUBLICOS_PLATO = ('id', 'nombre', 'descripcion', 'precio_venta', 'imagen',
+                         'imagen_url', 'imagen_srcset', 'categoria_id', 'ingredientes')
+CAMPOS_PUBLICOS_CATEGORIA = ('id', 'nombre', 'descripcion', 'activa', 'platos_count')
+
+def url_imagen_plato(imagen):
+    if imagen:
+        return url_for('publico.uploaded_file', filename=imagen)
+    return url_for('static', filename='images/default-dish.jpg')
+
+def proyectar_platos_publicos(sesion):
+    """Filas públicas de los platos activos, con ingredientes sin datos de costo"""
+    ingredientes = {}
+    consulta_ingredientes = (
+        sesion.query(IngredientePlato.plato_id, Producto.nombre,
+                         IngredientePlato.cantidad, Producto.unidad_medida)
+        .join(Producto, IngredientePlato.producto_id == Producto.id)
+        .join(Plato, IngredientePlato.plato_id == Plato.id)
+        .filter(Plato.activo == True)
+        .order_by(IngredientePlato.id)
+    )
+    for plato_id, nombre, cantidad, unidad_medida in consulta_ingredientes:
+        ingredientes.setdefault(plato_id, []).append(
+            {'nombre': nombre, 'cantidad': cantidad, 'unidad_medida': unidad_medida})
+
+    consulta_platos = (
+        sesion.query(Plato.id, Plato.nombre, Plato.descripcion, Plato.precio_venta,
+                         Plato.imagen, Plato.categoria_id)
+        .filter(Plato.activo == True)
+        .order_by(Plato.id)
+    )
+    return [
+        {
+            'id': plato_id,
+            'nombre': nombre,
+            'descripcion': descripcion,
+            'precio_venta': precio_venta,
+            'imagen': imagen,
+            'imagen_url': url_imagen_plato(imagen),
+            'imagen_srcset': srcset_imagen(imagen),
+            'categoria_id': categoria_id,
+            'ingredientes': ingredientes.get(plato_id, []),
+        }
+        for plato_id, nombre, descripcion, precio_venta, imagen, categoria_id in consulta_platos
+    ]
+
+def proyectar_categorias_publicas(sesion):
+    conteos = dict(sesion.query(Plato.categoria_id, func.count(Plato.id))
+                   .group_by(Plato.categoria_id))
+    consulta = (
+        sesion.query(Categoria.id, Categoria.nombre, Categoria.descripcion, Categoria.activa)
+        .order_by(Categoria.id)
+    )
+    return [
+        {
+            'id': categoria_id,
+            'nombre': nombre,
+            'descripcion': descripcion,
+            'activa': activa,
+            'platos_count': conteos.get(categoria_id, 0),
+        }
+        for categoria_id, nombre, descripcion, activa in consulta
+    ]
+
+def seleccionar_campos(filas, disponibles):
+    """Recorta las filas a los campos pedidos en ?fields=a,b,c
+
+    Devuelve (filas, None) o (None, error) si se pide un campo desconocido.
+    """
+    fields = request.args.get('fields', '')
+    campos = [c.strip() for c in fields.split(',') if c.strip()]
+    if not campos:
+        return filas, None
+    desconocidos = [c for c in campos if c not in disponibles]
+    if desconocidos:
+        return None, f"Campos no soportados: {', '.join(desconocidos)}"
+    return [{c: fila[c] for c in campos} for fila in filas], None
+
+# Búsqueda de texto completo (SQLite FTS5)
+# Índice de los platos activos por nombre, descripción y categoría. El
+# tokenizador unicode61 con remove_diacritics hace que "jamon" encuentre
+# "jamón", y cada palabra de la consulta se busca como prefijo.
+FTS_TABLA = 'plato_fts'
+_fts_disponible = None
+_PALABRA_RE = re.compile(r'\w+', re.UNICODE)
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes, para comparar igual que el índice FTS"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+def fts_disponible():
+    global _fts_disponible
+    if _fts_disponible is None:
+        _fts_disponible = db.engine.dialect.name == 'sqlite' and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"),
+            {'nombre': FTS_TABLA}
+        ).first() is not None
+    return _fts_disponible
+
+def crear_indice_busqueda():
+    """Crea la tabla FTS5 si el motor la soporta y la llena si está vacía"""
+    global _fts_disponible
+    if db.engine.dialect.name != 'sqlite':
+        _fts_disponible = False
+        return
+    try:
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLA} "
+            f"USING fts5(nombre, descripcion, categoria, tokenize='unicode61 remove_diacritics 2')"
+        ))
+    except OperationalError:
+        # SQLite compilado sin FTS5: se usa la búsqueda en memoria del menú
+        db.session.rollback()
+        _fts_disponible = False
+        return
+    _fts_disponible = True
+    if not db.session.execute(text(f'SELECT count(*) FROM {FTS_TABLA}')).scalar():
+        indexar_platos()
+    db.session.commit()
+
+def indexar_platos(plato_ids=None):
+    """Actualiza el índice de búsqueda dentro de la transacción en curso
+
+    Con plato_ids solo se reindexan esos platos (los inactivos o eliminados
+    salen del índice); sin argumentos se reconstruye completo.
+    """
+    if not fts_disponible():
+        return
+    consulta = (
+        db.session.query(Plato.id, Plato.nombre, Plato.descripcion, Categoria.nombre)
+        .outerjoin(Categoria, Plato.categoria_id == Categoria.id)
+        .filter(Plato.activo == True)
+    )
+    if plato_ids is None:
+        db.session.execute(text(f'DELETE FROM {FTS_TABLA}'))
+    else:
+        plato_ids = list(plato_ids)
+        if not plato_ids:
+            return
+        db.session.execute(
+            text(f'DELETE FROM {FTS_TABLA} WHERE rowid IN :ids').bindparams(bindparam('ids', expanding=True)),
+            {'ids': plato_ids}
+        )
+        consulta = consulta.filter(Plato.id.in_(plato_ids))
+    filas = [
+        {'rowid': plato_id, 'nombre': nombre, 'descripcion': descripcion or '', 'categoria': categoria or ''}
+        for plato_id, nombre, descripcion, categoria in consulta
+    ]
+    if filas:
+        db.session.execute(
+            text(f'INSERT INTO {FTS_TABLA}(rowid, nombre, descripcion, categoria) '
+                 f'VALUES (:rowid, :nombre, :descripcion, :categoria)'),
+            filas
+        )
+
+def consulta_fts(texto):
+    """Convierte lo que escribe el cliente en una consulta FTS5 segura por prefijos"""
+    return ' '.join(f'"{palabra}"*' for palabra in _PALABRA_RE.findall(texto))
+
+@lru_cache(maxsize=1024)
+def _buscar_ids(version, consulta, limite):
+    with sesion_lectura() as sesion:
+        filas = sesion.execute(
+            text(f'SELECT rowid FROM {FTS_TABLA} WHERE {FTS_TABLA} MATCH :consulta '
+                 f'ORDER BY bm25({FTS_TABLA}, 10.0, 1.0, 4.0) LIMIT :limite'),
+            {'consulta': consulta, 'limite': limite}
+        )
+        return tuple(fila[0] for fila in filas)
+
+def buscar_platos(texto, version, limite=-1):
+    """ids de platos ordenados por relevancia, o None si no hay índice FTS
+
+    Los resultados se cachean por versión del menú, así las consultas
+    repetidas al escribir no vuelven a la base de datos.
+    """
+    if not fts_disponible():
+        return None
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return ()
+    return _buscar_ids(version, consulta, limite)
+
+# Caché del menú en memoria
+# La carta cambia pocas veces al día: las rutas públicas leen de una instantánea
+# inmutable que solo se reconstruye cuando el panel de administración la modifica.
+# La versión se guarda en un archivo del instance folder para que todos los
+# workers de gunicorn detecten el cambio sin consultar la base de datos.
+ajustes['VERSIONES_DIR'] = os.environ.get('VERSIONES_DIR', INSTANCE_DIR)
+
+CategoriaMenu = namedtuple('CategoriaMenu', ['id', 'nombre', 'descripcion', 'activa', 'json'])
+PlatoMenu = namedtuple('PlatoMenu', ['id', 'nombre', 'descripcion', 'precio_venta', 'imagen',
+                                     'imagen_url', 'imagen_srcset', 'categoria_id', 'json'])
+
+class MenuSnapshot:
+    """Instantánea de solo lectura de categorías, platos activos y extras"""
+
+    def __init__(self, version, categorias, platos, extras, modificado=None):
+        self.version = version
+        self.modificado = modificado
+        self.categorias = tuple(categorias)
+        self.categorias_activas = tuple(c for c in self.categorias if c.activa)
+        self.platos = tuple(platos)
+        self.extras = tuple(extras)
+        self._por_id = {plato.id: plato for plato in self.platos}
+        # Índice de precios para el motor de cotización
+        self.extras_por_id = {extra['id']: extra for extra in self.extras}
+
+        por_categoria = {}
+        for plato in self.platos:
+            por_categoria.setdefault(plato.categoria_id, []).append(plato)
+        self._por_categoria = {k: tuple(v) for k, v in por_categoria.items()}
+
+        nombres_categoria = {c.id: c.nombre for c in self.categorias}
+        self._textos = {
+            plato.id: normalizar_texto(' '.join(filter(None, [
+                plato.nombre, plato.descripcion, nombres_categoria.get(plato.categoria_id)])))
+            for plato in self.platos
+        }
+
+    def plato(self, plato_id):
+        """Plato activo por id, o None"""
+        return self._por_id.get(plato_id)
+
+    def filtrar(self, categoria_id=None, search='', limite=-1):
+        """Filtra los platos por categoría y texto
+
+        Con texto, los platos salen ordenados por relevancia según el índice
+        FTS; si no existe, se busca por prefijos sobre la instantánea.
+        """
+        if not search:
+            platos = self._por_categoria.get(categoria_id, ()) if categoria_id else self.platos
+            return platos if limite < 0 else platos[:limite]
+
+        ids = buscar_platos(search, self.version)
+        if ids is None:
+            palabras = _PALABRA_RE.findall(normalizar_texto(search))
+            ids = [
+                plato_id for plato_id, texto in self._textos.items()
+                if all(re.search(r'\b' + re.escape(p), texto) for p in palabras)
+            ]
+        platos = (self._por_id[i] for i in ids if i in self._por_id)
+        if categoria_id:
+            platos = (p for p in platos if p.categoria_id == categoria_id)
+        platos = tuple(platos)
+        return platos if limite < 0 else platos[:limite]
+
+_menu_lock = threading.Lock()
+_menu_snapshot = None
+
+def archivo_version(nombre, aplicacion=None):
+    """Ruta de nombre.version en la carpeta de versiones de la app (la actual por defecto)"""
+    return os.path.join((aplicacion or current_app).config['VERSIONES_DIR'], f'{nombre}.version')
+
+def _leer_version(ruta):
+    """Versión publicada en un archivo de versión y su fecha de modificación"""
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return '0', None
+    modificado = datetime.utcfromtimestamp(int(estado.st_mtime))
+    return f'{estado.st_ino:x}-{estado.st_mtime_ns:x}', modificado
+
+def _publicar_version(ruta):
+    # Reemplazo atómico: cambia el inodo y la fecha, que es lo que leen los workers
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'w') as f:
+        f.write(datetime.utcnow().isoformat())
+    os.replace(temporal, ruta)
+
+def _construir_menu(version, modificado):
+    with sesion_lectura() as sesion:
+        categorias = [
+            CategoriaMenu(c['id'], c['nombre'], c['descripcion'], c['activa'], c)
+            for c in proyectar_categorias_publicas(sesion)
+        ]
+        platos = [
+            PlatoMenu(p['id'], p['nombre'], p['descripcion'], p['precio_venta'], p['imagen'],
+                      p['imagen_url'], p['imagen_srcset'], p['categoria_id'], p)
+            for p in proyectar_platos_publicos(sesion)
+        ]
+        extras = [
+            {'id': extra_id, 'nombre': nombre, 'precio': precio, 'activo': activo}
+            for extra_id, nombre, precio, activo in
+            sesion.query(Extra.id, Extra.nombre, Extra.precio, Extra.activo)
+            .filter(Extra.activo == True).order_by(Extra.id)
+        ]
+    return MenuSnapshot(version, categorias, platos, extras, modificado)
+
+def obtener_menu():
+    """Devuelve la instantánea vigente del menú, reconstruyéndola si cambió"""
+    global _menu_snapshot
+    version, modificado = _leer_version(archivo_version('menu'))
+    snapshot = _menu_snapshot
+    if snapshot is not None and snapshot.version == version:
+        METRICA_CACHE.labels(cache='menu', resultado='acierto').inc()
+        return snapshot
+    with _menu_lock:
+        if _menu_snapshot is None or _menu_snapshot.version != version:
+            METRICA_CACHE.labels(cache='menu', resultado='fallo').inc()
+            _menu_snapshot = _construir_menu(version, modificado)
+        return _menu_snapshot
+
+def invalidar_menu():
+    """Publica una nueva versión del menú; llamar después del commit"""
+    global _menu_snapshot
+    _publicar_version(archivo_version('menu'))
+    _menu_snapshot = None
+
+# Configuración del restaurante en caché
+# Casi todas las páginas muestran la configuración; se lee una vez por proceso
+# y solo se vuelve a cargar cuando admin_configuracion la guarda. Se expone a
+# las plantillas como `config` mediante un context processor.
+ConfiguracionActual = namedtuple('ConfiguracionActual', ['id', 'nombre_restaurante', 'telefono', 'direccion',
+                                                         'logo', 'impuesto', 'max_extras', 'version'])
+
+_config_lock = threading.Lock()
+_config_actual = None
+
+def asegurar_configuracion():
+    """Devuelve la fila de configuración, creándola la primera vez"""
     config = Configuracion.query.first()
     if not config:
         config = Configuracion()
         db.session.add(config)
         db.session.commit()
-    return render_template('login.html',config=config)
+    return config
+
+def obtener_configuracion():
+    """Configuración vigente (de solo lectura), cacheada por proceso y por petición"""
+    global _config_actual
+    if has_request_context() and 'config_actual' in g:
+        return g.config_actual
+    version, _ = _leer_version(archivo_version('config'))
+    config = _config_actual
+    if config is None or config.version != version:
+        with _config_lock:
+            if _config_actual is None or _config_actual.version != version:
+                METRICA_CACHE.labels(cache='configuracion', resultado='fallo').inc()
+                fila = asegurar_configuracion().to_json()
+                _config_actual = ConfiguracionActual(version=version, **fila)
+            config = _config_actual
+    else:
+        METRICA_CACHE.labels(cache='configuracion', resultado='acierto').inc()
+    if has_request_context():
+        g.config_actual = config
+    return config
+
+def invalidar_configuracion():
+    """Publica una nueva versión de la configuración; llamar después del commit"""
+    global _config_actual
+    _publicar_version(archivo_version('config'))
+    _config_actual = None
+    g.pop('config_actual', None)
+
+@nucleo.app_context_processor
+def inyectar_configuracion():
+    return {'config': obtener_configuracion(), 'panel_admin': 'admin' in current_app.blueprints}
+
+# Peticiones condicionales
+# Las rutas del menú publican la versión del menú como ETag y Last-Modified:
+# si el navegador ya tiene esa versión se responde 304 sin generar el cuerpo.
+def menu_condicional(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Los mensajes flash se consumen al renderizar: esa respuesta no se cachea
+        if '_flashes' in session:
+            return f(*args, **kwargs)
+
+        menu_actual = obtener_menu()
+        partes = [menu_actual.version, request.full_path,
+                  request.headers.get('X-Requested-With', ''), 'user_id' in session]
+        etag = hashlib.sha1('|'.join(map(str, partes)).encode()).hexdigest()
+        if not is_resource_modified(request.environ, etag=etag, last_modified=menu_actual.modificado):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(f(*args, **kwargs))
+        response.set_etag(etag)
+        if menu_actual.modificado:
+            response.last_modified = menu_actual.modificado
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        response.vary.add('X-Requested-With')
+        return response
+    return decorated_function
+
+# Motor de precios
+# El servidor es la única fuente de verdad de los precios: del carrito del
+# cliente solo se toma qué platos, cuántos y qué extras. Los precios salen del
+# índice de la instantánea del menú, sin consultar la base de datos.
+MAX_CANTIDAD_POR_PLATO = 99
+
+class CotizacionInvalida(ValueError):
+    """El carrito no se puede cotizar: plato no disponible, demasiados extras..."""
+
+def _leer_carrito(carrito):
+    # El carrito de localStorage puede llegar como texto JSON o ya decodificado
+    if isinstance(carrito, str):
+        try:
+            carrito = json.loads(carrito or '[]')
+        except ValueError:
+            raise CotizacionInvalida('El carrito no es válido')
+    if not isinstance(carrito, list):
+        raise CotizacionInvalida('El carrito no es válido')
+    return carrito
+
+def cotizar_pedido(carrito, extras_ids=()):
+    """Precia un carrito completo en una sola pasada
+
+    Devuelve el desglose por línea y por extra, el subtotal, el impuesto de
+    la configuración y el total. Lanza CotizacionInvalida si algo no cuadra.
+    """
+    menu_actual = obtener_menu()
+    config = obtener_configuracion()
+
+    lineas = []
+    for item in _leer_carrito(carrito):
+        try:
+            plato_id = int(item.get('plato_id', item.get('id')))
+            cantidad = int(item.get('cantidad', 1))
+        except (AttributeError, TypeError, ValueError):
+            raise CotizacionInvalida('Hay un item del carrito que no es válido')
+        plato = menu_actual.plato(plato_id)
+        if plato is None:
+            raise CotizacionInvalida(f'El plato {plato_id} ya no está disponible')
+        if not 1 <= cantidad <= MAX_CANTIDAD_POR_PLATO:
+            raise CotizacionInvalida(f'Cantidad no válida para {plato.nombre}')
+        lineas.append({
+            'plato_id': plato.id,
+            'nombre': plato.nombre,
+            'categoria_id': plato.categoria_id,
+            'cantidad': cantidad,
+            'precio_unitario': plato.precio_venta,
+            'importe': round(plato.precio_venta * cantidad, 2),
+            'personalizaciones': item.get('personalizaciones') or {},
+        })
+    if not lineas:
+        raise CotizacionInvalida('El carrito está vacío')
+
+    try:
+        extras_ids = list(dict.fromkeys(int(extra_id) for extra_id in extras_ids or () if extra_id))
+    except (TypeError, ValueError):
+        raise CotizacionInvalida('Hay un extra que no es válido')
+    if len(extras_ids) > config.max_extras:
+        raise CotizacionInvalida(f'Solo puedes seleccionar hasta {config.max_extras} extras')
+    extras = []
+    for extra_id in extras_ids:
+        extra = menu_actual.extras_por_id.get(extra_id)
+        if extra is None:
+            raise CotizacionInvalida(f'El extra {extra_id} ya no está disponible')
+        extras.append({
+            'extra_id': extra_id,
+            'nombre': extra['nombre'],
+            'cantidad': 1,
+            'precio_unitario': extra['precio'],
+            'importe': extra['precio'],
+        })
+
+    subtotal = round(sum(l['importe'] for l in lineas) + sum(e['importe'] for e in extras), 2)
+    porcentaje = config.impuesto or 0.0
+    impuesto = round(subtotal * porcentaje / 100, 2)
+    return {
+        'lineas': lineas,
+        'extras': extras,
+        'subtotal': subtotal,
+        'impuesto_porcentaje': porcentaje,
+        'impuesto': impuesto,
+        'total': round(subtotal + impuesto, 2),
+    }
+
+# Alta de pedidos en bloque
+# El pedido se inserta con sentencias Core en una transacción corta: la
+# cabecera, todas sus líneas en un solo executemany y los extras en otro,
+# sin crear objetos del ORM ni pasar por el identity map.
+def insertar_pedido(cotizacion, cliente):
+    """Guarda un pedido ya cotizado y devuelve (id, código)"""
+    codigo = str(uuid.uuid4())[:8].upper()
+    fecha = datetime.utcnow()
+    descontar = descuenta_inventario('pendiente')
+    cambio = None
+    try:
+        resultado = db.session.execute(Pedido.__table__.insert().values(
+            codigo=codigo,
+            fecha_creacion=fecha,
+            cliente_nombre=cliente.get('nombre'),
+            cliente_telefono=cliente['telefono'],
+            cliente_direccion=cliente['direccion'],
+            cliente_ubicacion=cliente.get('ubicacion'),
+            total=cotizacion['total'],
+            inventario_descontado=descontar,
+        ))
+        pedido_id = resultado.inserted_primary_key[0]
+        db.session.execute(ItemPedido.__table__.insert(), [
+            {
+                'pedido_id': pedido_id,
+                'plato_id': linea['plato_id'],
+                'cantidad': linea['cantidad'],
+                'precio_unitario': linea['precio_unitario'],
+                'personalizaciones': json.dumps(linea['personalizaciones']),
+            }
+            for linea in cotizacion['lineas']
+        ])
+        if cotizacion['extras']:
+            db.session.execute(ExtraPedido.__table__.insert(), [
+                {
+                    'pedido_id': pedido_id,
+                    'extra_id': extra['extra_id'],
+                    'cantidad': extra['cantidad'],
+                    'precio_unitario': extra['precio_unitario'],
+                }
+                for extra in cotizacion['extras']
+            ])
+        registrar_evento('pedido_creado', pedido_id, {
+            'codigo': codigo,
+            'cliente_nombre': cliente.get('nombre'),
+            'cliente_telefono': cliente['telefono'],
+            'estado': 'pendiente',
+            'total': cotizacion['total'],
+            'fecha_creacion': fecha.isoformat(),
+            'lineas': [
+                {key: linea[key] for key in ('plato_id', 'nombre', 'categoria_id', 'cantidad',
+                                             'personalizaciones')}
+                for linea in cotizacion['lineas']
+            ],
+            'extras': [
+                {key: extra[key] for key in ('extra_id', 'nombre', 'cantidad')}
+                for extra in cotizacion['extras']
+            ],
+        })
+        acumular_ventas(variacion_ventas(
+            fecha, cotizacion['total'],
+            sum(extra['importe'] for extra in cotizacion['extras']),
+            [(linea['plato_id'], linea['cantidad'], linea['importe']) for linea in cotizacion['lineas']]))
+        if descontar:
+            cambio = mover_inventario(pedido_id, [(linea['plato_id'], linea['cantidad'])
+                                                  for linea in cotizacion['lineas']], 1)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    notificar_eventos()
+    if cambio:
+        publicar_cambio_inventario(cambio)
+    METRICA_PEDIDOS.inc()
+    METRICA_CARRITO.observe(sum(linea['cantidad'] for linea in cotizacion['lineas']))
+    return pedido_id, codigo
+
+# Resúmenes de ventas
+# Las ventas se acumulan por hora, por día y por plato y día en el momento en
+# que cambian: al crear el pedido y cuando entra o sale del estado cancelado.
+# Los reportes suman unas pocas filas de estos resúmenes en lugar de recorrer
+# pedido e item_pedido. Todo se agrupa por la fecha de creación del pedido
+# (UTC); `flask backfill-ventas` reconstruye los resúmenes desde el historial.
+class ColumnasVenta:
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Float, nullable=False, default=0.0)  # total cobrado, con impuesto
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos_extras = db.Column(db.Float, nullable=False, default=0.0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    importe_cancelado = db.Column(db.Float, nullable=False, default=0.0)
+
+class VentaHora(ColumnasVenta, db.Model):
+    __tablename__ = 'venta_hora'
+    hora = db.Column(db.DateTime, primary_key=True)
+
+class VentaDia(ColumnasVenta, db.Model):
+    __tablename__ = 'venta_dia'
+    fecha = db.Column(db.Date, primary_key=True)
+
+class VentaPlatoDia(db.Model):
+    __tablename__ = 'venta_plato_dia'
+    fecha = db.Column(db.Date, primary_key=True)
+    plato_id = db.Column(db.Integer, primary_key=True)  # sin FK: el historial sobrevive al plato
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Float, nullable=False, default=0.0)  # importe de las líneas, sin impuesto
+    cancelados = db.Column(db.Integer, nullable=False, default=0)  # unidades canceladas
+
+RESUMENES_VENTAS = (VentaHora, VentaDia, VentaPlatoDia)
+
+def variacion_ventas(fecha, total, ingresos_extras, lineas, ventas=1, cancelaciones=0):
+    """Filas que un pedido suma a cada resumen, como {modelo: [filas]}
+
+    lineas es una lista de (plato_id, cantidad, importe). ventas y
+    cancelaciones multiplican lo que el pedido aporta a cada lado: un alta es
+    (1, 0), una cancelación (-1, 1) y una reactivación (1, -1).
+    """
+    dia = fecha.date()
+    totales = {
+        'pedidos': ventas,
+        'ingresos': ventas * total,
+        'unidades': ventas * sum(cantidad for _, cantidad, _ in lineas),
+        'ingresos_extras': ventas * ingresos_extras,
+        'cancelados': cancelaciones,
+        'importe_cancelado': cancelaciones * total,
+    }
+    platos = {}
+    for plato_id, cantidad, importe in lineas:
+        fila = platos.setdefault(plato_id, {'fecha': dia, 'plato_id': plato_id,
+                                            'unidades': 0, 'ingresos': 0.0, 'cancelados': 0})
+        fila['unidades'] += ventas * cantidad
+        fila['ingresos'] += ventas * importe
+        fila['cancelados'] += cancelaciones * cantidad
+    return {
+        VentaHora: [dict(totales, hora=fecha.replace(minute=0, second=0, microsecond=0))],
+        VentaDia: [dict(totales, fecha=dia)],
+        VentaPlatoDia: list(platos.values()),
+    }
+
+def variacion_pedido(pedido, ventas, cancelaciones):
+    """variacion_ventas() de un pedido ya guardado, leyendo sus líneas y extras"""
+    lineas = db.session.query(ItemPedido.plato_id, ItemPedido.cantidad,
+                              ItemPedido.cantidad * ItemPedido.precio_unitario
+                              ).filter(ItemPedido.pedido_id == pedido.id).all()
+    ingresos_extras = db.session.query(
+        func.coalesce(func.sum(ExtraPedido.cantidad * ExtraPedido.precio_unitario), 0.0)
+    ).filter(ExtraPedido.pedido_id == pedido.id).scalar()
+    return variacion_ventas(pedido.fecha_creacion, pedido.total, ingresos_extras,
+                            [tuple(linea) for linea in lineas], ventas, cancelaciones)
+
+def _sumar_variacion(destino, variacion):
+    """Acumula una variación en otra, fila por fila según la clave de cada resumen"""
+    for modelo, filas in variacion.items():
+        claves = [columna.name for columna in modelo.__table__.primary_key]
+        acumuladas = destino.setdefault(modelo, {})
+        for fila in filas:
+            clave = tuple(fila[c] for c in claves)
+            actual = acumuladas.get(clave)
+            if actual is None:
+                acumuladas[clave] = dict(fila)
+            else:
+                for columna, valor in fila.items():
+                    if columna not in claves:
+                        actual[columna] += valor
+    return destino
+
+def acumular_ventas(variacion):
+    """Suma la variación en los resúmenes dentro de la transacción actual
+
+    Un solo INSERT … ON CONFLICT DO UPDATE por resumen: la fila se crea la
+    primera vez y después solo se incrementa, sin leerla antes.
+    """
+    for modelo, filas in variacion.items():
+        if isinstance(filas, dict):
+            filas = list(filas.values())
+        if not filas:
+            continue
+        tabla = modelo.__table__
+        claves = [columna.name for columna in tabla.primary_key]
+        sentencia = sqlite_insert(tabla)
+        db.session.execute(sentencia.on_conflict_do_update(
+            index_elements=claves,
+            set_={columna: tabla.c[columna] + sentencia.excluded[columna]
+                  for columna in filas[0] if columna not in claves},
+        ), filas)
+
+def recalcular_ventas(desde=None):
+    """Reconstruye los resúmenes desde el historial de pedidos
+
+    Con desde (una fecha) solo se rehacen los días a partir de ella. Devuelve
+    la cantidad de pedidos leídos; el llamador hace el commit.
+    """
+    query = db.session.query(
+        Pedido.id, Pedido.fecha_creacion, Pedido.estado, Pedido.total,
+        ItemPedido.plato_id, ItemPedido.cantidad, ItemPedido.precio_unitario,
+    ).outerjoin(ItemPedido, ItemPedido.pedido_id == Pedido.id
+    ).filter(Pedido.fecha_creacion.isnot(None))
+    extras = db.session.query(
+        ExtraPedido.pedido_id, func.sum(ExtraPedido.cantidad * ExtraPedido.precio_unitario)
+    ).group_by(ExtraPedido.pedido_id)
+    if desde:
+        inicio = datetime.combine(desde, datetime.min.time())
+        query = query.filter(Pedido.fecha_creacion >= inicio)
+        extras = extras.join(Pedido).filter(Pedido.fecha_creacion >= inicio)
+        db.session.execute(VentaHora.__table__.delete().where(VentaHora.hora >= inicio))
+        db.session.execute(VentaDia.__table__.delete().where(VentaDia.fecha >= desde))
+        db.session.execute(VentaPlatoDia.__table__.delete().where(VentaPlatoDia.fecha >= desde))
+    else:
+        for modelo in RESUMENES_VENTAS:
+            db.session.execute(modelo.__table__.delete())
+    extras_por_pedido = dict(extras.all())
+
+    acumulado = {}
+    pedidos = 0
+    filas = query.order_by(Pedido.id).yield_per(1000)
+    for _, grupo in groupby(filas, key=lambda fila: fila.id):
+        grupo = list(grupo)
+        pedido = grupo[0]
+        cancelado = pedido.estado == 'cancelado'
+        lineas = [(f.plato_id, f.cantidad, f.cantidad * f.precio_unitario)
+                  for f in grupo if f.plato_id is not None]
+        _sumar_variacion(acumulado, variacion_ventas(
+            pedido.fecha_creacion, pedido.total, extras_por_pedido.get(pedido.id, 0.0), lineas,
+            ventas=0 if cancelado else 1, cancelaciones=1 if cancelado else 0))
+        pedidos += 1
+    acumular_ventas(acumulado)
+    return pedidos
+
+def asegurar_resumenes_ventas():
+    """Llena los resúmenes la primera vez, en bases con pedidos anteriores a ellos"""
+    if VentaDia.query.first() is None and Pedido.query.first() is not None:
+        recalcular_ventas()
+        db.session.commit()
+
+@nucleo.cli.command('backfill-ventas')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Rehacer solo a partir de esta fecha (AAAA-MM-DD)')
+def backfill_ventas_comando(desde):
+    """Reconstruye los resúmenes de ventas desde los pedidos guardados"""
+    db.create_all()
+    pedidos = recalcular_ventas(desde.date() if desde else None)
+    db.session.commit()
+    print(f'Resúmenes de ventas recalculados con {pedidos} pedidos.')
+
+# Canal de eventos de pedidos (Server-Sent Events)
+# Cada evento se guarda en la tabla evento_pedido dentro de la misma transacción
+# que el cambio y después se publica eventos.version. En cada worker un único
+# hilo vigila ese archivo (sin tocar SQLite), lee los eventos nuevos una sola
+# vez y los reparte a todas las pantallas conectadas, que esperan en memoria.
+# Las conexiones SSE ocupan un hilo cada una: usar gunicorn con workers gthread.
+ajustes['EVENTOS_BUFFER'] = int(os.environ.get('EVENTOS_BUFFER', 500))
+ajustes['EVENTOS_RETENCION'] = int(os.environ.get('EVENTOS_RETENCION', 5000))
+EVENTOS_INTERVALO = 0.5  # segundos entre revisiones del archivo de versión
+EVENTOS_LATIDO = 15  # segundos sin eventos antes de enviar un comentario keep-alive
+
+class EventoPedido(db.Model):
+    __tablename__ = 'evento_pedido'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)  # pedido_creado, estado_cambiado
+    pedido_id = db.Column(db.Integer, nullable=False)
+    datos = db.Column(db.Text, nullable=False)  # JSON
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+Evento = namedtuple('Evento', ['id', 'tipo', 'datos'])
+
+def registrar_evento(tipo, pedido_id, datos):
+    """Agrega un evento a la transacción actual; llamar a notificar_eventos() tras el commit"""
+    datos = dict(datos, pedido_id=pedido_id)
+    resultado = db.session.execute(EventoPedido.__table__.insert().values(
+        tipo=tipo, pedido_id=pedido_id, datos=json.dumps(datos)))
+    evento_id = resultado.inserted_primary_key[0]
+    # Poda ocasional: la tabla solo sirve para reenviar eventos recientes
+    if evento_id % 500 == 0:
+        db.session.execute(EventoPedido.__table__.delete().where(
+            EventoPedido.id <= evento_id - current_app.config['EVENTOS_RETENCION']))
+
+def notificar_eventos():
+    """Avisa a todos los workers de que hay eventos nuevos"""
+    _publicar_version(archivo_version('eventos'))
+    difusor_eventos().despertar()
+
+class DifusorEventos:
+    """Reparte los eventos nuevos a las conexiones SSE de una app en este proceso"""
+
+    def __init__(self, aplicacion, capacidad):
+        self._condicion = threading.Condition()
+        self._despertar = threading.Event()
+        self._inicio = threading.Lock()
+        self._lectura = threading.Lock()
+        self._oyentes = []
+        self._buffer = deque(maxlen=capacidad)
+        self._ultimo_id = 0
+        self._version = None
+        self._hilo = None
+        self._app = aplicacion
+
+    def despertar(self):
+        self._despertar.set()
+
+    def _cargar(self, inicial=False):
+        with self._app.app_context(), sesion_lectura() as sesion:
+            query = sesion.query(EventoPedido.id, EventoPedido.tipo, EventoPedido.datos)
+            if inicial:
+                # Primera lectura: llenar el buffer de reenvío con los más recientes
+                filas = query.order_by(EventoPedido.id.desc()).limit(self._buffer.maxlen).all()[::-1]
+            else:
+                filas = query.filter(EventoPedido.id > self._ultimo_id).order_by(EventoPedido.id).all()
+        if not filas:
+            return
+        eventos = [Evento(*fila) for fila in filas]
+        with self._condicion:
+            self._buffer.extend(eventos)
+            self._ultimo_id = eventos[-1].id
+            self._condicion.notify_all()
+        if not inicial:
+            with self._app.app_context():
+                for oyente in self._oyentes:
+                    oyente(eventos)
+
+    def actualizar(self):
+        """Lee los eventos nuevos si otro proceso publicó una versión distinta"""
+        version, _ = _leer_version(archivo_version('eventos', self._app))
+        if version == self._version:
+            return
+        with self._lectura:
+            if version != self._version:
+                self._cargar()
+                self._version = version
+
+    def suscribir(self, oyente, inicializar=None):
+        """Registra oyente(eventos) para cada lote de eventos nuevos
+
+        inicializar() se ejecuta sin que pueda entrar ningún lote en medio, así
+        el suscriptor arma su estado inicial sin perder eventos.
+        """
+        self._iniciar()
+        with self._lectura:
+            if inicializar:
+                inicializar()
+            self._oyentes.append(oyente)
+
+    def _vigilar(self):
+        while True:
+            self._despertar.wait(EVENTOS_INTERVALO)
+            self._despertar.clear()
+            try:
+                self.actualizar()
+            except Exception:
+                self._app.logger.exception('No se pudieron leer los eventos de pedidos')
+
+    def _iniciar(self):
+        with self._inicio:
+            if self._hilo is not None:
+                return
+            self._version, _ = _leer_version(archivo_version('eventos', self._app))
+            self._cargar(inicial=True)
+            self._hilo = threading.Thread(target=self._vigilar, name='difusor-eventos', daemon=True)
+            self._hilo.start()
+
+    def escuchar(self, ultimo_id=None):
+        """Generador de los eventos posteriores a ultimo_id, o None tras un latido sin eventos
+
+        El difusor arranca antes de devolver el generador, que la respuesta
+        recorre después de que Flask haya cerrado el contexto de la app.
+        Si ultimo_id ya salió del buffer se genera primero un evento 'reiniciar'
+        para que la pantalla recargue su estado completo.
+        """
+        self._iniciar()
+        with self._condicion:
+            perdidos = bool(self._buffer) and ultimo_id is not None and ultimo_id < self._buffer[0].id - 1
+            if ultimo_id is None or ultimo_id > self._ultimo_id or perdidos:
+                ultimo_id = self._ultimo_id
+        return self._generar(ultimo_id, perdidos)
+
+    def _generar(self, ultimo_id, perdidos):
+        if perdidos:
+            yield Evento(ultimo_id, 'reiniciar', '{}')
+        while True:
+            with self._condicion:
+                if self._ultimo_id <= ultimo_id:
+                    self._condicion.wait(EVENTOS_LATIDO)
+                nuevos = [evento for evento in self._buffer if evento.id > ultimo_id]
+            if not nuevos:
+                yield None
+            for evento in nuevos:
+                ultimo_id = evento.id
+                yield evento
+
+def difusor_eventos():
+    """Difusor de la app actual; create_app() crea uno por app"""
+    return current_app.extensions['difusor_eventos']
+
+# Carritos en el servidor
+# La cookie de sesión solo guarda un id opaco del carrito; las líneas viven en
+# un almacén intercambiable: una LRU en memoria con vencimiento (un solo
+# proceso, útil en desarrollo) o la tabla carrito, compartida por todos los
+# workers. Cada línea tiene su propio id, así se actualiza sin depender de la
+# posición en la lista. El localStorage del navegador se sincroniza con
+# /api/carrito/sincronizar.
+ajustes['CARRITO_BACKEND'] = os.environ.get('CARRITO_BACKEND', 'sqlite')  # sqlite o memoria
+ajustes['CARRITO_TTL'] = int(os.environ.get('CARRITO_TTL', 7 * 24 * 3600))
+ajustes['CARRITO_CAPACIDAD'] = int(os.environ.get('CARRITO_CAPACIDAD', 10000))
+MAX_LINEAS_CARRITO = 100
+_LINEA_ID_RE = re.compile(r'^[0-9a-f]{12}$')
+
+class CarritoGuardado(db.Model):
+    __tablename__ = 'carrito'
+    id = db.Column(db.String(32), primary_key=True)
+    lineas = db.Column(db.Text, nullable=False)  # JSON {linea_id: linea}
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class CarritosEnMemoria:
+    """LRU con vencimiento dentro del proceso; no se comparte entre workers"""
+
+    def __init__(self, capacidad, ttl):
+        self._carritos = OrderedDict()
+        self._lock = threading.Lock()
+        self.capacidad = capacidad
+        self.ttl = ttl
+
+    def leer(self, carrito_id):
+        with self._lock:
+            entrada = self._carritos.get(carrito_id)
+            if entrada is None:
+                return None
+            vence, lineas = entrada
+            if vence < time.monotonic():
+                del self._carritos[carrito_id]
+                return None
+            self._carritos.move_to_end(carrito_id)
+            return {linea_id: dict(linea) for linea_id, linea in lineas.items()}
+
+    def guardar(self, carrito_id, lineas):
+        with self._lock:
+            self._carritos[carrito_id] = (time.monotonic() + self.ttl,
+                                          {linea_id: dict(linea) for linea_id, linea in lineas.items()})
+            self._carritos.move_to_end(carrito_id)
+            while len(self._carritos) > self.capacidad:
+                self._carritos.popitem(last=False)
+
+    def eliminar(self, carrito_id):
+        with self._lock:
+            self._carritos.pop(carrito_id, None)
+
+class CarritosSQLite:
+    """Carritos en la tabla carrito, visibles desde todos los workers"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._escrituras = 0
+
+    def leer(self, carrito_id):
+        fila = (db.session.query(CarritoGuardado.lineas, CarritoGuardado.actualizado)
+                .filter(CarritoGuardado.id == carrito_id).first())
+        if fila is None or fila.actualizado < datetime.utcnow() - timedelta(seconds=self.ttl):
+            return None
+        return json.loads(fila.lineas)
+
+    def guardar(self, carrito_id, lineas):
+        """Escribe solo si las líneas cambiaron o si ya pasó la mitad del TTL
+
+        Cada vista de página sincroniza el carrito; sin cambios, basta con
+        renovar la fecha de vez en cuando para que no venza.
+        """
+        tabla = CarritoGuardado.__table__
+        ahora = datetime.utcnow()
+        fila = (db.session.query(CarritoGuardado.lineas, CarritoGuardado.actualizado)
+                .filter(CarritoGuardado.id == carrito_id).first())
+        if fila is not None and fila.actualizado > ahora - timedelta(seconds=self.ttl / 2) \
+                and json.loads(fila.lineas) == lineas:
+            return
+        valores = {'lineas': json.dumps(lineas), 'actualizado': ahora}
+        try:
+            actualizado = db.session.execute(
+                tabla.update().where(tabla.c.id == carrito_id).values(**valores)).rowcount
+            if not actualizado:
+                db.session.execute(tabla.insert().values(id=carrito_id, **valores))
+            # Poda ocasional de carritos vencidos
+            self._escrituras += 1
+            if self._escrituras % 500 == 0:
+                db.session.execute(tabla.delete().where(
+                    tabla.c.actualizado < datetime.utcnow() - timedelta(seconds=self.ttl)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def eliminar(self, carrito_id):
+        db.session.execute(CarritoGuardado.__table__.delete().where(CarritoGuardado.id == carrito_id))
+        db.session.commit()
+
+def crear_almacen_carritos(config):
+    if config['CARRITO_BACKEND'] == 'memoria':
+        return CarritosEnMemoria(config['CARRITO_CAPACIDAD'], config['CARRITO_TTL'])
+    return CarritosSQLite(config['CARRITO_TTL'])
+
+def almacen_carritos():
+    """Almacén de carritos de la app actual; create_app() crea uno por app"""
+    return current_app.extensions['carritos']
+
+def carrito_actual():
+    """Líneas del carrito del visitante ({linea_id: linea}); vacío si no tiene"""
+    carrito_id = session.get('carrito_id')
+    return (almacen_carritos().leer(carrito_id) if carrito_id else None) or {}
+
+def guardar_carrito(lineas):
+    carrito_id = session.get('carrito_id')
+    if not lineas:
+        if carrito_id:
+            almacen_carritos().eliminar(carrito_id)
+        return
+    if not carrito_id:
+        carrito_id = session['carrito_id'] = secrets.token_urlsafe(16)
+    almacen_carritos().guardar(carrito_id, lineas)
+
+def vaciar_carrito():
+    carrito_id = session.pop('carrito_id', None)
+    if carrito_id:
+        almacen_carritos().eliminar(carrito_id)
+
+def nuevo_linea_id():
+    return uuid.uuid4().hex[:12]
+
+def linea_carrito(plato, cantidad, personalizaciones):
+    return {
+        'plato_id': plato.id,
+        'nombre': plato.nombre,
+        'precio': float(plato.precio_venta),
+        'imagen': plato.imagen,
+        'cantidad': cantidad,
+        'personalizaciones': personalizaciones,
+    }
+
+def items_carrito(lineas):
+    """Lista en el formato del localStorage: id de plato e id de línea"""
+    return [dict(linea, id=linea['plato_id'], linea_id=linea_id) for linea_id, linea in lineas.items()]
+
+# Inventario
+# Las existencias se descuentan según las recetas cuando un pedido llega al
+# estado configurado (INVENTARIO_ESTADO, por defecto confirmado) y se devuelven
+# si se cancela o vuelve a un estado anterior. Cada pedido guarda si ya
+# descontó, así repetir un cambio de estado no descuenta dos veces. El consumo
+# se aplica con un solo UPDATE en lote por pedido, con las recetas expandidas
+# en caché, y las alertas de stock bajo y los platos agotados se evalúan solo
+# para los productos que ese UPDATE tocó. Un producto sin existencia cargada
+# (NULL) no se controla: no se descuenta ni agota los platos que lo usan.
+ORDEN_ESTADOS = ('pendiente', 'confirmado', 'preparando', 'enviado', 'entregado')
+ajustes['INVENTARIO_ESTADO'] = os.environ.get('INVENTARIO_ESTADO', 'confirmado')
+
+CambioInventario = namedtuple('CambioInventario', ['bajos', 'desactivados', 'reactivados'])
+
+def descuenta_inventario(estado):
+    """Si un pedido en este estado ya consumió sus ingredientes"""
+    return (estado in ORDEN_ESTADOS and
+            ORDEN_ESTADOS.index(estado) >= ORDEN_ESTADOS.index(current_app.config['INVENTARIO_ESTADO']))
+
+def cantidad_en_unidad(cantidad, unidad):
+    """Pasa una cantidad de receta (unidad base) a la unidad del producto"""
+    try:
+        return convert_units(cantidad, unidad_base(unidad), unidad)
+    except ValueError:
+        return cantidad
+
+class Recetario:
+    """Recetas expandidas por plato: ((producto_id, cantidad en la unidad del producto), …)
+
+    Se llenan a medida que se piden y se descartan cuando cambia costos.version,
+    que publican las rutas que modifican recetas o unidades de productos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._recetas = {}
+
+    def expandir(self, plato_ids):
+        version, _ = _leer_version(archivo_version('costos'))
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._recetas = {}
+            recetas = self._recetas
+        faltan = {plato_id for plato_id in plato_ids if plato_id not in recetas}
+        if not faltan:
+            return recetas
+        nuevas = {plato_id: [] for plato_id in faltan}
+        for plato_id, producto_id, cantidad, unidad in db.session.query(
+                IngredientePlato.plato_id, IngredientePlato.producto_id,
+                IngredientePlato.cantidad, Producto.unidad_medida
+        ).join(Producto, Producto.id == IngredientePlato.producto_id
+        ).filter(IngredientePlato.plato_id.in_(faltan)):
+            nuevas[plato_id].append((producto_id, cantidad_en_unidad(cantidad, unidad)))
+        nuevas = {plato_id: tuple(receta) for plato_id, receta in nuevas.items()}
+        with self._lock:
+            if self._version == version:
+                self._recetas.update(nuevas)
+        return {**recetas, **nuevas}
+
+recetario = Recetario()
+
+def mover_inventario(pedido_id, lineas, signo):
+    """Descuenta (signo=1) o devuelve (signo=-1) el consumo de las líneas [(plato_id, cantidad)]
+
+    Trabaja dentro de la transacción actual y devuelve el CambioInventario;
+    llamar a publicar_cambio_inventario() después del commit.
+    """
+    recetas = recetario.expandir(plato_id for plato_id, _ in lineas)
+    consumo = Counter()
+    for plato_id, cantidad in lineas:
+        for producto_id, por_unidad in recetas.get(plato_id, ()):
+            consumo[producto_id] += por_unidad * cantidad
+    if not consumo:
+        return CambioInventario((), (), ())
+    tabla = Producto.__table__
+    db.session.execute(
+        tabla.update().where(tabla.c.id == bindparam('b_id'), tabla.c.existencia.isnot(None))
+        .values(existencia=tabla.c.existencia - bindparam('b_consumo')),
+        [{'b_id': producto_id, 'b_consumo': signo * cantidad} for producto_id, cantidad in consumo.items()])
+    return evaluar_existencias(pedido_id, {producto_id: -signo * cantidad
+                                           for producto_id, cantidad in consumo.items()})
+
+def evaluar_existencias(pedido_id, variaciones):
+    """Revisa solo los productos que cambiaron ({producto_id: variación ya aplicada})
+
+    Avisa de los que bajaron del mínimo, desactiva los platos que usan un
+    producto que se agotó y reactiva los que se habían agotado y ya tienen
+    todos sus ingredientes. La variación es None para un producto que recién
+    empieza a controlarse (existencia NULL antes): cuenta como si tuviera stock.
+    """
+    filas = db.session.query(Producto.id, Producto.nombre, Producto.existencia, Producto.stock_minimo
+                             ).filter(Producto.id.in_(list(variaciones)),
+                                      Producto.existencia.isnot(None)).all()
+    bajos, agotados, repuestos = [], [], []
+    for fila in filas:
+        variacion = variaciones[fila.id]
+        antes = float('inf') if variacion is None else fila.existencia - variacion
+        if fila.existencia <= fila.stock_minimo < antes:
+            bajos.append({'id': fila.id, 'nombre': fila.nombre, 'existencia': round(fila.existencia, 3),
+                          'stock_minimo': fila.stock_minimo})
+        if fila.existencia <= 0 < antes:
+            agotados.append(fila.id)
+        elif antes <= 0 < fila.existencia:
+            repuestos.append(fila.id)
+
+    desactivados = []
+    if agotados:
+        desactivados = [plato_id for (plato_id,) in db.session.query(Plato.id).join(
+            IngredientePlato, IngredientePlato.plato_id == Plato.id
+        ).filter(IngredientePlato.producto_id.in_(agotados), Plato.activo == True).distinct()]
+    reactivados = []
+    if repuestos:
+        candidatos = {plato_id for (plato_id,) in db.session.query(Plato.id).join(
+            IngredientePlato, IngredientePlato.plato_id == Plato.id
+        ).filter(IngredientePlato.producto_id.in_(repuestos), Plato.agotado == True)}
+        if candidatos:
+            sin_stock = {plato_id for (plato_id,) in db.session.query(IngredientePlato.plato_id).join(
+                Producto, Producto.id == IngredientePlato.producto_id
+            ).filter(IngredientePlato.plato_id.in_(candidatos), Producto.existencia <= 0)}
+            reactivados = sorted(candidatos - sin_stock)
 
-@app.route('/logout')
-def logout():
-    session.clear()
-    flash('Sesión cerrada.', 'info')
-    return redirect(url_for('index'))
+    tabla = Plato.__table__
+    if desactivados:
+        db.session.execute(tabla.update().where(tabla.c.id.in_(desactivados))
+                           .values(activo=False, agotado=True))
+    if reactivados:
+        db.session.execute(tabla.update().where(tabla.c.id.in_(reactivados))
+                           .values(activo=True, agotado=False))
+    if desactivados or reactivados:
+        indexar_platos(desactivados + reactivados)
+    if (bajos or desactivados) and pedido_id is not None:
+        registrar_evento('stock_bajo', pedido_id, {'productos': bajos, 'platos_desactivados': desactivados})
+    for producto in bajos:
+        current_app.logger.warning('Stock bajo de %s: %s (mínimo %s)', producto['nombre'],
+                           producto['existencia'], producto['stock_minimo'])
+    return CambioInventario(bajos, desactivados, reactivados)
 
+def publicar_cambio_inventario(cambio):
+    """Publica el menú si el cambio de inventario activó o desactivó platos"""
+    if cambio.desactivados or cambio.reactivados:
+        invalidar_menu()
+        invalidar_costos()
+
+def lineas_pedido(pedido_id):
+    return db.session.query(ItemPedido.plato_id, ItemPedido.cantidad
+                            ).filter(ItemPedido.pedido_id == pedido_id).all()
+
+# Blueprints
+# Las rutas públicas van en el blueprint publico. El panel (blueprint admin, con
+# /login y /logout) vive en panel.py junto con sus listados, reportes,
+# exportaciones y el tablero de cocina; create_app() solo importa ese módulo
+# si la app registra el panel, así un worker solo para clientes no lo carga.
+publico = Blueprint('publico', __name__)
 # Rutas principales
-@app.route('/')
+@publico.route('/')
+@menu_condicional
 def index():
     categoria_id = request.args.get('categoria_id', type=int)
     search = request.args.get('search', '')
-    categorias = Categoria.query.all()
-    query:Plato = Plato.query.filter(Plato.activo == True)
-    if categoria_id:
-        try:
-            query.categoria = Categoria.query.filter(id=categoria_id)
-        except:pass
-        query = query.filter(Plato.categoria_id == categoria_id)
-    if search:
-        query = query.filter(Plato.nombre.ilike(f'%{search}%'))
-    platos = query.all()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
+    menu_actual = obtener_menu()
+    categorias = menu_actual.categorias
+    platos = menu_actual.filtrar(categoria_id, search)
     # Detectar si es una petición AJAX
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         # Devolver solo el HTML necesario para la sección de platos
@@ -299,134 +2140,162 @@ def index():
                              categorias=categorias,
                              categoria_actual=categoria_id,
                              search=search)
-    return render_template('index.html', categorias=categorias, platos=platos, config=config)
+    return render_template('index.html', categorias=categorias, platos=platos)
 
 # Rutas principales
-@app.route('/api/categorias')
+@publico.route('/api/categorias')
+@menu_condicional
 def api_categorias():
-    categorias = Categoria.query.all()
-    cats = []
-    for c in categorias:
-        cats.append(c.to_json())
-    return jsonify(cats)
+    filas, error = seleccionar_campos([c.json for c in obtener_menu().categorias],
+                                      CAMPOS_PUBLICOS_CATEGORIA)
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(filas)
 
 # Rutas principales
-@app.route('/api/platos/extras')
+@publico.route('/api/platos/extras')
+@menu_condicional
 def api_extras():
-    extras = Extra.query.filter_by(activo=True).all()
-    cats = []
-    for c in extras:
-        cats.append(c.to_json())
-    return jsonify(cats)
+    return jsonify(list(obtener_menu().extras))
 
 # Rutas principales
-@app.route('/api/platos')
+@publico.route('/api/platos')
+@menu_condicional
 def api_platos():
     categoria_id = request.args.get('categoria_id', type=int)
     search = request.args.get('search', '')
-    categorias = Categoria.query.all()
-    query:Plato = Plato.query.filter(Plato.activo == True)
-    if categoria_id:
-        try:
-            query.categoria = Categoria.query.filter(id=categoria_id)
-        except:pass
-        query = query.filter(Plato.categoria_id == categoria_id)
-    if search:
-        query = query.filter(Plato.nombre.ilike(f'%{search}%'))
-    platos = query.all()
-    plats = []
-    for p in platos:
-        plats.append(p.to_json())
-    return jsonify(plats)
-
-@app.route('/menu')
+    platos = obtener_menu().filtrar(categoria_id, search)
+    filas, error = seleccionar_campos([p.json for p in platos], CAMPOS_PUBLICOS_PLATO)
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(filas)
+
+@publico.route('/api/platos/buscar')
+@menu_condicional
+def api_buscar_platos():
+    """Sugerencias mientras el cliente escribe en el buscador"""
+    texto = request.args.get('q', '')
+    limite = min(request.args.get('limit', 8, type=int), 50)
+    platos = obtener_menu().filtrar(request.args.get('categoria_id', type=int), texto, limite)
+    return jsonify([
+        {'id': p.id, 'nombre': p.nombre, 'precio_venta': p.precio_venta,
+         'imagen_url': p.imagen_url, 'categoria_id': p.categoria_id}
+        for p in platos
+    ])
+
+@publico.route('/menu')
+@menu_condicional
 def menu():
     categoria_id = request.args.get('categoria_id', type=int)
     search = request.args.get('search', '')
     
-    query = Plato.query.filter_by(activo=True)
-    
-    if categoria_id:
-        query = query.filter_by(categoria_id=categoria_id)
-    
-    if search:
-        query = query.filter(Plato.nombre.ilike(f'%{search}%'))
-    
-    platos = query.all()
-    categorias = Categoria.query.filter_by(activa=True).all()
-    config = Configuracion.query.first()
+    menu_actual = obtener_menu()
+    platos = menu_actual.filtrar(categoria_id, search)
+    categorias = menu_actual.categorias_activas
     
     return render_template('menu.html', platos=platos, categorias=categorias, 
-                          categoria_actual=categoria_id, search=search, config=config)
+                          categoria_actual=categoria_id, search=search)
 
-@app.route('/agregar_carrito/<int:plato_id>', methods=['POST'])
+@publico.route('/agregar_carrito/<int:plato_id>', methods=['POST'])
 def agregar_carrito(plato_id):
-    plato = Plato.query.get_or_404(plato_id)
-    
-    # Inicializar carrito si no existe
-    if 'carrito' not in session:
-        session['carrito'] = []
-    
-    # Verificar si el plato ya está en el carrito
-    carrito = session['carrito']
-    encontrado = False
-    
-    for item in carrito:
-        if item['plato_id'] == plato_id:
-            item['cantidad'] += 1
-            encontrado = True
+    plato = obtener_menu().plato(plato_id)
+    if plato is None:
+        abort(404)
+    try:
+        personalizaciones = json.loads(request.form.get('personalizaciones') or '{}')
+    except ValueError:
+        personalizaciones = {}
+    
+    # Si el plato ya está con las mismas personalizaciones, sumar uno
+    lineas = carrito_actual()
+    for linea_id, linea in lineas.items():
+        if linea['plato_id'] == plato_id and linea['personalizaciones'] == personalizaciones:
+            linea['cantidad'] = min(linea['cantidad'] + 1, MAX_CANTIDAD_POR_PLATO)
             break
+    else:
+        if len(lineas) >= MAX_LINEAS_CARRITO:
+            return jsonify({'success': False, 'error': 'El carrito está lleno'}), 400
+        linea_id = nuevo_linea_id()
+        lineas[linea_id] = linea_carrito(plato, 1, personalizaciones)
     
-    if not encontrado:
-        carrito.append({
-            'plato_id': plato_id,
-            'nombre': plato.nombre,
-            'precio': float(plato.precio_venta),
-            'imagen': plato.imagen,
-            'cantidad': 1,
-            'personalizaciones': {}
-        })
-    
-    session['carrito'] = carrito
-    session.modified = True
-    
-    return jsonify({'success': True, 'carrito_count': len(carrito)})
+    guardar_carrito(lineas)
+    return jsonify({'success': True, 'carrito_count': len(lineas), 'linea_id': linea_id})
 
-@app.route('/actualizar_carrito', methods=['POST'])
+@publico.route('/actualizar_carrito', methods=['POST'])
 def actualizar_carrito():
-    data = request.get_json()
-    item_index = data.get('item_index')
+    data = request.get_json(silent=True) or {}
+    lineas = carrito_actual()
+    linea_id = data.get('linea_id')
     cantidad = data.get('cantidad')
     
-    if 'carrito' in session and 0 <= item_index < len(session['carrito']):
+    # Clientes anteriores todavía mandan la posición en la lista
+    item_index = data.get('item_index')
+    if linea_id is None and isinstance(item_index, int) and 0 <= item_index < len(lineas):
+        linea_id = list(lineas)[item_index]
+    
+    if linea_id in lineas and isinstance(cantidad, int):
         if cantidad <= 0:
-            # Eliminar item si la cantidad es 0
-            session['carrito'].pop(item_index)
+            # Eliminar la línea si la cantidad es 0
+            del lineas[linea_id]
         else:
-            # Actualizar cantidad
-            session['carrito'][item_index]['cantidad'] = cantidad
-        
-        session.modified = True
-        return jsonify({'success': True, 'carrito_count': len(session['carrito'])})
+            lineas[linea_id]['cantidad'] = min(cantidad, MAX_CANTIDAD_POR_PLATO)
+        guardar_carrito(lineas)
+        return jsonify({'success': True, 'carrito_count': len(lineas)})
     
     return jsonify({'success': False})
 
-@app.route('/carrito')
+@publico.route('/api/carrito/sincronizar', methods=['POST'])
+def api_sincronizar_carrito():
+    """Reemplaza el carrito del servidor por el del localStorage y lo devuelve normalizado
+
+    Se descartan los platos que ya no están en el menú y los precios salen del
+    servidor. Las líneas conservan su id; las nuevas reciben uno.
+    """
+    datos = request.get_json(silent=True) or {}
+    try:
+        items = _leer_carrito(datos.get('carrito', []))
+    except CotizacionInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    menu_actual = obtener_menu()
+    lineas = {}
+    for item in items[:MAX_LINEAS_CARRITO]:
+        try:
+            plato = menu_actual.plato(int(item.get('plato_id', item.get('id'))))
+            cantidad = int(item.get('cantidad', 1))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if plato is None or cantidad < 1:
+            continue
+        linea_id = item.get('linea_id')
+        if not isinstance(linea_id, str) or not _LINEA_ID_RE.match(linea_id) or linea_id in lineas:
+            linea_id = nuevo_linea_id()
+        lineas[linea_id] = linea_carrito(plato, min(cantidad, MAX_CANTIDAD_POR_PLATO),
+                                         item.get('personalizaciones') or {})
+    guardar_carrito(lineas)
+    return jsonify({'count': len(lineas), 'items': items_carrito(lineas)})
+
+@publico.route('/carrito')
 def carrito():
-    carrito = session.get('carrito', [])
-    config = Configuracion.query.first()
     extras = Extra.query.filter_by(activo=True).all()
-    max_extras = config.max_extras if config else 5
+    max_extras = obtener_configuracion().max_extras
     total = 0
-    return render_template('carrito.html', config=config, extras=extras, max_extras=max_extras,total=total)
+    return render_template('carrito.html', extras=extras, max_extras=max_extras,total=total)
+
+@publico.route('/api/cotizar', methods=['POST'])
+def api_cotizar():
+    """Cotización del carrito mientras el cliente lo edita"""
+    datos = request.get_json(silent=True) or {}
+    try:
+        cotizacion = cotizar_pedido(datos.get('carrito', []), datos.get('extras', []))
+    except CotizacionInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(cotizacion)
 
-@app.route('/realizar_pedido', methods=['POST'])
+@publico.route('/realizar_pedido', methods=['POST'])
 def realizar_pedido():
     # Obtener datos del cliente
-    session = request.get_json()
-    session['carrito'] = json.loads(session['carrito'])
-    print(session)
-    datos_pedido = session['form']
+    datos = request.get_json(silent=True) or {}
+    datos_pedido = datos.get('form') or {}
 
     telefono = datos_pedido.get('telefono')
     direccion = datos_pedido.get('direccion')
@@ -434,63 +2303,25 @@ def realizar_pedido():
     nombre = datos_pedido.get('nombre', 'Cliente')
     
     if not telefono or not direccion:
-        flash('Por favor, complete todos los campos obligatorios.', 'error')
-        return redirect(url_for('carrito'))
-    
-    # Calcular total
-    total = 0
-    for item in session['carrito']:
-        total += item['precio'] * item['cantidad']
-    
-    # Agregar extras si existen
-    extras_seleccionados = request.form.getlist('extras')
-    extras_precios = {int(extra_id): float(request.form.get(f'extra_precio_{extra_id}', 0)) 
-                     for extra_id in extras_seleccionados if extra_id}
+        return jsonify({'error': 'Por favor, complete todos los campos obligatorios.'}), 400
     
-    for extra_id in extras_seleccionados:
-        if extra_id:
-            total += extras_precios[int(extra_id)]
-    
-    # Crear pedido
-    codigo_pedido = str(uuid.uuid4())[:8].upper()
-    nuevo_pedido = Pedido(
-        codigo=codigo_pedido,
-        cliente_nombre=nombre,
-        cliente_telefono=telefono,
-        cliente_direccion=direccion,
-        cliente_ubicacion=ubicacion,
-        total=total
-    )
-    
-    db.session.add(nuevo_pedido)
-    db.session.flush()  # Para obtener el ID del pedido
-    
-    # Agregar items al pedido
-    for item in session['carrito']:
-        nuevo_item = ItemPedido(
-            pedido_id=nuevo_pedido.id,
-            plato_id=item['id'],
-            cantidad=item['cantidad'],
-            precio_unitario=item['precio'],
-            personalizaciones=json.dumps(item.get('personalizaciones', {}))
-        )
-        db.session.add(nuevo_item)
-    
-    # Agregar extras al pedido
-    for extra_id in extras_seleccionados:
-        if extra_id:
-            nuevo_extra = ExtraPedido(
-                pedido_id=nuevo_pedido.id,
-                extra_id=int(extra_id),
-                cantidad=1,
-                precio_unitario=extras_precios[int(extra_id)]
-            )
-            db.session.add(nuevo_extra)
-    
-    db.session.commit()
+    # Calcular total con los precios del servidor; sin carrito en el cuerpo se usa el guardado
+    try:
+        cotizacion = cotizar_pedido(datos.get('carrito') or items_carrito(carrito_actual()),
+                                    datos.get('extras', []))
+    except CotizacionInvalida as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Crear pedido, items y extras en una sola transacción
+    pedido_id, codigo_pedido = insertar_pedido(cotizacion, {
+        'nombre': nombre,
+        'telefono': telefono,
+        'direccion': direccion,
+        'ubicacion': ubicacion,
+    })
     
     # Limpiar carrito
-    session.pop('carrito', None)
+    vaciar_carrito()
     
     # Guardar datos del cliente en cookies
     session['cliente_telefono'] = telefono
@@ -499,611 +2330,345 @@ def realizar_pedido():
     
     return f'/confirmacion_pedido/{codigo_pedido}',200
 
-@app.route('/confirmacion_pedido/<codigo>')
+@publico.route('/confirmacion_pedido/<codigo>')
 def confirmacion_pedido(codigo):
-    pedido:Pedido = Pedido.query.filter_by(codigo=codigo).first_or_404()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('confirmacion_pedido.html', pedido=pedido,config=config)
-
-# Panel de administración
-@app.route('/admin')
-@login_required
-def admin_panel():
-    pedidos_pendientes = Pedido.query.filter_by(estado='pendiente').count()
-    total_platos = Plato.query.count()
-    total_productos = Producto.query.count()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/index.html', 
-                         pedidos_pendientes=pedidos_pendientes,
-                         total_platos=total_platos,
-                         total_productos=total_productos,config=config)
-
-# Gestión de pedidos
-@app.route('/admin/pedidos')
-@login_required
-def admin_pedidos():
-    estado = request.args.get('estado', 'pendiente')
-    pedidos = Pedido.query.filter_by(estado=estado).order_by(Pedido.fecha_creacion.desc()).all()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/pedidos.html', pedidos=pedidos, estado_actual=estado,config=config)
+    pedido:Pedido = con_perfil(Pedido.query, 'ticket_cocina').filter_by(codigo=codigo).first_or_404()
+    return render_template('confirmacion_pedido.html', pedido=pedido)
 
-@app.route('/admin/pedido/<int:pedido_id>')
-@login_required
-def ver_pedido(pedido_id):
-    pedido = Pedido.query.get_or_404(pedido_id)
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/ver_pedido.html', pedido=pedido,config=config)
-
-@app.route('/admin/cambiar_estado_pedido/<int:pedido_id>', methods=['POST'])
-@login_required
-def cambiar_estado_pedido(pedido_id):
-    pedido = Pedido.query.get_or_404(pedido_id)
-    nuevo_estado = request.form.get('estado')
-    
-    if nuevo_estado in ['pendiente', 'confirmado', 'preparando', 'enviado', 'entregado', 'cancelado']:
-        pedido.estado = nuevo_estado
-        db.session.commit()
-        flash('Estado del pedido actualizado correctamente.', 'success')
-    else:
-        flash('Estado no válido.', 'error')
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return redirect(url_for('ver_pedido', pedido_id=pedido_id))
+# Conversión de unidades
+# Las unidades se declaran como equivalencias sueltas (1 kg = 1000 g, …). Al
+# importar el módulo se recorre ese grafo desde la unidad base de cada magnitud
+# y se arma la matriz completa de factores entre todas sus unidades, con
+# caminos de cualquier largo. Convertir es una búsqueda en un dict, y mezclar
+# magnitudes (masa con volumen o con unidades sueltas) es un error explícito.
+EQUIVALENCIAS = [
+    # (unidad, otra unidad, cuántas de la otra hay en una)
+    ('kg', 'g', 1000),
+    ('g', 'mg', 1000),
+    ('lb', 'kg', 0.45359237),
+    ('lb', 'oz', 16),
+    ('lt', 'ml', 1000),
+    ('gal', 'lt', 3.785411784),
+    ('unidad', 'un', 1),
+    ('docena', 'un', 12),
+]
+MAGNITUDES = {'masa': 'g', 'volumen': 'ml', 'cantidad': 'un'}  # magnitud -> unidad base
 
-# Gestión de productos
-@app.route('/admin/productos')
-@login_required
-def admin_productos():
-    productos = Producto.query.order_by(Producto.nombre).all()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/productos.html', productos=productos,config=config)
-
-@app.route('/admin/producto/nuevo', methods=['GET', 'POST'])
-@login_required
-def nuevo_producto():
-    if request.method == 'POST':
-        nombre = request.form.get('nombre')
-        precio_compra = float(request.form.get('precio_compra', 0))
-        unidad_medida = request.form.get('unidad_medida')
-        cantidad = float(request.form.get('cantidad', 0))
-        
-        nuevo_producto = Producto(
-            nombre=nombre,
-            precio_compra=precio_compra,
-            unidad_medida=unidad_medida,
-            cantidad=cantidad
-        )
-        
-        db.session.add(nuevo_producto)
-        db.session.commit()
-        
-        flash('Producto creado correctamente.', 'success')
-        return redirect(url_for('admin_productos'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_producto.html',config=config)
+class UnidadDesconocida(ValueError):
+    """La unidad no está en ninguna equivalencia"""
 
-@app.route('/admin/producto/editar/<int:producto_id>', methods=['GET', 'POST'])
-@login_required
-def editar_producto(producto_id):
-    producto = Producto.query.get_or_404(producto_id)
-    
-    if request.method == 'POST':
-        producto.nombre = request.form.get('nombre')
-        producto.precio_compra = float(request.form.get('precio_compra', 0))
-        producto.unidad_medida = request.form.get('unidad_medida')
-        producto.cantidad = float(request.form.get('cantidad', 0))
-        producto.activo = 'activo' in request.form
-        
-        db.session.commit()
-        
-        flash('Producto actualizado correctamente.', 'success')
-        return redirect(url_for('admin_productos'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_producto.html', producto=producto,config=config)
+class UnidadIncompatible(ValueError):
+    """Conversión entre unidades de magnitudes distintas"""
 
-@app.route('/admin/producto/eliminar/<int:producto_id>', methods=['POST'])
-@login_required
-def eliminar_producto(producto_id):
-    producto = Producto.query.get_or_404(producto_id)
-    
-    # Verificar si el producto está siendo usado en algún plato
-    ingredientes = IngredientePlato.query.filter_by(producto_id=producto_id).count()
-    if ingredientes > 0:
-        flash('No se puede eliminar el producto porque está siendo utilizado en uno o más platos.', 'error')
-        return redirect(url_for('admin_productos'))
-    
-    db.session.delete(producto)
-    db.session.commit()
-    
-    flash('Producto eliminado correctamente.', 'success')
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return redirect(url_for('admin_productos'))
+def _construir_factores(equivalencias, magnitudes):
+    """Devuelve ({(origen, destino): factor}, {unidad: magnitud}) con todos los pares de cada magnitud"""
+    vecinas = {}
+    for unidad, otra, factor in equivalencias:
+        vecinas.setdefault(unidad, []).append((otra, factor))
+        vecinas.setdefault(otra, []).append((unidad, 1 / factor))
+    factores = {}
+    magnitud_de = {}
+    for magnitud, base in magnitudes.items():
+        # en_base[u]: cuántas unidades base hay en una u
+        en_base = {base: 1.0}
+        pendientes = deque([base])
+        while pendientes:
+            unidad = pendientes.popleft()
+            for otra, factor in vecinas.get(unidad, ()):
+                if otra not in en_base:
+                    en_base[otra] = en_base[unidad] / factor
+                    pendientes.append(otra)
+        for unidad in en_base:
+            if unidad in magnitud_de:
+                raise RuntimeError(f"La unidad '{unidad}' está en {magnitud_de[unidad]} y en {magnitud}")
+            magnitud_de[unidad] = magnitud
+        for origen, a_base in en_base.items():
+            for destino, b_base in en_base.items():
+                factores[origen, destino] = a_base / b_base
+    sueltas = set(vecinas) - set(magnitud_de)
+    if sueltas:
+        raise RuntimeError(f"Unidades sin magnitud: {', '.join(sorted(sueltas))}")
+    return factores, magnitud_de
 
-# Gestión de platos
-@app.route('/admin/platos')
-@login_required
-def admin_platos():
-    platos = Plato.query.all()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/platos.html', platos=platos,config=config)
+FACTORES_CONVERSION, MAGNITUD_UNIDAD = _construir_factores(EQUIVALENCIAS, MAGNITUDES)
 
-@app.route('/admin/plato/nuevo', methods=['GET', 'POST'])
-@login_required
-def nuevo_plato():
-    categorias = Categoria.query.filter_by(activa=True).all()
-    productos = Producto.query.filter_by(activo=True).all()
-    
-    if request.method == 'POST':
-        nombre = request.form.get('nombre')
-        descripcion = request.form.get('descripcion')
-        precio_venta = float(request.form.get('precio_venta', 0))
-        categoria_id = int(request.form.get('categoria_id', 0))
-        
-        # Manejar la imagen
-        imagen = None
-        if 'imagen' in request.files:
-            archivo = request.files['imagen']
-            if archivo and archivo.filename:
-                filename = secure_filename(archivo.filename)
-                # Agregar un timestamp para evitar colisiones
-                nombre_unico = f"{datetime.now().timestamp()}_{filename}"
-                archivo.save(os.path.join(app.config['UPLOAD_FOLDER'], nombre_unico))
-                imagen = nombre_unico
-        
-        nuevo_plato = Plato(
-            nombre=nombre,
-            descripcion=descripcion,
-            precio_venta=precio_venta,
-            imagen=imagen,
-            categoria_id=categoria_id
-        )
-        
-        db.session.add(nuevo_plato)
-        db.session.flush()  # Para obtener el ID del plato
-        
-        # Procesar ingredientes
-        ingredientes_data = []
-        i = 0
-        while f'producto_id_{i}' in request.form:
-            producto_id = int(request.form.get(f'producto_id_{i}'))
-            cantidad = float(request.form.get(f'cantidad_{i}', 0))
-            
-            ingrediente = IngredientePlato(
-                plato_id=nuevo_plato.id,
-                producto_id=producto_id,
-                cantidad=cantidad
-            )
-            db.session.add(ingrediente)
-            ingredientes_data.append((producto_id, cantidad))
-            i += 1
-        
-        db.session.commit()
-        
-        flash('Plato creado correctamente.', 'success')
-        return redirect(url_for('admin_platos'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_plato.html', categorias=categorias, productos=productos,config=config)
-
-@app.route('/admin/plato/editar/<int:plato_id>', methods=['GET', 'POST'])
-@login_required
-def editar_plato(plato_id):
-    plato = Plato.query.get_or_404(plato_id)
-    categorias = Categoria.query.filter_by(activa=True).all()
-    productos = Producto.query.filter_by(activo=True).all()
-    
-    if request.method == 'POST':
-        plato.nombre = request.form.get('nombre')
-        plato.descripcion = request.form.get('descripcion')
-        plato.precio_venta = float(request.form.get('precio_venta', 0))
-        plato.categoria_id = int(request.form.get('categoria_id', 0))
-        plato.activo = 'activo' in request.form
-        
-        # Manejar la imagen
-        if 'imagen' in request.files:
-            archivo = request.files['imagen']
-            if archivo and archivo.filename:
-                # Eliminar imagen anterior si existe
-                if plato.imagen and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], plato.imagen)):
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], plato.imagen))
-                
-                filename = secure_filename(archivo.filename)
-                nombre_unico = f"{datetime.now().timestamp()}_{filename}"
-                archivo.save(os.path.join(app.config['UPLOAD_FOLDER'], nombre_unico))
-                plato.imagen = nombre_unico
-        
-        # Eliminar ingredientes existentes
-        IngredientePlato.query.filter_by(plato_id=plato_id).delete()
-        
-        # Procesar nuevos ingredientes
-        i = 0
-        while f'producto_id_{i}' in request.form:
-            producto_id = int(request.form.get(f'producto_id_{i}'))
-            cantidad = float(request.form.get(f'cantidad_{i}', 0))
-            
-            ingrediente = IngredientePlato(
-                plato_id=plato_id,
-                producto_id=producto_id,
-                cantidad=cantidad
-            )
-            db.session.add(ingrediente)
-            i += 1
-        
-        db.session.commit()
-        
-        flash('Plato actualizado correctamente.', 'success')
-        return redirect(url_for('admin_platos'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_plato.html', plato=plato, categorias=categorias, productos=productos,config=config)
+def magnitud(unidad):
+    try:
+        return MAGNITUD_UNIDAD[unidad]
+    except KeyError:
+        raise UnidadDesconocida(f"Unidad '{unidad}' no soportada") from None
 
-@app.route('/admin/plato/eliminar/<int:plato_id>', methods=['POST'])
-@login_required
-def eliminar_plato(plato_id):
-    plato = Plato.query.get_or_404(plato_id)
-    
-    # Verificar si el plato está en algún pedido
-    items_pedido = ItemPedido.query.filter_by(plato_id=plato_id).count()
-    if items_pedido > 0:
-        flash('No se puede eliminar el plato porque está incluido en uno o más pedidos.', 'error')
-        return redirect(url_for('admin_platos'))
-    
-    # Eliminar imagen si existe
-    if plato.imagen and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], plato.imagen)):
-        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], plato.imagen))
-    
-    # Eliminar ingredientes
-    IngredientePlato.query.filter_by(plato_id=plato_id).delete()
-    
-    db.session.delete(plato)
-    db.session.commit()
-    
-    flash('Plato eliminado correctamente.', 'success')
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return redirect(url_for('admin_platos'))
-
-
-CONVERSION_FACTORS = {
-    'kg': {'g': 1000, 'lb': 2.20462, 'oz': 35.274},
-    'g': {'kg': 0.001, 'lb': 0.00220462, 'oz': 0.035274},
-    'lb': {'kg': 0.453592, 'g': 453.592, 'oz': 16},
-    'oz': {'kg': 0.0283495, 'g': 28.3495, 'lb': 0.0625},
-    'lt': {'ml': 1000, 'gal': 0.264172},
-    'ml': {'lt': 0.001, 'gal': 0.000264172},
-    'gal': {'lt': 3.78541, 'ml': 3785.41},
-    'un': {'un': 1}
-}
+def unidad_base(unidad):
+    """Unidad base de la magnitud de la unidad (g, ml o un)"""
+    return MAGNITUDES[magnitud(unidad)]
 
-def convert_units(quantity, from_unit, to_unit):
-    """Convierte entre unidades de medida con manejo de errores mejorado"""
-    if from_unit not in CONVERSION_FACTORS:
-        raise ValueError(f"Unidad de origen '{from_unit}' no soportada")
-    
-    if to_unit not in CONVERSION_FACTORS:
-        raise ValueError(f"Unidad de destino '{to_unit}' no soportada")
-    
-    if from_unit == to_unit:
-        return quantity
-    
+def factor_conversion(from_unit, to_unit):
+    """Factor por el que se multiplica una cantidad en from_unit para pasarla a to_unit"""
     try:
-        factor = CONVERSION_FACTORS[from_unit][to_unit]
-        return quantity * factor
+        return FACTORES_CONVERSION[from_unit, to_unit]
     except KeyError:
-        # Intentar conversión a través de una unidad intermedia
+        origen, destino = magnitud(from_unit), magnitud(to_unit)
+        raise UnidadIncompatible(
+            f"No se puede convertir {from_unit} ({origen}) a {to_unit} ({destino})") from None
+
+def convert_units(quantity, from_unit, to_unit):
+    """Convierte una cantidad entre unidades de la misma magnitud"""
+    return quantity * factor_conversion(from_unit, to_unit)
+
+def convertir_lote(cantidades, desde, hacia=None, estricto=True):
+    """Convierte una secuencia de cantidades de una vez
+
+    desde y hacia pueden ser una unidad o una secuencia del mismo largo que
+    cantidades; sin hacia, cada cantidad se pasa a la unidad base de su
+    magnitud. Con estricto=False una conversión imposible da None en lugar de
+    lanzar el error.
+    """
+    cantidades = list(cantidades)
+    desde = [desde] * len(cantidades) if isinstance(desde, str) else list(desde)
+    if hacia is None:
+        hacia = [MAGNITUDES.get(MAGNITUD_UNIDAD.get(unidad)) for unidad in desde]
+    elif isinstance(hacia, str):
+        hacia = [hacia] * len(cantidades)
+    else:
+        hacia = list(hacia)
+    if not len(cantidades) == len(desde) == len(hacia):
+        raise ValueError('cantidades, desde y hacia deben tener el mismo largo')
+    # Un factor por cada par distinto de unidades, no por cada cantidad
+    pares = {}
+    for par in set(zip(desde, hacia)):
         try:
-            # Buscar una ruta de conversión (ej: oz → kg → g)
-            for intermediate_unit in CONVERSION_FACTORS[from_unit]:
-                if intermediate_unit in CONVERSION_FACTORS and to_unit in CONVERSION_FACTORS[intermediate_unit]:
-                    intermediate_value = quantity * CONVERSION_FACTORS[from_unit][intermediate_unit]
-                    return intermediate_value * CONVERSION_FACTORS[intermediate_unit][to_unit]
-        except:
-            pass
-        
-        raise ValueError(f"No se puede convertir de {from_unit} a {to_unit}")
+            pares[par] = factor_conversion(*par)
+        except ValueError:
+            if estricto:
+                raise
+            pares[par] = None
+    return [None if pares[par] is None or cantidad is None else cantidad * pares[par]
+            for cantidad, par in zip(cantidades, zip(desde, hacia))]
 
-# Función adicional para el problema del queso
 def calculate_price_per_unit(total_price, total_quantity, quantity_unit, target_unit="g"):
     """
     Calcula el precio por unidad de medida
     Ejemplo: 10 lb de queso a $3500 → precio por 100g
     """
-    # Convertir la cantidad total a la unidad objetivo
-    converted_quantity = convert_units(total_quantity, quantity_unit, target_unit)
-    
-    # Calcular precio por unidad
-    price_per_unit = total_price / converted_quantity
-    
-    return price_per_unit
+    return total_price / convert_units(total_quantity, quantity_unit, target_unit)
 
-@app.route('/admin/calcular_costo_plato', methods=['POST'])
-@login_required
-def calcular_costo_plato():
-    data = request.get_json()
-    ingredientes:Ingredient = data.get('ingredientes', [])
-    
-    costo_total = 0
-    for ingrediente in ingredientes:
-        producto_id = ingrediente.get('producto_id')
-        cantidad = ingrediente.get('cantidad', 0)
-        
-        producto:Producto = Producto.query.get(producto_id)
-        if producto:
-            costo_total += calculate_price_per_unit(producto.precio_compra,producto.cantidad,producto.unidad_medida) * cantidad
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return jsonify({'costo': round(costo_total, 2)})
+# Costos y márgenes de los platos
+# Los productos activos se leen una sola vez y se normaliza su precio a la
+# unidad base de su magnitud (g, ml o unidad), que es en la que se cargan las
+# cantidades de las recetas. Con eso el costo de toda la carta sale de una
+# sola pasada por las filas de ingrediente_plato, sin consultas por producto.
+# La tabla se guarda por proceso y se reconstruye cuando cambia costos.version.
+ajustes['FOOD_COST_OBJETIVO'] = float(os.environ.get('FOOD_COST_OBJETIVO', 35))
 
-# Gestión de categorías
-@app.route('/admin/categorias')
-@login_required
-def admin_categorias():
-    categorias = Categoria.query.all()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/categorias.html', categorias=categorias,config=config)
-
-@app.route('/admin/categoria/nueva', methods=['GET', 'POST'])
-@login_required
-def nueva_categoria():
-    if request.method == 'POST':
-        nombre = request.form.get('nombre')
-        descripcion = request.form.get('descripcion')
-        
-        nueva_categoria = Categoria(
-            nombre=nombre,
-            descripcion=descripcion,
-            activa='activa' in request.form
-        )
-        
-        db.session.add(nueva_categoria)
-        db.session.commit()
-        
-        flash('Categoría creada correctamente.', 'success')
-        return redirect(url_for('admin_categorias'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_categoria.html',config=config)
+CostoPlato = namedtuple('CostoPlato', ['plato_id', 'activo', 'precio_venta', 'costo', 'margen',
+                                       'food_cost', 'incompleto'])
 
-@app.route('/admin/categoria/editar/<int:categoria_id>', methods=['GET', 'POST'])
-@login_required
-def editar_categoria(categoria_id):
-    categoria = Categoria.query.get_or_404(categoria_id)
-    
-    if request.method == 'POST':
-        categoria.nombre = request.form.get('nombre')
-        categoria.descripcion = request.form.get('descripcion')
-        categoria.activa = 'activa' in request.form
-        
-        db.session.commit()
-        
-        flash('Categoría actualizada correctamente.', 'success')
-        return redirect(url_for('admin_categorias'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_categoria.html', categoria=categoria,config=config)
+def costo_plato(plato_id, activo, precio_venta, costo, incompleto=False):
+    costo = round(costo, 2)
+    food_cost = round(costo / precio_venta * 100, 1) if precio_venta and precio_venta > 0 else None
+    return CostoPlato(plato_id, activo, precio_venta, costo, round(precio_venta - costo, 2),
+                      food_cost, incompleto)
 
-@app.route('/admin/categoria/eliminar/<int:categoria_id>', methods=['POST'])
-@login_required
-def eliminar_categoria(categoria_id):
-    categoria = Categoria.query.get_or_404(categoria_id)
-    
-    # Verificar si la categoría tiene platos asociados
-    if categoria.platos:
-        flash('No se puede eliminar la categoría porque tiene platos asociados.', 'error')
-        return redirect(url_for('admin_categorias'))
-    
-    db.session.delete(categoria)
-    db.session.commit()
-    
-    flash('Categoría eliminada correctamente.', 'success')
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return redirect(url_for('admin_categorias'))
+class TablaCostos:
+    """Costo, margen y food cost de todos los platos para una versión de los costos"""
 
-# Gestión de extras
-@app.route('/admin/extras')
-@login_required
-def admin_extras():
-    extras = Extra.query.all()
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/extras.html', extras=extras,config=config)
-
-@app.route('/admin/extra/nuevo', methods=['GET', 'POST'])
-@login_required
-def nuevo_extra():
-    if request.method == 'POST':
-        nombre = request.form.get('nombre')
-        precio = float(request.form.get('precio', 0))
-        
-        nuevo_extra = Extra(
-            nombre=nombre,
-            precio=precio,
-            activo='activo' in request.form
-        )
-        
-        db.session.add(nuevo_extra)
-        db.session.commit()
-        
-        flash('Extra creado correctamente.', 'success')
-        return redirect(url_for('admin_extras'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_extra.html',config=config)
+    def __init__(self, version, costos_base, platos):
+        self.version = version
+        self.costos_base = costos_base  # producto_id -> precio por unidad base
+        self._platos = platos
 
-@app.route('/admin/extra/editar/<int:extra_id>', methods=['GET', 'POST'])
-@login_required
-def editar_extra(extra_id):
-    extra = Extra.query.get_or_404(extra_id)
-    
-    if request.method == 'POST':
-        extra.nombre = request.form.get('nombre')
-        extra.precio = float(request.form.get('precio', 0))
-        extra.activo = 'activo' in request.form
-        
-        db.session.commit()
-        
-        flash('Extra actualizado correctamente.', 'success')
-        return redirect(url_for('admin_extras'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/editar_extra.html', extra=extra,config=config)
+    def plato(self, plato_id):
+        return self._platos.get(plato_id)
 
-@app.route('/admin/extra/eliminar/<int:extra_id>', methods=['POST'])
-@login_required
-def eliminar_extra(extra_id):
-    extra = Extra.query.get_or_404(extra_id)
-    
-    # Verificar si el extra está en algún pedido
-    extras_pedido = ExtraPedido.query.filter_by(extra_id=extra_id).count()
-    if extras_pedido > 0:
-        flash('No se puede eliminar el extra porque está incluido en uno o más pedidos.', 'error')
-        return redirect(url_for('admin_extras'))
-    
-    db.session.delete(extra)
-    db.session.commit()
-    
-    flash('Extra eliminado correctamente.', 'success')
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return redirect(url_for('admin_extras'),config=config)
+    def costo_receta(self, ingredientes):
+        """Costo de una lista de (producto_id, cantidad); devuelve (costo, incompleto)"""
+        costo = 0.0
+        incompleto = False
+        for producto_id, cantidad in ingredientes:
+            unitario = self.costos_base.get(producto_id)
+            if unitario is None:
+                incompleto = True
+                continue
+            costo += unitario * cantidad
+        return costo, incompleto
 
-# Configuración del restaurante
-@app.route('/admin/configuracion', methods=['GET', 'POST'])
-@admin_required
-def admin_configuracion():
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    
-    if request.method == 'POST':
-        config.nombre_restaurante = request.form.get('nombre_restaurante')
-        config.telefono = request.form.get('telefono')
-        config.direccion = request.form.get('direccion')
-        config.impuesto = float(request.form.get('impuesto', 0))
-        config.max_extras = int(request.form.get('max_extras', 5))
-        
-        # Manejar el logo
-        if 'logo' in request.files:
-            archivo = request.files['logo']
-            if archivo and archivo.filename:
-                # Eliminar logo anterior si existe y no es el default
-                if config.logo and config.logo != 'logo.png' and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], config.logo)):
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], config.logo))
-                
-                filename = secure_filename(archivo.filename)
-                nombre_unico = f"logo_{datetime.now().timestamp()}_{filename}"
-                archivo.save(os.path.join(app.config['UPLOAD_FOLDER'], nombre_unico))
-                config.logo = nombre_unico
-        
-        db.session.commit()
-        flash('Configuración actualizada correctamente.', 'success')
-        return redirect(url_for('admin_configuracion'))
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return render_template('admin/configuracion.html', config=config)
+    def resumen(self):
+        """Food cost y margen de la carta activa"""
+        activos = [c for c in self._platos.values() if c.activo and c.food_cost is not None]
+        ventas = sum(c.precio_venta for c in activos)
+        return {
+            'platos': len(activos),
+            'food_cost': round(sum(c.costo for c in activos) / ventas * 100, 1) if ventas else None,
+            'margen_promedio': round(sum(c.margen for c in activos) / len(activos), 2) if activos else 0.0,
+            'incompletos': sum(1 for c in activos if c.incompleto),
+        }
+
+def _construir_costos(version):
+    productos = db.session.query(
+        Producto.id, Producto.precio_compra, Producto.cantidad, Producto.unidad_medida
+    ).filter(Producto.activo == True).all()
+    # Todas las cantidades compradas a la unidad base en una sola conversión
+    cantidades_base = convertir_lote([p.cantidad for p in productos],
+                                     [p.unidad_medida for p in productos], estricto=False)
+    costos_base = {
+        producto.id: producto.precio_compra / cantidad
+        for producto, cantidad in zip(productos, cantidades_base)
+        if cantidad
+    }
+    costos = {}
+    incompletos = set()
+    for plato_id, producto_id, cantidad in db.session.query(
+            IngredientePlato.plato_id, IngredientePlato.producto_id, IngredientePlato.cantidad):
+        unitario = costos_base.get(producto_id)
+        if unitario is None:
+            incompletos.add(plato_id)
+            continue
+        costos[plato_id] = costos.get(plato_id, 0.0) + unitario * cantidad
+    platos = {
+        plato_id: costo_plato(plato_id, bool(activo), precio_venta, costos.get(plato_id, 0.0),
+                              plato_id in incompletos)
+        for plato_id, activo, precio_venta in db.session.query(Plato.id, Plato.activo, Plato.precio_venta)
+    }
+    return TablaCostos(version, costos_base, platos)
+
+_costos_lock = threading.Lock()
+_tabla_costos = None
+
+def obtener_costos():
+    """Devuelve la tabla de costos vigente, recalculándola si cambió"""
+    global _tabla_costos
+    version, _ = _leer_version(archivo_version('costos'))
+    tabla = _tabla_costos
+    if tabla is not None and tabla.version == version:
+        METRICA_CACHE.labels(cache='costos', resultado='acierto').inc()
+        return tabla
+    with _costos_lock:
+        if _tabla_costos is None or _tabla_costos.version != version:
+            METRICA_CACHE.labels(cache='costos', resultado='fallo').inc()
+            _tabla_costos = _construir_costos(version)
+        return _tabla_costos
+
+def invalidar_costos():
+    """Publica una nueva versión de los costos; llamar después del commit"""
+    global _tabla_costos
+    _publicar_version(archivo_version('costos'))
+    _tabla_costos = None
 
 # API para obtener información del carrito
-@app.route('/api/carrito')
+@publico.route('/api/carrito')
 def api_carrito():
-    carrito = session.get('carrito', [])
-    config = Configuracion.query.first()
-    if not config:
-        config = Configuracion()
-        db.session.add(config)
-        db.session.commit()
-    return jsonify({'count': len(carrito), 'items': carrito})
+    items = items_carrito(carrito_actual())
+    return jsonify({'count': len(items), 'items': items})
+
+# Métricas para Prometheus
+@publico.route('/metrics')
+def metricas():
+    if prom is None or not current_app.config['METRICAS']:
+        abort(404)
+    if not acceso_metricas_permitido():
+        abort(403)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = prom.CollectorRegistry()
+        prom_multiproceso.MultiProcessCollector(registro)
+    else:
+        registro = prom.REGISTRY
+    pedidos = prom.CollectorRegistry()
+    pedidos.register(ColectorPedidos())
+    return Response(prom.generate_latest(registro) + prom.generate_latest(pedidos),
+                    content_type=prom.CONTENT_TYPE_LATEST)
 
 # Ruta para servir archivos subidos
-@app.route('/uploads/<filename>')
+@publico.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Los nombres derivan del contenido y nunca se sobrescriben: se cachean un año
+    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename,
+                                   max_age=current_app.config['UPLOADS_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# Migraciones del esquema
+# db.create_all() crea las tablas que faltan pero no toca las existentes. Cada
+# migración es una lista de sentencias idempotentes con un número de versión
+# (o funciones, para lo que SQL no puede hacer idempotente, como agregar una
+# columna); las ya aplicadas quedan registradas en la tabla migracion_esquema.
+MIGRACIONES = [
+    (1, 'Índices para los filtros y conteos frecuentes', [
+        'CREATE INDEX IF NOT EXISTS ix_pedido_estado_fecha ON pedido (estado, fecha_creacion)',
+        'CREATE INDEX IF NOT EXISTS ix_pedido_fecha ON pedido (fecha_creacion)',
+        'CREATE INDEX IF NOT EXISTS ix_plato_activo_categoria ON plato (activo, categoria_id)',
+        'CREATE INDEX IF NOT EXISTS ix_item_pedido_pedido_id ON item_pedido (pedido_id)',
+        'CREATE INDEX IF NOT EXISTS ix_item_pedido_plato_id ON item_pedido (plato_id)',
+        'CREATE INDEX IF NOT EXISTS ix_extra_pedido_pedido_id ON extra_pedido (pedido_id)',
+        'CREATE INDEX IF NOT EXISTS ix_extra_pedido_extra_id ON extra_pedido (extra_id)',
+        'CREATE INDEX IF NOT EXISTS ix_ingrediente_plato_plato_id ON ingrediente_plato (plato_id)',
+        'CREATE INDEX IF NOT EXISTS ix_ingrediente_plato_producto_id ON ingrediente_plato (producto_id)',
+        'ANALYZE',
+    ]),
+    (2, 'Índice para buscar pedidos por teléfono', [
+        'CREATE INDEX IF NOT EXISTS ix_pedido_cliente_telefono ON pedido (cliente_telefono)',
+    ]),
+    (3, 'Existencias de productos y descuento de inventario', [
+        lambda: agregar_columna('producto', 'existencia', 'FLOAT'),
+        lambda: agregar_columna('producto', 'stock_minimo', 'FLOAT NOT NULL DEFAULT 0'),
+        lambda: agregar_columna('plato', 'agotado', 'BOOLEAN NOT NULL DEFAULT 0'),
+        lambda: agregar_columna('pedido', 'inventario_descontado', 'BOOLEAN NOT NULL DEFAULT 0'),
+    ]),
+]
+
+def agregar_columna(tabla, columna, definicion):
+    """ALTER TABLE … ADD COLUMN que no falla si create_all() ya creó la columna"""
+    existentes = {fila[1] for fila in db.session.execute(text(f'PRAGMA table_info({tabla})'))}
+    if columna not in existentes:
+        db.session.execute(text(f'ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}'))
+
+class MigracionEsquema(db.Model):
+    __tablename__ = 'migracion_esquema'
+    version = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(200), nullable=False)
+    fecha_aplicacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+def aplicar_migraciones():
+    """Aplica en orden las migraciones pendientes y devuelve sus versiones"""
+    MigracionEsquema.__table__.create(db.engine, checkfirst=True)
+    aplicadas = {version for (version,) in db.session.query(MigracionEsquema.version)}
+    nuevas = []
+    for version, nombre, sentencias in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        try:
+            for sentencia in sentencias:
+                if callable(sentencia):
+                    sentencia()
+                else:
+                    db.session.execute(text(sentencia))
+            db.session.add(MigracionEsquema(version=version, nombre=nombre))
+            db.session.commit()
+        except IntegrityError:
+            # Otro worker la registró al mismo tiempo
+            db.session.rollback()
+            continue
+        nuevas.append(version)
+    return nuevas
+
+@nucleo.cli.command('migrar')
+def migrar_comando():
+    """Crea las tablas que falten y aplica las migraciones pendientes"""
+    db.create_all()
+    nuevas = aplicar_migraciones()
+    if nuevas:
+        print(f"Migraciones aplicadas: {', '.join(map(str, nuevas))}")
+    else:
+        print('El esquema ya está al día.')
 
 # Inicializar la base de datos y crear usuario admin por defecto
-@app.before_first_request
 def inicializar_base_datos():
     db.create_all()
+    aplicar_migraciones()
+    asegurar_resumenes_ventas()
+    crear_indice_busqueda()
+    asegurar_configuracion()
+    invalidar_menu()
     
     # Crear usuario admin por defecto si no existe
     if not Usuario.query.filter_by(username='admin').first():
@@ -1113,5 +2678,82 @@ def inicializar_base_datos():
         db.session.commit()
         print("Usuario admin creado: admin / admin123")
 
+@nucleo.cli.command('inicializar')
+def inicializar_comando():
+    """Crea el esquema, aplica las migraciones y crea el usuario admin si falta"""
+    inicializar_base_datos()
+    print('Base de datos lista.')
+
+# Arranque
+# Importar app.py no toca la base ni crea ninguna app: create_app() arma una
+# nueva cada vez que se llama. gunicorn la usa como "app:create_app()" y
+# `flask --app app ...` la encuentra sola. La base se prepara aparte con flask
+# inicializar (y flask migrar en cada actualización), así ningún worker lo hace
+# al recibir la primera petición. Con gunicorn.conf.py (preload_app)
+# create_app() corre una sola vez en el proceso principal: las cachés se llenan
+# ahí y los workers las heredan al hacer fork, antes de aceptar conexiones.
+def calentar_caches(aplicacion):
+    """Carga configuración, menú, costos y recetas del menú en las cachés del proceso"""
+    try:
+        with aplicacion.test_request_context():  # el menú arma las URLs de las imágenes
+            obtener_configuracion()
+            menu_actual = obtener_menu()
+            obtener_costos()
+            recetario.expandir([plato.id for plato in menu_actual.filtrar(None, '')])
+            # Plantillas públicas ya compiladas: la primera visita no paga el parseo
+            for plantilla in ('base.html', 'index.html', 'platos_list.html', 'carrito.html'):
+                aplicacion.jinja_env.get_template(plantilla)
+    except OperationalError:
+        aplicacion.logger.warning('No se pudieron calentar las cachés; ¿falta ejecutar flask inicializar?')
+    # Las conexiones abiertas no deben pasar a los workers a través del fork
+    with aplicacion.app_context():
+        db.engine.dispose()
+    if 'engine_lectura' in aplicacion.extensions:
+        aplicacion.extensions['engine_lectura'].dispose()
+
+def create_app(config=None, panel_admin=None, calentar=None):
+    """Arma una app con las rutas públicas y, si corresponde, las del panel
+
+    config reemplaza ajustes solo para esta app (por ejemplo la base o
+    VERSIONES_DIR en las pruebas). panel_admin=False (o PANEL_ADMIN=0) deja
+    solo las rutas públicas, para workers de clientes detrás de un proxy que
+    envía /admin y /login a otros; en ese caso panel.py ni siquiera se importa.
+    calentar=False (o CALENTAR_CACHES=0) no llena las cachés al arrancar.
+    """
+    aplicacion = Flask(__name__, instance_path=INSTANCE_DIR)
+    aplicacion.config.from_mapping(ajustes)
+    aplicacion.config.from_mapping(config or {})
+    if panel_admin is not None:
+        aplicacion.config['PANEL_ADMIN'] = panel_admin
+    if aplicacion.config['INVENTARIO_ESTADO'] not in ORDEN_ESTADOS:
+        raise RuntimeError(f"INVENTARIO_ESTADO debe ser uno de: {', '.join(ORDEN_ESTADOS)}")
+    perfil = aplicacion.config['DB_PERFIL']
+    if _es_sqlite_en_archivo(aplicacion.config['SQLALCHEMY_DATABASE_URI']):
+        aplicacion.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', PERFILES_BD[perfil]['engine'])
+
+    db.init_app(aplicacion)
+    with aplicacion.app_context():
+        event.listen(db.engine, 'connect', _pragmas_sqlite(perfil))
+        if aplicacion.config['METRICAS']:
+            _medir_engine(db.engine, aplicacion.config['SQLITE_ESPERA_UMBRAL'])
+    aplicacion.extensions['difusor_eventos'] = DifusorEventos(aplicacion, aplicacion.config['EVENTOS_BUFFER'])
+    aplicacion.extensions['carritos'] = crear_almacen_carritos(aplicacion.config)
+
+    aplicacion.register_blueprint(nucleo)
+    aplicacion.register_blueprint(publico)
+    if aplicacion.config['PANEL_ADMIN']:
+        from panel import admin
+        aplicacion.register_blueprint(admin)
+    os.makedirs(aplicacion.config['UPLOAD_FOLDER'], exist_ok=True)
+    if calentar is None:
+        # Los comandos de flask (inicializar, migrar…) no usan las cachés y
+        # pueden correr sobre una base todavía sin migrar
+        calentar = aplicacion.config['CALENTAR_CACHES'] and click.get_current_context(silent=True) is None
+    if calentar:
+        calentar_caches(aplicacion)
+    return aplicacion
+
 if __name__ == '__main__':
-    app.run(debug=True,port=443)
\ No newline at end of file
+    # panel.py importa app: que reciba este mismo módulo y no una segunda copia
+    sys.modules.setdefault('app', sys.modules[__name__])
+    create_app().run(debug=True,port=443)
@@ -0,0 +1,17 @@
+"""Benchmarks y pruebas de carga de Yekka Menú
+
+Todo se ejecuta desde la raíz del repositorio:
+
+    python -m benchmarks.endpoints --salida resultados/endpoints.json
+    python -m benchmarks.carga --segundos 30 --usuarios 16 --salida resultados/carga.json
+    python -m benchmarks.comparar resultados/antes.json resultados/despues.json
+    python benchmarks/pedidos.py
+
+endpoints y carga siembran un restaurante sintético (benchmarks/datos.py) en
+una base SQLite aparte; con la misma semilla y los mismos tamaños la base es
+idéntica entre ejecuciones. Con --base se reutiliza una base ya sembrada y
+se evita repetir la siembra de cientos de miles de pedidos; como las pruebas
+agregan pedidos, para comparar versiones conviene partir de copias de la
+misma base. Los resultados son JSON con el commit y el entorno, para
+comparar versiones con comparar.
+"""
@@ -0,0 +1,245 @@
+"""Prueba de carga: clientes que navegan, piden y cocina que avanza pedidos
+
+Uso:
+    python -m benchmarks.carga --usuarios 16 --segundos 30 --salida resultados/carga.json
+    python -m benchmarks.carga --url http://127.0.0.1:8000 --usuarios 32 --segundos 60
+
+Cada usuario es un hilo que elige tareas según la mezcla (al estilo de
+locust): navegar el menú y buscar, armar un carrito, cotizarlo y hacer el
+pedido, o trabajar de cocina mirando el tablero y pasando un pedido al estado
+siguiente. Sin --url las peticiones van por el cliente de pruebas de Flask
+contra una base sembrada en el mismo proceso, así que el GIL limita la
+concurrencia real; con --url se ataca un servidor ya levantado (por ejemplo
+gunicorn -c gunicorn.conf.py sobre una base de benchmarks.datos).
+"""
+import argparse
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from json import dumps, loads
+
+from benchmarks import comun
+
+MEZCLA = 'navegar=60,pedir=25,cocina=15'
+SIGUIENTE_ESTADO = {'pendiente': 'confirmado', 'confirmado': 'preparando',
+                    'preparando': 'enviado', 'enviado': 'entregado'}
+
+
+class ClienteFlask:
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def pedir(self, metodo, url, json=None, data=None):
+        respuesta = self.cliente.open(url, method=metodo, json=json, data=data)
+        return respuesta.status_code, respuesta.data
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHTTP:
+    """Cliente urllib con cookies propias; no sigue redirecciones, igual que el de pruebas"""
+
+    def __init__(self, base):
+        self.base = base.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedirecciones())
+
+    def pedir(self, metodo, url, json=None, data=None):
+        cuerpo, cabeceras = None, {}
+        if json is not None:
+            cuerpo, cabeceras = dumps(json).encode(), {'Content-Type': 'application/json'}
+        elif data is not None:
+            cuerpo = urllib.parse.urlencode(data).encode()
+            cabeceras = {'Content-Type': 'application/x-www-form-urlencoded'}
+        peticion = urllib.request.Request(self.base + url, data=cuerpo, headers=cabeceras, method=metodo)
+        try:
+            with self.opener.open(peticion, timeout=30) as respuesta:
+                return respuesta.status, respuesta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Usuario:
+    """Un hilo de la prueba; anota cada petición en registro"""
+
+    def __init__(self, cliente, rng, registro):
+        self.cliente = cliente
+        self.rng = rng
+        self.registro = registro
+        self.platos = []
+        self.categorias = []
+
+    def pedir(self, nombre, metodo, url, esperado=200, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            estado, cuerpo = self.cliente.pedir(metodo, url, **kwargs)
+        except OSError:
+            estado, cuerpo = None, b''
+        self.registro.anotar(nombre, time.perf_counter() - inicio, estado == esperado)
+        return cuerpo if estado == esperado else None
+
+    def navegar(self):
+        if self.pedir('menu', 'GET', '/') is None:
+            return
+        if not self.categorias:
+            cuerpo = self.pedir('api_categorias', 'GET', '/api/categorias')
+            self.categorias = [c['id'] for c in loads(cuerpo)] if cuerpo else []
+        if self.categorias:
+            cuerpo = self.pedir('api_platos', 'GET',
+                                f'/api/platos?categoria_id={self.rng.choice(self.categorias)}')
+            if cuerpo:
+                self.platos = [p['id'] for p in loads(cuerpo)] or self.platos
+        texto = urllib.parse.quote(self.rng.choice(('pol', 'arroz', 'queso fr', 'cam')))
+        self.pedir('buscar', 'GET', f'/api/platos/buscar?q={texto}')
+
+    def pedir_comida(self):
+        if not self.platos:
+            self.navegar()
+        if not self.platos:
+            return
+        carrito = [{'plato_id': plato_id, 'cantidad': self.rng.randint(1, 3)}
+                   for plato_id in self.rng.sample(self.platos, min(len(self.platos), self.rng.randint(1, 4)))]
+        if self.pedir('cotizar', 'POST', '/api/cotizar', json={'carrito': carrito}) is None:
+            return
+        self.pedir('realizar_pedido', 'POST', '/realizar_pedido', json={
+            'form': {'nombre': 'Carga', 'telefono': f'5{self.rng.randrange(10 ** 7):07d}',
+                     'direccion': 'Calle 1'},
+            'carrito': carrito,
+        })
+
+    def cocina(self):
+        self.pedir('cocina', 'GET', '/admin/api/cocina')
+        estado = self.rng.choice(tuple(SIGUIENTE_ESTADO))
+        cuerpo = self.pedir('admin_api_pedidos', 'GET', f'/admin/api/pedidos?estado={estado}&limit=10')
+        pedidos = loads(cuerpo)['pedidos'] if cuerpo else []
+        if pedidos:
+            pedido = self.rng.choice(pedidos)
+            self.pedir('cambiar_estado', 'POST', f"/admin/cambiar_estado_pedido/{pedido['id']}",
+                       esperado=302, data={'estado': SIGUIENTE_ESTADO[estado]})
+
+
+class Registro:
+    """Duraciones por tipo de petición, compartidas entre hilos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiempos = {}
+        self.errores = {}
+        self.tareas = {}
+
+    def contar_tarea(self, tarea):
+        with self.lock:
+            self.tareas[tarea] = self.tareas.get(tarea, 0) + 1
+
+    def anotar(self, nombre, segundos, ok):
+        with self.lock:
+            if ok:
+                self.tiempos.setdefault(nombre, []).append(segundos)
+            else:
+                self.errores[nombre] = self.errores.get(nombre, 0) + 1
+
+    def resumen(self, segundos):
+        nombres = sorted(set(self.tiempos) | set(self.errores))
+        peticiones = {}
+        for nombre in nombres:
+            peticiones[nombre] = comun.estadisticas(self.tiempos.get(nombre, []), segundos)
+            peticiones[nombre]['errores'] = self.errores.get(nombre, 0)
+        todas = [t for tiempos in self.tiempos.values() for t in tiempos]
+        total = comun.estadisticas(todas, segundos)
+        total['errores'] = sum(self.errores.values())
+        return {'total': total, 'peticiones': peticiones}
+
+
+def leer_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(','):
+        tarea, _, peso = parte.partition('=')
+        if tarea not in ('navegar', 'pedir', 'cocina'):
+            raise argparse.ArgumentTypeError(f'tarea desconocida: {tarea}')
+        mezcla[tarea] = int(peso)
+    return mezcla
+
+
+def fabrica_clientes(args):
+    """Función que crea el cliente de cada usuario, y los datos sembrados si son locales"""
+    if args.url:
+        def crear(admin):
+            cliente = ClienteHTTP(args.url)
+            if admin:
+                estado, _ = cliente.pedir('POST', '/login', data={'username': args.usuario,
+                                                                  'password': args.clave})
+                if estado != 302:
+                    raise SystemExit(f'No se pudo iniciar sesión en {args.url} como {args.usuario}')
+            return cliente
+        return crear, None
+
+    yekka, aplicacion, tamanos = comun.preparar(args)
+
+    def crear(admin):
+        return ClienteFlask(comun.cliente_admin(yekka, aplicacion) if admin else aplicacion.test_client())
+    return crear, tamanos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    comun.argumentos_siembra(parser)
+    parser.add_argument('--url', help='servidor a atacar; sin esto se usa el cliente de pruebas')
+    parser.add_argument('--usuario', default='admin', help='usuario de cocina con --url')
+    parser.add_argument('--clave', default='admin123', help='clave de cocina con --url')
+    parser.add_argument('--usuarios', type=int, default=16, help='hilos concurrentes')
+    parser.add_argument('--segundos', type=float, default=30)
+    parser.add_argument('--espera', type=float, default=0, help='pausa máxima entre tareas, en segundos')
+    parser.add_argument('--mezcla', type=leer_mezcla, default=leer_mezcla(MEZCLA),
+                        help=f'pesos de cada tarea (por defecto {MEZCLA})')
+    parser.add_argument('--salida', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    crear, tamanos = fabrica_clientes(args)
+    registro = Registro()
+    tareas = list(args.mezcla)
+    pesos = [args.mezcla[tarea] for tarea in tareas]
+    usuarios = []
+    for n in range(args.usuarios):
+        rng = random.Random(args.semilla + n)
+        usuarios.append(Usuario(crear(admin='cocina' in tareas), rng, registro))
+
+    fin = time.perf_counter() + args.segundos
+
+    def trabajar(usuario):
+        acciones = {'navegar': usuario.navegar, 'pedir': usuario.pedir_comida, 'cocina': usuario.cocina}
+        while time.perf_counter() < fin:
+            tarea = usuario.rng.choices(tareas, pesos)[0]
+            acciones[tarea]()
+            registro.contar_tarea(tarea)
+            if args.espera:
+                time.sleep(usuario.rng.uniform(0, args.espera))
+
+    hilos = [threading.Thread(target=trabajar, args=(usuario,), daemon=True) for usuario in usuarios]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    resumen = registro.resumen(segundos)
+    for nombre, r in resumen['peticiones'].items():
+        print(f"{nombre:>18}: {r['muestras']:>7} ok {r['errores']:>5} err  "
+              f"p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  {r['por_segundo']}/s")
+    total = resumen['total']
+    print(f"{'total':>18}: {total['muestras']:>7} ok {total['errores']:>5} err  {total['por_segundo']}/s")
+
+    comun.guardar({'benchmark': 'carga', 'entorno': comun.entorno(), 'datos': tamanos,
+                   'url': args.url, 'usuarios': args.usuarios, 'segundos': round(segundos, 2),
+                   'mezcla': args.mezcla, 'tareas': registro.tareas, **resumen}, args.salida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compara dos resultados JSON de benchmarks.endpoints o benchmarks.carga
+
+Uso:
+    python -m benchmarks.comparar resultados/antes.json resultados/despues.json --umbral 10
+
+Muestra p50, p95 y sentencias SQL de cada caso en las dos versiones y la
+variación. Sale con código 1 si algún p50 o p95 empeora más que el umbral (en
+porcentaje), para usarlo en integración continua.
+"""
+import argparse
+import json
+import sys
+
+METRICAS = ('p50_ms', 'p95_ms', 'sql_por_llamada')
+
+
+def casos(resultado):
+    """Casos medidos: los de endpoints o las peticiones de carga"""
+    return resultado.get('resultados') or resultado.get('peticiones') or {}
+
+
+def variacion(antes, despues):
+    if antes in (None, 0) or despues is None:
+        return None
+    return round((despues - antes) / antes * 100, 1)
+
+
+def comparar(antes, despues, umbral):
+    """Devuelve (filas, regresiones) con una fila por caso y métrica"""
+    filas, regresiones = [], []
+    casos_antes, casos_despues = casos(antes), casos(despues)
+    for nombre in sorted(set(casos_antes) & set(casos_despues)):
+        for metrica in METRICAS:
+            valor_antes = casos_antes[nombre].get(metrica)
+            valor_despues = casos_despues[nombre].get(metrica)
+            if valor_antes is None and valor_despues is None:
+                continue
+            cambio = variacion(valor_antes, valor_despues)
+            filas.append((nombre, metrica, valor_antes, valor_despues, cambio))
+            if metrica != 'sql_por_llamada' and cambio is not None and cambio > umbral:
+                regresiones.append(f'{nombre} {metrica} {cambio:+}%')
+    return filas, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('antes')
+    parser.add_argument('despues')
+    parser.add_argument('--umbral', type=float, default=10, help='porcentaje de empeoramiento tolerado')
+    args = parser.parse_args()
+
+    with open(args.antes, encoding='utf-8') as archivo:
+        antes = json.load(archivo)
+    with open(args.despues, encoding='utf-8') as archivo:
+        despues = json.load(archivo)
+    if antes.get('benchmark') != despues.get('benchmark'):
+        parser.error('los dos archivos deben ser del mismo benchmark')
+    if antes.get('datos') != despues.get('datos'):
+        print('Aviso: los datos sembrados no coinciden, la comparación es orientativa')
+    if antes.get('url') != despues.get('url'):
+        print('Aviso: las pruebas de carga apuntan a servidores distintos')
+
+    commit = lambda r: (r.get('entorno', {}).get('commit') or '?')[:10]
+    print(f"{'caso':>22} {'métrica':>16} {commit(antes):>12} {commit(despues):>12} {'cambio':>8}")
+    filas, regresiones = comparar(antes, despues, args.umbral)
+    for nombre, metrica, valor_antes, valor_despues, cambio in filas:
+        texto = f'{cambio:+}%' if cambio is not None else '-'
+        print(f'{nombre:>22} {metrica:>16} {valor_antes!s:>12} {valor_despues!s:>12} {texto:>8}')
+    if regresiones:
+        print('Regresiones: ' + ', '.join(regresiones))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Piezas compartidas por los benchmarks: base sembrada, medición y resultados"""
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks import datos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def argumentos_siembra(parser):
+    grupo = parser.add_argument_group('datos sintéticos')
+    grupo.add_argument('--base', help='base SQLite a reutilizar o sembrar (por defecto, una temporal)')
+    grupo.add_argument('--platos', type=int, default=2000)
+    grupo.add_argument('--productos', type=int, default=300)
+    grupo.add_argument('--pedidos', type=int, default=200000, help='pedidos históricos')
+    grupo.add_argument('--dias', type=int, default=365, help='días que abarca el historial')
+    grupo.add_argument('--semilla', type=int, default=42)
+
+
+def cargar_app(ruta_base):
+    """Importa el módulo apuntando a ruta_base, deja el esquema al día y devuelve (módulo, app)"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(ruta_base)
+    sys.path.insert(0, RAIZ)
+    import app as yekka
+
+    aplicacion = yekka.create_app(calentar=False)
+    with aplicacion.app_context():
+        yekka.inicializar_base_datos()
+    yekka.calentar_caches(aplicacion)
+    return yekka, aplicacion
+
+
+def contar(yekka):
+    db = yekka.db
+    return {
+        'categorias': db.session.query(yekka.Categoria).count(),
+        'productos': db.session.query(yekka.Producto).count(),
+        'platos': db.session.query(yekka.Plato).count(),
+        'ingredientes': db.session.query(yekka.IngredientePlato).count(),
+        'extras': db.session.query(yekka.Extra).count(),
+        'pedidos': db.session.query(yekka.Pedido).count(),
+    }
+
+
+def preparar(args):
+    """Devuelve (módulo, app, tamaños) con la base de args.base, sembrándola si está vacía"""
+    ruta = args.base or os.path.join(tempfile.mkdtemp(prefix='yekka-bench-'), 'bench.db')
+    yekka, aplicacion = cargar_app(ruta)
+    with aplicacion.app_context():
+        if yekka.db.session.query(yekka.Plato).count():
+            return yekka, aplicacion, contar(yekka)
+        tamanos = datos.sembrar(yekka, platos=args.platos, productos=args.productos,
+                                pedidos=args.pedidos, dias=args.dias, semilla=args.semilla)
+    return yekka, aplicacion, tamanos
+
+
+def cliente_admin(yekka, aplicacion):
+    """Cliente de prueba con la sesión del usuario admin"""
+    cliente = aplicacion.test_client()
+    with aplicacion.app_context():
+        admin = yekka.Usuario.query.filter_by(username='admin').first()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = admin.id
+        sesion['username'] = admin.username
+        sesion['rol'] = admin.rol
+    return cliente
+
+
+class ContadorSQL:
+    """Cuenta las sentencias que la app manda a SQLite"""
+
+    def __init__(self, yekka, aplicacion):
+        self.total = 0
+        with aplicacion.app_context():
+            yekka.event.listen(yekka.db.engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def estadisticas(tiempos, segundos=None):
+    """Resumen en milisegundos de una lista de duraciones en segundos"""
+    ordenados = sorted(tiempos)
+    segundos = segundos if segundos is not None else sum(ordenados)
+    ms = lambda valor: None if valor is None else round(valor * 1000, 3)
+    return {
+        'muestras': len(ordenados),
+        'segundos': round(segundos, 4),
+        'por_segundo': round(len(ordenados) / segundos, 1) if segundos else None,
+        'media_ms': ms(sum(ordenados) / len(ordenados)) if ordenados else None,
+        'p50_ms': ms(percentil(ordenados, 50)),
+        'p95_ms': ms(percentil(ordenados, 95)),
+        'p99_ms': ms(percentil(ordenados, 99)),
+        'max_ms': ms(ordenados[-1] if ordenados else None),
+    }
+
+
+def medir(funcion, repeticiones, calentamiento=0, contador=None):
+    """Ejecuta funcion repetidas veces y devuelve sus estadísticas
+
+    Las llamadas de calentamiento llenan las cachés y no se cuentan.
+    """
+    for _ in range(calentamiento):
+        funcion()
+    sentencias = contador.total if contador else 0
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    resultado = estadisticas(tiempos)
+    if contador:
+        resultado['sql_por_llamada'] = round((contador.total - sentencias) / repeticiones, 2)
+    return resultado
+
+
+def _git(*args):
+    try:
+        return subprocess.run(('git',) + args, cwd=RAIZ, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entorno():
+    """Datos de la versión y la máquina que acompañan a cada resultado"""
+    cambios = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+        'commit': _git('rev-parse', 'HEAD'),
+        'cambios_sin_commit': bool(cambios) if cambios is not None else None,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def guardar(resultado, salida):
+    """Escribe el JSON en salida, o en la salida estándar sin ruta"""
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if not salida:
+        print(texto)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as archivo:
+        archivo.write(texto + '\n')
+    print(f'Resultados guardados en {salida}')
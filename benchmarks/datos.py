@@ -0,0 +1,166 @@
+"""Restaurante sintético para benchmarks y pruebas de carga
+
+Uso:
+    python -m benchmarks.datos --base /tmp/yekka-bench.db --pedidos 200000
+
+Siembra categorías, productos con unidades variadas, platos con recetas,
+extras y un historial de pedidos repartido en los últimos días. Todo sale de
+un random.Random(semilla), así que la misma semilla produce la misma base.
+Los pedidos se insertan por bloques con executemany y al final se rehacen los
+resúmenes de ventas y el índice de búsqueda, igual que en una base real.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+UNIDADES = ('kg', 'g', 'lt', 'ml', 'unidad', 'lb', 'docena', 'gal')
+# Cantidad de receta por plato en la unidad base de cada magnitud (g, ml, un)
+CANTIDAD_RECETA = {'g': (20, 400), 'ml': (10, 300), 'un': (1, 4)}
+PALABRAS = ('pollo', 'cerdo', 'res', 'pescado', 'camarón', 'arroz', 'frijoles', 'yuca',
+            'plátano', 'queso', 'jamón', 'tomate', 'cebolla', 'ajo', 'limón', 'coco')
+ESTILOS = ('asado', 'frito', 'a la plancha', 'en salsa', 'al ajillo', 'criollo', 'gratinado')
+# Peso de cada hora del día en el historial: almuerzo y cena concentran los pedidos
+PESO_HORA = (0, 0, 0, 0, 0, 0, 0, 1, 2, 2, 3, 6, 10, 9, 5, 3, 3, 4, 7, 10, 9, 6, 3, 1)
+# Los pedidos de las últimas dos horas siguen abiertos para la cocina
+ESTADOS_ABIERTOS = ('pendiente', 'pendiente', 'confirmado', 'preparando', 'enviado')
+BLOQUE = 5000
+
+
+def sembrar(yekka, platos=2000, productos=300, pedidos=200000, categorias=12, extras=10,
+            dias=365, semilla=42):
+    """Siembra la base ya inicializada y devuelve los tamaños sembrados"""
+    db = yekka.db
+    rng = random.Random(semilla)
+
+    db.session.execute(yekka.Categoria.__table__.insert(), [
+        {'nombre': f'Categoría {i}', 'descripcion': 'Sintética', 'activa': True}
+        for i in range(categorias)
+    ])
+    categoria_ids = [fila[0] for fila in db.session.query(yekka.Categoria.id)]
+
+    filas_productos = []
+    for i in range(productos):
+        unidad = UNIDADES[i % len(UNIDADES)]
+        filas_productos.append({
+            'nombre': f'{rng.choice(PALABRAS)} {i}',
+            'precio_compra': round(rng.uniform(1, 80), 2),
+            'unidad_medida': unidad,
+            'cantidad': rng.choice((1, 2, 5, 10, 25)),
+            # Existencia de sobra: se mide el descuento de inventario sin agotar platos
+            'existencia': 1e9,
+            'stock_minimo': 0.0,
+            'activo': True,
+        })
+    db.session.execute(yekka.Producto.__table__.insert(), filas_productos)
+    productos_db = db.session.query(yekka.Producto.id, yekka.Producto.unidad_medida).all()
+
+    filas_platos = [{
+        'nombre': f'{rng.choice(PALABRAS).capitalize()} {rng.choice(ESTILOS)} {i}',
+        'descripcion': ' '.join(rng.sample(PALABRAS, 4)),
+        'precio_venta': round(rng.uniform(3, 40), 2),
+        'activo': True,
+        'agotado': False,
+        'categoria_id': categoria_ids[i % len(categoria_ids)],
+    } for i in range(platos)]
+    db.session.execute(yekka.Plato.__table__.insert(), filas_platos)
+    platos_db = db.session.query(yekka.Plato.id, yekka.Plato.precio_venta).order_by(yekka.Plato.id).all()
+
+    recetas = []
+    for plato_id, _ in platos_db:
+        for producto_id, unidad in rng.sample(productos_db, rng.randint(3, 8)):
+            minimo, maximo = CANTIDAD_RECETA[yekka.unidad_base(unidad)]
+            recetas.append({'plato_id': plato_id, 'producto_id': producto_id,
+                            'cantidad': round(rng.uniform(minimo, maximo), 1)})
+    db.session.execute(yekka.IngredientePlato.__table__.insert(), recetas)
+
+    db.session.execute(yekka.Extra.__table__.insert(), [
+        {'nombre': f'Extra {i}', 'precio': round(rng.uniform(0.5, 4), 2), 'activo': True}
+        for i in range(extras)
+    ])
+    extras_db = db.session.query(yekka.Extra.id, yekka.Extra.precio).all()
+    db.session.commit()
+
+    sembrar_pedidos(yekka, rng, platos_db, extras_db, pedidos, dias)
+
+    yekka.recalcular_ventas()
+    yekka.indexar_platos()
+    db.session.commit()
+    yekka.invalidar_menu()
+    yekka.invalidar_costos()
+    return {'categorias': categorias, 'productos': productos, 'platos': platos,
+            'ingredientes': len(recetas), 'extras': extras, 'pedidos': pedidos,
+            'dias': dias, 'semilla': semilla}
+
+
+def estado_historico(rng, antiguedad):
+    """Estado de un pedido según cuántas horas tiene"""
+    if antiguedad < 2:
+        return rng.choice(ESTADOS_ABIERTOS)
+    return 'cancelado' if rng.random() < 0.08 else 'entregado'
+
+
+def sembrar_pedidos(yekka, rng, platos_db, extras_db, cantidad, dias):
+    db = yekka.db
+    ahora = datetime.utcnow().replace(microsecond=0)
+    horas = range(24)
+    siguiente_id = (db.session.query(yekka.func.max(yekka.Pedido.id)).scalar() or 0) + 1
+    # Unos pocos platos se venden mucho más que el resto, como en la realidad
+    pesos_platos = [1 / (posicion + 1) for posicion in range(len(platos_db))]
+
+    for inicio in range(0, cantidad, BLOQUE):
+        pedidos, items, extras = [], [], []
+        for pedido_id in range(siguiente_id + inicio, siguiente_id + min(cantidad, inicio + BLOQUE)):
+            dia = rng.randrange(dias)
+            fecha = (ahora - timedelta(days=dia)).replace(
+                hour=rng.choices(horas, PESO_HORA)[0], minute=rng.randrange(60), second=rng.randrange(60))
+            if fecha > ahora:
+                fecha -= timedelta(days=1)
+            estado = estado_historico(rng, (ahora - fecha).total_seconds() / 3600)
+            total = 0.0
+            elegidos = rng.choices(platos_db, pesos_platos, k=rng.randint(1, 6))
+            for plato_id, precio in {plato_id: precio for plato_id, precio in elegidos}.items():
+                unidades = rng.randint(1, 3)
+                total += unidades * precio
+                items.append({'pedido_id': pedido_id, 'plato_id': plato_id, 'cantidad': unidades,
+                              'precio_unitario': precio, 'personalizaciones': '{}'})
+            for extra_id, precio in rng.sample(extras_db, rng.randint(0, min(2, len(extras_db)))):
+                total += precio
+                extras.append({'pedido_id': pedido_id, 'extra_id': extra_id, 'cantidad': 1,
+                               'precio_unitario': precio})
+            pedidos.append({
+                'id': pedido_id,
+                'codigo': f'H{pedido_id:09d}',
+                'cliente_nombre': f'Cliente {rng.randrange(5000)}',
+                'cliente_telefono': f'5{rng.randrange(10 ** 7):07d}',
+                'cliente_direccion': f'Calle {rng.randrange(200)} #{rng.randrange(1, 999)}',
+                'cliente_ubicacion': None,
+                'estado': estado,
+                'total': round(total, 2),
+                'fecha_creacion': fecha,
+                'inventario_descontado': estado != 'cancelado' and yekka.descuenta_inventario(estado),
+            })
+        db.session.execute(yekka.Pedido.__table__.insert(), pedidos)
+        db.session.execute(yekka.ItemPedido.__table__.insert(), items)
+        if extras:
+            db.session.execute(yekka.ExtraPedido.__table__.insert(), extras)
+        db.session.commit()
+
+
+def main():
+    from benchmarks import comun
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    comun.argumentos_siembra(parser)
+    args = parser.parse_args()
+    if not args.base:
+        parser.error('indique --base con la ruta de la base a sembrar')
+    inicio = time.perf_counter()
+    _, _, tamanos = comun.preparar(args)
+    print(json.dumps({'base': args.base, 'segundos': round(time.perf_counter() - inicio, 1),
+                      'datos': tamanos}))
+
+
+if __name__ == '__main__':
+    main()
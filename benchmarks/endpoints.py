@@ -0,0 +1,109 @@
+"""Microbenchmarks de las rutas principales con el cliente de pruebas de Flask
+
+Uso:
+    python -m benchmarks.endpoints --repeticiones 200 --salida resultados/endpoints.json
+
+Mide index(), api_platos(), realizar_pedido(), admin_pedidos() y
+calcular_costo_plato() a través del cliente de pruebas, y convert_units()
+llamada directamente. Cada caso recorre una lista fija de variantes (filtros,
+carritos, recetas) sacada de la semilla, así que dos ejecuciones con los mismos
+argumentos hacen exactamente las mismas peticiones.
+"""
+import argparse
+import itertools
+import random
+
+from benchmarks import comun
+
+CONVERSIONES_POR_MUESTRA = 1000
+
+
+def ciclo(variantes):
+    return itertools.cycle(variantes).__next__
+
+
+def peticion(cliente, metodo, url, esperado=200, **kwargs):
+    respuesta = cliente.open(url, method=metodo, **kwargs)
+    if respuesta.status_code != esperado:
+        raise RuntimeError(f'{metodo} {url} respondió {respuesta.status_code}')
+    return respuesta
+
+
+def casos(yekka, aplicacion, rng):
+    """Lista de (nombre, función) a medir"""
+    db = yekka.db
+    publico = aplicacion.test_client()
+    admin = comun.cliente_admin(yekka, aplicacion)
+    with aplicacion.app_context():
+        categoria_ids = [fila[0] for fila in db.session.query(yekka.Categoria.id)]
+        plato_ids = [fila[0] for fila in db.session.query(yekka.Plato.id).filter(yekka.Plato.activo == True)]
+        recetas = {}
+        for plato_id, producto_id, cantidad in db.session.query(
+                yekka.IngredientePlato.plato_id, yekka.IngredientePlato.producto_id,
+                yekka.IngredientePlato.cantidad):
+            recetas.setdefault(plato_id, []).append({'producto_id': producto_id, 'cantidad': cantidad})
+        unidades = [fila[0] for fila in db.session.query(yekka.Producto.unidad_medida).distinct()]
+
+    filtros = ['', 'search=pollo', 'search=arroz+frito'] + [f'categoria_id={c}' for c in categoria_ids[:5]]
+    siguiente_filtro = ciclo(filtros)
+    siguiente_carrito = ciclo([
+        [{'plato_id': plato_id, 'cantidad': rng.randint(1, 3)}
+         for plato_id in rng.sample(plato_ids, rng.randint(1, 5))]
+        for _ in range(50)
+    ])
+    siguiente_listado = ciclo(['', 'estado=todos', 'estado=entregado', 'estado=todos&telefono=55'])
+    siguiente_receta = ciclo([recetas[plato_id] for plato_id in rng.sample(sorted(recetas), 50)])
+    pares = [(desde, hacia) for desde in unidades for hacia in unidades
+             if yekka.magnitud(desde) == yekka.magnitud(hacia)]
+    conversiones = [(rng.uniform(0.1, 100), *rng.choice(pares)) for _ in range(CONVERSIONES_POR_MUESTRA)]
+
+    def realizar_pedido():
+        peticion(publico, 'POST', '/realizar_pedido', json={
+            'form': {'nombre': 'Benchmark', 'telefono': '555', 'direccion': 'Calle 1'},
+            'carrito': siguiente_carrito(),
+        })
+
+    def convertir():
+        for cantidad, desde, hacia in conversiones:
+            yekka.convert_units(cantidad, desde, hacia)
+
+    return [
+        ('index', lambda: peticion(publico, 'GET', '/?' + siguiente_filtro())),
+        ('api_platos', lambda: peticion(publico, 'GET', '/api/platos?' + siguiente_filtro())),
+        ('realizar_pedido', realizar_pedido),
+        ('admin_pedidos', lambda: peticion(admin, 'GET', '/admin/pedidos?' + siguiente_listado())),
+        ('calcular_costo_plato', lambda: peticion(admin, 'POST', '/admin/calcular_costo_plato',
+                                                  json={'ingredientes': siguiente_receta()})),
+        ('convert_units', convertir),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    comun.argumentos_siembra(parser)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--calentamiento', type=int, default=20)
+    parser.add_argument('--solo', action='append', help='medir solo este caso (se puede repetir)')
+    parser.add_argument('--salida', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    yekka, aplicacion, tamanos = comun.preparar(args)
+    contador = comun.ContadorSQL(yekka, aplicacion)
+    resultados = {}
+    for nombre, funcion in casos(yekka, aplicacion, random.Random(args.semilla)):
+        if args.solo and nombre not in args.solo:
+            continue
+        resultados[nombre] = comun.medir(funcion, args.repeticiones, args.calentamiento, contador)
+        if nombre == 'convert_units':
+            resultados[nombre]['operaciones_por_muestra'] = CONVERSIONES_POR_MUESTRA
+        r = resultados[nombre]
+        print(f"{nombre:>22}: p50 {r['p50_ms']:>9} ms  p95 {r['p95_ms']:>9} ms  "
+              f"{r['por_segundo']:>8}/s  sql {r['sql_por_llamada']}")
+
+    comun.guardar({'benchmark': 'endpoints', 'entorno': comun.entorno(), 'datos': tamanos,
+                   'repeticiones': args.repeticiones, 'calentamiento': args.calentamiento,
+                   'resultados': resultados}, args.salida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark del alta de pedidos: ORM fila a fila contra inserción en bloque
+
+Uso:
+    python benchmarks/pedidos.py --pedidos 300 --lineas 40
+
+Crea una base SQLite temporal con un menú sintético y mide pedidos por
+segundo con el camino anterior de realizar_pedido() (un objeto ORM por línea
+y un flush para obtener el id) y con insertar_pedido().
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def insertar_pedido_orm(yekka, cotizacion, cliente):
+    """Camino anterior: un objeto por fila, flush para el id y commit"""
+    db = yekka.db
+    pedido = yekka.Pedido(
+        codigo=str(uuid.uuid4())[:8].upper(),
+        cliente_nombre=cliente['nombre'],
+        cliente_telefono=cliente['telefono'],
+        cliente_direccion=cliente['direccion'],
+        cliente_ubicacion=cliente['ubicacion'],
+        total=cotizacion['total']
+    )
+    db.session.add(pedido)
+    db.session.flush()
+    for linea in cotizacion['lineas']:
+        db.session.add(yekka.ItemPedido(
+            pedido_id=pedido.id,
+            plato_id=linea['plato_id'],
+            cantidad=linea['cantidad'],
+            precio_unitario=linea['precio_unitario'],
+            personalizaciones=json.dumps(linea['personalizaciones'])
+        ))
+    for extra in cotizacion['extras']:
+        db.session.add(yekka.ExtraPedido(
+            pedido_id=pedido.id,
+            extra_id=extra['extra_id'],
+            cantidad=extra['cantidad'],
+            precio_unitario=extra['precio_unitario']
+        ))
+    db.session.commit()
+
+
+def sembrar_menu(yekka, lineas, extras):
+    db = yekka.db
+    categoria = yekka.Categoria(nombre='Benchmark')
+    db.session.add(categoria)
+    db.session.flush()
+    platos = [yekka.Plato(nombre=f'Plato {i}', precio_venta=5 + i, categoria_id=categoria.id)
+              for i in range(lineas)]
+    db.session.add_all(platos)
+    db.session.add_all([yekka.Extra(nombre=f'Extra {i}', precio=1 + i) for i in range(extras)])
+    db.session.commit()
+    yekka.invalidar_menu()
+    return [p.id for p in platos]
+
+
+def medir(nombre, funcion, pedidos):
+    inicio = time.perf_counter()
+    for _ in range(pedidos):
+        funcion()
+    segundos = time.perf_counter() - inicio
+    return {'camino': nombre, 'pedidos': pedidos, 'segundos': round(segundos, 4),
+            'pedidos_por_segundo': round(pedidos / segundos, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pedidos', type=int, default=300)
+    parser.add_argument('--lineas', type=int, default=40, help='líneas por pedido')
+    parser.add_argument('--extras', type=int, default=3, help='extras por pedido')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='yekka-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directorio, 'bench.db')
+    sys.path.insert(0, RAIZ)
+    import app as yekka
+
+    # Sin calentar: la base está vacía hasta crear las tablas
+    aplicacion = yekka.create_app(panel_admin=False, calentar=False)
+    with aplicacion.test_request_context():
+        yekka.db.create_all()
+        plato_ids = sembrar_menu(yekka, args.lineas, args.extras)
+        carrito = [{'id': plato_id, 'cantidad': 2} for plato_id in plato_ids]
+        extras = list(yekka.obtener_menu().extras_por_id)[:args.extras]
+        cotizacion = yekka.cotizar_pedido(carrito, extras)
+        cliente = {'nombre': 'Benchmark', 'telefono': '555', 'direccion': 'Calle 1', 'ubicacion': None}
+
+        resultados = [
+            medir('orm', lambda: insertar_pedido_orm(yekka, cotizacion, cliente), args.pedidos),
+            medir('bloque', lambda: yekka.insertar_pedido(cotizacion, cliente), args.pedidos),
+        ]
+
+    for r in resultados:
+        print(f"{r['camino']:>7}: {r['pedidos_por_segundo']:>8} pedidos/s ({r['segundos']} s)")
+    print(json.dumps({'benchmark': 'pedidos', 'lineas': args.lineas, 'extras': args.extras,
+                      'resultados': resultados}))
+
+
+if __name__ == '__main__':
+    main()
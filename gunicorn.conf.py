@@ -0,0 +1,40 @@
+# Configuración de gunicorn: gunicorn -c gunicorn.conf.py
+# La base se prepara antes con flask --app app inicializar. Con preload_app,
+# create_app() corre una vez en el proceso principal y los workers heredan
+# las cachés ya llenas. PANEL_ADMIN=0 arranca workers solo para clientes.
+# Cada worker escribe sus métricas en PROMETHEUS_MULTIPROC_DIR y /metrics
+# suma los archivos de todos los workers.
+# Los workers son gthread: cada conexión SSE de /admin/eventos ocupa un hilo
+# mientras el panel está abierto, y con workers sync ocuparía el worker entero
+# y gunicorn lo mataría al vencer timeout. En gthread el timeout solo vigila
+# que el proceso siga vivo, así que un stream o una exportación larga no lo
+# cortan.
+import os
+import shutil
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICAS_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(BASE_DIR, 'instance', 'metricas'))
+
+# Se limpia al leer esta configuración, antes de que preload_app importe la app:
+# los archivos de una ejecución anterior dejarían contadores viejos
+shutil.rmtree(METRICAS_DIR, ignore_errors=True)
+os.makedirs(METRICAS_DIR, exist_ok=True)
+
+wsgi_app = 'app:create_app()'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+# Hilos por worker: pedidos del menú más los paneles abiertos escuchando eventos
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# Las conexiones SSE no terminan solas; al reiniciar se las corta pasado este plazo
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 20))
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,1202 @@
+# Panel de administración
+# Blueprint admin con /login, /logout y todas las rutas /admin, más lo que
+# solo usa el panel: listados paginados, reportes de ventas, exportaciones y el
+# tablero de cocina. create_app() importa este módulo solo cuando la app
+# registra el panel; los workers para clientes (PANEL_ADMIN=0) no lo cargan.
+import os
+import io
+import csv
+import json
+import tempfile
+import base64
+import importlib.util
+import threading
+from collections import namedtuple, Counter
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, abort, Response, stream_with_context, current_app
+from sqlalchemy import func, bindparam, tuple_, and_
+import click
+
+from app import (
+    ajustes, INSTANCE_DIR, db, sesion_lectura, con_perfil,
+    Categoria, Producto, Plato, IngredientePlato, Extra, Pedido, ItemPedido, ExtraPedido, Usuario,
+    VentaHora, VentaDia, VentaPlatoDia, variacion_pedido, acumular_ventas,
+    histograma_peticiones, METRICA_CAMBIOS_ESTADO, guardar_imagen, indexar_platos,
+    obtener_menu, invalidar_menu, asegurar_configuracion, invalidar_configuracion,
+    obtener_costos, invalidar_costos, registrar_evento, notificar_eventos, difusor_eventos,
+    descuenta_inventario, mover_inventario, evaluar_existencias, publicar_cambio_inventario,
+    lineas_pedido,
+)
+admin = Blueprint('admin', __name__, cli_group=None)
+
+# Paginación por cursor de los listados del panel
+# En lugar de OFFSET cada página continúa desde la clave de la última fila
+# mostrada, así el costo de una página no crece con el historial acumulado.
+ajustes['ADMIN_POR_PAGINA'] = int(os.environ.get('ADMIN_POR_PAGINA', 50))
+MAX_POR_PAGINA = 200
+
+Pagina = namedtuple('Pagina', 'filas siguiente limite')
+
+def codificar_cursor(valores):
+    crudo = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor, columnas):
+    """Devuelve los valores del cursor con el tipo de cada columna, o None si no es válido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(valores, list) or len(valores) != len(columnas):
+            return None
+        return [datetime.fromisoformat(v) if isinstance(c.type, db.DateTime) else v
+                for c, v in zip(columnas, valores)]
+    except (ValueError, TypeError):
+        return None
+
+def paginar(query, columnas, descendente=False):
+    """Pagina la consulta ordenando por columnas (la última debe ser única).
+
+    Lee cursor y limit de la petición; un cursor inválido responde 400.
+    """
+    limite = max(1, min(request.args.get('limit', current_app.config['ADMIN_POR_PAGINA'], type=int),
+                        MAX_POR_PAGINA))
+    cursor = request.args.get('cursor')
+    if cursor:
+        valores = decodificar_cursor(cursor, columnas)
+        if valores is None:
+            abort(400)
+        clave = tuple_(*columnas)
+        desde = tuple_(*[bindparam(None, v, type_=c.type) for c, v in zip(columnas, valores)])
+        query = query.filter(clave < desde if descendente else clave > desde)
+    orden = [c.desc() if descendente else c.asc() for c in columnas]
+    filas = query.order_by(*orden).limit(limite + 1).all()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor([getattr(filas[-1], c.key) for c in columnas])
+    return Pagina(filas, siguiente, limite)
+
+def filtro_prefijo(columna, prefijo):
+    """Condición por rango equivalente a LIKE 'prefijo%' que sí aprovecha el índice"""
+    return columna >= prefijo, columna < prefijo + chr(0x10FFFF)
+
+ESTADOS_PEDIDO = ('pendiente', 'confirmado', 'preparando', 'enviado', 'entregado', 'cancelado')
+
+def filtrar_pedidos(query, args):
+    """Aplica estado, rango de fechas, teléfono y código; devuelve (consulta, error)"""
+    estado = args.get('estado', 'pendiente')
+    if estado != 'todos' and estado not in ESTADOS_PEDIDO:
+        return query, 'Estado no válido'
+    if estado != 'todos':
+        query = query.filter(Pedido.estado == estado)
+    try:
+        desde = datetime.strptime(args['desde'], '%Y-%m-%d') if args.get('desde') else None
+        hasta = datetime.strptime(args['hasta'], '%Y-%m-%d') if args.get('hasta') else None
+    except ValueError:
+        return query, 'Fecha no válida, use el formato AAAA-MM-DD'
+    if desde:
+        query = query.filter(Pedido.fecha_creacion >= desde)
+    if hasta:
+        query = query.filter(Pedido.fecha_creacion < hasta + timedelta(days=1))
+    telefono = args.get('telefono', '').strip()
+    if telefono:
+        query = query.filter(*filtro_prefijo(Pedido.cliente_telefono, telefono))
+    codigo = args.get('codigo', '').strip().upper()
+    if codigo:
+        query = query.filter(*filtro_prefijo(Pedido.codigo, codigo))
+    return query, None
+
+def resumen_pedido(pedido):
+    """Fila del listado de pedidos, sin cargar items ni extras"""
+    return {
+        'id': pedido.id,
+        'codigo': pedido.codigo,
+        'cliente_nombre': pedido.cliente_nombre,
+        'cliente_telefono': pedido.cliente_telefono,
+        'estado': pedido.estado,
+        'total': pedido.total,
+        'fecha_creacion': pedido.fecha_creacion.isoformat() if pedido.fecha_creacion else None,
+        'url': url_for('admin.ver_pedido', pedido_id=pedido.id),
+    }
+
+# Decorador para requerir login
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('admin.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Decorador para requerir admin
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('admin.login'))
+        user = Usuario.query.get(session['user_id'])
+        if not user or user.rol != 'admin':
+            flash('Acceso denegado. Se requieren permisos de administrador.', 'error')
+            return redirect(url_for('publico.index'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Reportes de ventas
+# Suman las filas de los resúmenes por hora, día y plato que mantiene app.py.
+MAX_DIAS_REPORTE = 366
+
+def rango_reporte(args, dias_por_defecto=30):
+    """Lee desde/hasta (AAAA-MM-DD) o dias; devuelve (desde, hasta, error) con hasta incluido"""
+    try:
+        hasta = datetime.strptime(args['hasta'], '%Y-%m-%d').date() if args.get('hasta') \
+            else datetime.utcnow().date()
+        if args.get('desde'):
+            desde = datetime.strptime(args['desde'], '%Y-%m-%d').date()
+        else:
+            desde = hasta - timedelta(days=int(args.get('dias', dias_por_defecto)) - 1)
+    except ValueError:
+        return None, None, 'Fecha no válida, use el formato AAAA-MM-DD'
+    if desde > hasta:
+        return None, None, 'La fecha inicial es posterior a la final'
+    if (hasta - desde).days >= MAX_DIAS_REPORTE:
+        return None, None, f'El rango no puede superar {MAX_DIAS_REPORTE} días'
+    return desde, hasta, None
+
+def reporte_ventas(agrupar, desde, hasta, limite=None):
+    """Filas del reporte por 'dia', 'hora' o 'plato' entre dos fechas incluidas"""
+    if agrupar == 'plato':
+        ingresos = func.sum(VentaPlatoDia.ingresos)
+        query = db.session.query(
+            VentaPlatoDia.plato_id, Plato.nombre, func.sum(VentaPlatoDia.unidades), ingresos,
+            func.sum(VentaPlatoDia.cancelados),
+        ).outerjoin(Plato, Plato.id == VentaPlatoDia.plato_id
+        ).filter(VentaPlatoDia.fecha.between(desde, hasta)
+        ).group_by(VentaPlatoDia.plato_id, Plato.nombre
+        ).order_by(ingresos.desc())
+        if limite:
+            query = query.limit(limite)
+        return [{'plato_id': plato_id, 'nombre': nombre, 'unidades': unidades,
+                 'ingresos': round(total, 2), 'cancelados': cancelados}
+                for plato_id, nombre, unidades, total, cancelados in query]
+    if agrupar == 'hora':
+        modelo, clave = VentaHora, VentaHora.hora
+        condicion = and_(clave >= datetime.combine(desde, datetime.min.time()),
+                         clave < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+    else:
+        modelo, clave = VentaDia, VentaDia.fecha
+        condicion = clave.between(desde, hasta)
+    filas = db.session.query(modelo).filter(condicion).order_by(clave).all()
+    return [{
+        agrupar: getattr(fila, clave.key).isoformat(),
+        'pedidos': fila.pedidos,
+        'ingresos': round(fila.ingresos, 2),
+        'unidades': fila.unidades,
+        'ingresos_extras': round(fila.ingresos_extras, 2),
+        'cancelados': fila.cancelados,
+        'importe_cancelado': round(fila.importe_cancelado, 2),
+    } for fila in filas]
+
+def totales_ventas(desde, hasta):
+    """Totales del rango sumando los resúmenes diarios"""
+    fila = db.session.query(
+        func.coalesce(func.sum(VentaDia.pedidos), 0),
+        func.coalesce(func.sum(VentaDia.ingresos), 0.0),
+        func.coalesce(func.sum(VentaDia.unidades), 0),
+        func.coalesce(func.sum(VentaDia.ingresos_extras), 0.0),
+        func.coalesce(func.sum(VentaDia.cancelados), 0),
+        func.coalesce(func.sum(VentaDia.importe_cancelado), 0.0),
+    ).filter(VentaDia.fecha.between(desde, hasta)).one()
+    pedidos, ingresos, unidades, extras, cancelados, importe_cancelado = fila
+    return {
+        'pedidos': pedidos,
+        'ingresos': round(ingresos, 2),
+        'unidades': unidades,
+        'ingresos_extras': round(extras, 2),
+        'ticket_promedio': round(ingresos / pedidos, 2) if pedidos else 0.0,
+        'cancelados': cancelados,
+        'importe_cancelado': round(importe_cancelado, 2),
+    }
+
+# Eventos de pedidos hacia las pantallas del panel (/admin/eventos)
+def formato_sse(evento):
+    if evento is None:
+        return ': latido\n\n'
+    return f'id: {evento.id}\nevent: {evento.tipo}\ndata: {evento.datos}\n\n'
+
+# Tablero de cocina
+# Agrupa los platos de los pedidos abiertos por categoría (estación) y plato.
+# Cada app tiene el suyo, colgado de su difusor de eventos: se arma con una
+# lectura de los pedidos abiertos y luego se mantiene aplicando los eventos de
+# pedidos, sin recorrer la tabla de nuevo.
+ESTADOS_COCINA = ('pendiente', 'confirmado', 'preparando')
+
+PedidoCocina = namedtuple('PedidoCocina', ['id', 'codigo', 'estado', 'lineas', 'extras'])
+# categoria_id es la del plato al hacer el pedido: si después se agota o se
+# desactiva, sus líneas abiertas siguen en la misma estación
+LineaCocina = namedtuple('LineaCocina', ['plato_id', 'nombre', 'categoria_id', 'cantidad', 'notas'])
+ExtraCocina = namedtuple('ExtraCocina', ['extra_id', 'nombre', 'cantidad'])
+
+def describir_personalizaciones(valor):
+    """Texto legible para la cocina a partir de las personalizaciones guardadas"""
+    if isinstance(valor, str):
+        try:
+            valor = json.loads(valor) if valor else {}
+        except ValueError:
+            return valor
+    if isinstance(valor, dict):
+        textos = []
+        for clave, detalle in valor.items():
+            if isinstance(detalle, dict):
+                textos.append(str(detalle.get('nombre') or clave))
+            elif detalle is True or detalle in (None, ''):
+                textos.append(str(clave))
+            elif detalle is not False:
+                textos.append(f'{clave}: {detalle}')
+    elif isinstance(valor, list):
+        textos = [str(v) for v in valor if v]
+    else:
+        return ''
+    return ', '.join(sorted(textos))
+
+def _leer_pedidos_cocina(pedido_ids=None):
+    """Pedidos abiertos (o los indicados) con sus platos y extras"""
+    if pedido_ids is None:
+        filtro = Pedido.estado.in_(ESTADOS_COCINA)
+    else:
+        filtro = Pedido.id.in_(pedido_ids)
+    with current_app.app_context(), sesion_lectura() as sesion:
+        lineas, extras = {}, {}
+        for pedido_id, plato_id, nombre, categoria_id, cantidad, personalizaciones in (
+                sesion.query(ItemPedido.pedido_id, ItemPedido.plato_id, Plato.nombre, Plato.categoria_id,
+                             ItemPedido.cantidad, ItemPedido.personalizaciones)
+                .join(Plato, ItemPedido.plato_id == Plato.id)
+                .join(Pedido, ItemPedido.pedido_id == Pedido.id)
+                .filter(filtro).order_by(ItemPedido.id)):
+            lineas.setdefault(pedido_id, []).append(
+                LineaCocina(plato_id, nombre, categoria_id, cantidad,
+                            describir_personalizaciones(personalizaciones)))
+        for pedido_id, extra_id, nombre, cantidad in (
+                sesion.query(ExtraPedido.pedido_id, ExtraPedido.extra_id, Extra.nombre, ExtraPedido.cantidad)
+                .join(Extra, ExtraPedido.extra_id == Extra.id)
+                .join(Pedido, ExtraPedido.pedido_id == Pedido.id)
+                .filter(filtro)):
+            extras.setdefault(pedido_id, []).append(ExtraCocina(extra_id, nombre, cantidad))
+        return {
+            pedido_id: PedidoCocina(pedido_id, codigo, estado, tuple(lineas.get(pedido_id, ())),
+                                    tuple(extras.get(pedido_id, ())))
+            for pedido_id, codigo, estado in
+            sesion.query(Pedido.id, Pedido.codigo, Pedido.estado).filter(filtro)
+        }
+
+class TableroCocina:
+    """Totales de los pedidos abiertos, mantenidos de forma incremental"""
+
+    def __init__(self, difusor):
+        self._difusor = difusor
+        self._lock = threading.Lock()
+        self._inicio = threading.Lock()
+        self._iniciado = False
+        self._pedidos = {}
+        self._platos = {}  # plato_id -> nombre, categoría, cantidades por estado, notas y pedidos
+        self._extras = {}  # extra_id -> nombre y cantidades por estado
+        self.version = 0
+
+    def _sumar(self, pedido, signo):
+        for linea in pedido.lineas:
+            grupo = self._platos.setdefault(linea.plato_id, {
+                'nombre': linea.nombre, 'categoria_id': linea.categoria_id,
+                'cantidades': Counter(), 'notas': Counter(), 'pedidos': Counter()})
+            grupo['cantidades'][pedido.estado] += signo * linea.cantidad
+            grupo['pedidos'][pedido.codigo] += signo * linea.cantidad
+            if linea.notas:
+                grupo['notas'][linea.notas] += signo * linea.cantidad
+            # El + unario descarta las claves que quedaron en cero
+            for clave in ('cantidades', 'notas', 'pedidos'):
+                grupo[clave] = +grupo[clave]
+            if not grupo['cantidades']:
+                del self._platos[linea.plato_id]
+        for extra in pedido.extras:
+            grupo = self._extras.setdefault(extra.extra_id, {'nombre': extra.nombre, 'cantidades': Counter()})
+            grupo['cantidades'][pedido.estado] += signo * extra.cantidad
+            grupo['cantidades'] = +grupo['cantidades']
+            if not grupo['cantidades']:
+                del self._extras[extra.extra_id]
+
+    def _agregar(self, pedido):
+        self._pedidos[pedido.id] = pedido
+        self._sumar(pedido, 1)
+
+    def _quitar(self, pedido_id):
+        pedido = self._pedidos.pop(pedido_id, None)
+        if pedido:
+            self._sumar(pedido, -1)
+        return pedido
+
+    def _inicializar(self):
+        pedidos = _leer_pedidos_cocina()
+        with self._lock:
+            for pedido in pedidos.values():
+                self._agregar(pedido)
+            self.version += 1
+
+    def aplicar(self, eventos):
+        """Aplica un lote de eventos; repetir un evento ya reflejado no cambia el resultado"""
+        faltantes = {}
+        with self._lock:
+            for evento in eventos:
+                datos = json.loads(evento.datos)
+                pedido_id = datos.get('pedido_id')
+                if evento.tipo == 'pedido_creado':
+                    if pedido_id in self._pedidos or datos['estado'] not in ESTADOS_COCINA:
+                        continue
+                    self._agregar(PedidoCocina(
+                        pedido_id, datos['codigo'], datos['estado'],
+                        tuple(LineaCocina(l['plato_id'], l['nombre'], l.get('categoria_id'), l['cantidad'],
+                                          describir_personalizaciones(l['personalizaciones']))
+                              for l in datos['lineas']),
+                        tuple(ExtraCocina(e['extra_id'], e['nombre'], e['cantidad'])
+                              for e in datos.get('extras', ()))))
+                elif evento.tipo == 'estado_cambiado':
+                    pedido = self._quitar(pedido_id)
+                    faltantes.pop(pedido_id, None)
+                    if datos['estado'] not in ESTADOS_COCINA:
+                        continue
+                    if pedido:
+                        self._agregar(pedido._replace(estado=datos['estado']))
+                    else:
+                        # Un pedido cerrado que se reabre: sus platos se leen aparte
+                        faltantes[pedido_id] = datos['estado']
+            self.version += 1
+        if faltantes:
+            pedidos = _leer_pedidos_cocina(list(faltantes))
+            with self._lock:
+                for pedido_id, estado in faltantes.items():
+                    if pedido_id in pedidos and pedido_id not in self._pedidos:
+                        self._agregar(pedidos[pedido_id]._replace(estado=estado))
+                self.version += 1
+
+    def vista(self, categoria_id=None):
+        """Platos agrupados por categoría con los totales por estado"""
+        if not self._iniciado:
+            with self._inicio:
+                if not self._iniciado:
+                    self._difusor.suscribir(self.aplicar, self._inicializar)
+                    self._iniciado = True
+        self._difusor.actualizar()
+
+        menu_actual = obtener_menu()
+        with self._lock:
+            platos = [
+                (plato_id, grupo['nombre'], grupo['categoria_id'], dict(grupo['cantidades']),
+                 grupo['notas'].most_common(), sorted(grupo['pedidos'].items()))
+                for plato_id, grupo in self._platos.items()
+            ]
+            extras = [
+                {'extra_id': extra_id, 'nombre': grupo['nombre'],
+                 'cantidades': dict(grupo['cantidades']), 'total': sum(grupo['cantidades'].values())}
+                for extra_id, grupo in self._extras.items()
+            ]
+            pedidos_abiertos = Counter(pedido.estado for pedido in self._pedidos.values())
+            version = self.version
+
+        categorias = {}
+        for plato_id, nombre, plato_categoria, cantidades, notas, pedidos in platos:
+            if categoria_id and plato_categoria != categoria_id:
+                continue
+            categorias.setdefault(plato_categoria, []).append({
+                'plato_id': plato_id,
+                'nombre': nombre,
+                'cantidades': cantidades,
+                'total': sum(cantidades.values()),
+                'notas': [{'texto': texto, 'cantidad': n} for texto, n in notas],
+                'pedidos': [{'codigo': codigo, 'cantidad': n} for codigo, n in pedidos],
+            })
+        nombres = {c.id: c.nombre for c in menu_actual.categorias}
+        return {
+            'version': version,
+            'estados': ESTADOS_COCINA,
+            'pedidos_abiertos': {estado: pedidos_abiertos.get(estado, 0) for estado in ESTADOS_COCINA},
+            'categorias': [
+                {'id': cid, 'nombre': nombres.get(cid, 'Sin categoría'),
+                 'platos': sorted(grupo, key=lambda p: (-p['total'], p['nombre']))}
+                for cid, grupo in sorted(categorias.items(), key=lambda c: nombres.get(c[0], '\uffff'))
+            ],
+            'extras': [] if categoria_id else sorted(extras, key=lambda e: (-e['total'], e['nombre'])),
+        }
+
+def tablero_cocina():
+    return current_app.extensions['tablero_cocina']
+
+@admin.record_once
+def _preparar_app(estado):
+    """Ajustes por defecto del panel y tablero de cocina de la app que registra el blueprint"""
+    estado.app.config.setdefault('ADMIN_POR_PAGINA', ajustes['ADMIN_POR_PAGINA'])
+    estado.app.extensions['tablero_cocina'] = TableroCocina(estado.app.extensions['difusor_eventos'])
+
+# Exportación de pedidos
+# Pedidos, líneas y extras se exportan filtrados por fechas y estado, leyendo
+# por bloques (yield_per sobre un cursor que se recorre a medida que se
+# escribe) en lugar de cargar todo con .all(). El CSV sale fila a fila hacia
+# el cliente; XLSX (openpyxl en modo write_only) y Parquet (pyarrow, un grupo
+# de filas por bloque) recién son válidos al cerrarse, así que se escriben a un
+# temporal en disco y después se envían por partes. La lectura usa la sesión de
+# solo lectura y, con WAL, no frena las escrituras de los demás workers.
+# openpyxl y pyarrow tardan en importarse y solo los usa el panel, así que se
+# importan con la primera exportación que los necesita. Las exportaciones
+# grandes (años de pedidos en XLSX o Parquet) se hacen mejor fuera del servidor:
+#     flask --app app exportar items --formato parquet --desde 2024-01-01 --salida items.parquet
+MODULOS_EXPORTACION = {'xlsx': 'openpyxl', 'parquet': 'pyarrow'}
+
+EXPORTAR_BLOQUE = 1000
+EXPORTAR_TROZO = 64 * 1024  # bytes por escritura hacia el cliente
+
+ColumnaExportacion = namedtuple('ColumnaExportacion', ['nombre', 'expresion', 'tipo'])
+
+_COLUMNAS_PEDIDO = [
+    ColumnaExportacion('pedido_id', Pedido.id, 'int'),
+    ColumnaExportacion('codigo', Pedido.codigo, 'str'),
+    ColumnaExportacion('fecha_creacion', Pedido.fecha_creacion, 'datetime'),
+    ColumnaExportacion('estado', Pedido.estado, 'str'),
+]
+
+EXPORTACIONES = {
+    'pedidos': _COLUMNAS_PEDIDO + [
+        ColumnaExportacion('cliente_nombre', Pedido.cliente_nombre, 'str'),
+        ColumnaExportacion('cliente_telefono', Pedido.cliente_telefono, 'str'),
+        ColumnaExportacion('cliente_direccion', Pedido.cliente_direccion, 'str'),
+        ColumnaExportacion('total', Pedido.total, 'float'),
+    ],
+    'items': _COLUMNAS_PEDIDO + [
+        ColumnaExportacion('item_id', ItemPedido.id, 'int'),
+        ColumnaExportacion('plato_id', ItemPedido.plato_id, 'int'),
+        ColumnaExportacion('plato', Plato.nombre, 'str'),
+        ColumnaExportacion('cantidad', ItemPedido.cantidad, 'int'),
+        ColumnaExportacion('precio_unitario', ItemPedido.precio_unitario, 'float'),
+        ColumnaExportacion('importe', ItemPedido.cantidad * ItemPedido.precio_unitario, 'float'),
+        ColumnaExportacion('personalizaciones', ItemPedido.personalizaciones, 'str'),
+    ],
+    'extras': _COLUMNAS_PEDIDO + [
+        ColumnaExportacion('extra_pedido_id', ExtraPedido.id, 'int'),
+        ColumnaExportacion('extra_id', ExtraPedido.extra_id, 'int'),
+        ColumnaExportacion('extra', Extra.nombre, 'str'),
+        ColumnaExportacion('cantidad', ExtraPedido.cantidad, 'int'),
+        ColumnaExportacion('precio_unitario', ExtraPedido.precio_unitario, 'float'),
+        ColumnaExportacion('importe', ExtraPedido.cantidad * ExtraPedido.precio_unitario, 'float'),
+    ],
+}
+
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def formato_disponible(formato):
+    if formato == 'csv':
+        return True
+    modulo = MODULOS_EXPORTACION.get(formato)
+    return modulo is not None and importlib.util.find_spec(modulo) is not None
+
+def consulta_exportacion(sesion, tabla, args):
+    """Consulta por bloques de una exportación; devuelve (consulta, error)"""
+    columnas = EXPORTACIONES[tabla]
+    query = sesion.query(*[c.expresion.label(c.nombre) for c in columnas])
+    orden = [Pedido.fecha_creacion, Pedido.id]
+    if tabla == 'items':
+        query = query.select_from(ItemPedido).join(Pedido, Pedido.id == ItemPedido.pedido_id
+                                                   ).outerjoin(Plato, Plato.id == ItemPedido.plato_id)
+        orden.append(ItemPedido.id)
+    elif tabla == 'extras':
+        query = query.select_from(ExtraPedido).join(Pedido, Pedido.id == ExtraPedido.pedido_id
+                                                    ).outerjoin(Extra, Extra.id == ExtraPedido.extra_id)
+        orden.append(ExtraPedido.id)
+    query, error = filtrar_pedidos(query, {'estado': 'todos', **args})
+    return query.order_by(*orden), error
+
+def _bloques(filas, tamano=EXPORTAR_BLOQUE):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+def generar_csv(filas, columnas):
+    """Genera el CSV en trozos de bytes a medida que se leen las filas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM: Excel abre el archivo como UTF-8
+    escritor.writerow([c.nombre for c in columnas])
+    for fila in filas:
+        escritor.writerow([v.isoformat(sep=' ') if isinstance(v, datetime) else v for v in fila])
+        if buffer.tell() >= EXPORTAR_TROZO:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def escribir_xlsx(filas, columnas, destino, hoja='datos'):
+    import openpyxl
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet(hoja)
+    hoja.append([c.nombre for c in columnas])
+    for fila in filas:
+        hoja.append(list(fila))
+    libro.save(destino)
+
+def escribir_parquet(filas, columnas, destino):
+    import pyarrow
+    import pyarrow.parquet
+    tipos = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'str': pyarrow.string(),
+             'datetime': pyarrow.timestamp('us')}
+    esquema = pyarrow.schema([(c.nombre, tipos[c.tipo]) for c in columnas])
+    with pyarrow.parquet.ParquetWriter(destino, esquema) as escritor:
+        for bloque in _bloques(filas):
+            valores = list(zip(*bloque))
+            escritor.write_table(pyarrow.table(
+                [pyarrow.array(v, type=esquema.field(i).type) for i, v in enumerate(valores)],
+                schema=esquema))
+
+def escribir_exportacion(tabla, formato, filas, destino):
+    """Escribe las filas en un archivo binario abierto en el formato pedido"""
+    columnas = EXPORTACIONES[tabla]
+    if formato == 'csv':
+        for trozo in generar_csv(filas, columnas):
+            destino.write(trozo)
+    elif formato == 'xlsx':
+        escribir_xlsx(filas, columnas, destino, hoja=tabla)
+    else:
+        escribir_parquet(filas, columnas, destino)
+
+def generar_exportacion(tabla, formato, args):
+    """Cuerpo de la respuesta: trozos de bytes del archivo exportado"""
+    with sesion_lectura() as sesion:
+        query, _ = consulta_exportacion(sesion, tabla, args)
+        filas = sesion.execute(query.statement, execution_options={'yield_per': EXPORTAR_BLOQUE})
+        if formato == 'csv':
+            yield from generar_csv(filas, EXPORTACIONES[tabla])
+            return
+        with tempfile.TemporaryFile(dir=INSTANCE_DIR) as temporal:
+            escribir_exportacion(tabla, formato, filas, temporal)
+            temporal.seek(0)
+            while True:
+                trozo = temporal.read(EXPORTAR_TROZO)
+                if not trozo:
+                    break
+                yield trozo
+
+@admin.cli.command('exportar')
+@click.argument('tabla', type=click.Choice(list(EXPORTACIONES)))
+@click.option('--formato', type=click.Choice(list(FORMATOS_EXPORTACION)), default='csv')
+@click.option('--desde', help='Fecha inicial (AAAA-MM-DD)')
+@click.option('--hasta', help='Fecha final incluida (AAAA-MM-DD)')
+@click.option('--estado', default='todos', help='Estado de los pedidos o "todos"')
+@click.option('--salida', type=click.Path(dir_okay=False), required=True)
+def exportar_comando(tabla, formato, desde, hasta, estado, salida):
+    """Exporta pedidos, items o extras a CSV, XLSX o Parquet"""
+    if not formato_disponible(formato):
+        raise click.ClickException(f'El formato {formato} necesita openpyxl o pyarrow instalado')
+    args = {k: v for k, v in {'desde': desde, 'hasta': hasta, 'estado': estado}.items() if v}
+    with sesion_lectura() as sesion:
+        query, error = consulta_exportacion(sesion, tabla, args)
+        if error:
+            raise click.ClickException(error)
+        filas = sesion.execute(query.statement, execution_options={'yield_per': EXPORTAR_BLOQUE})
+        with open(salida, 'wb') as destino:
+            escribir_exportacion(tabla, formato, filas, destino)
+    print(f'Exportación guardada en {salida}')
+
+# Rutas de autenticación
+@admin.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        user = Usuario.query.filter_by(username=username).first()
+        
+        if user and user.check_password(password):
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['rol'] = user.rol
+            flash('Inicio de sesión exitoso.', 'success')
+            return redirect(url_for('admin.admin_panel'))
+        else:
+            flash('Usuario o contraseña incorrectos.', 'error')
+    
+    return render_template('login.html')
+
+@admin.route('/logout')
+def logout():
+    session.clear()
+    flash('Sesión cerrada.', 'info')
+    return redirect(url_for('publico.index'))
+
+# Panel de administración
+@admin.route('/admin')
+@login_required
+def admin_panel():
+    pedidos_pendientes = Pedido.query.filter_by(estado='pendiente').count()
+    total_platos = Plato.query.count()
+    total_productos = Producto.query.count()
+    stock_bajo = Producto.query.filter(Producto.activo == True,
+                                       Producto.existencia <= Producto.stock_minimo).count()
+    hoy = datetime.utcnow().date()
+    return render_template('admin/index.html', 
+                         pedidos_pendientes=pedidos_pendientes,
+                         total_platos=total_platos,
+                         total_productos=total_productos,
+                         stock_bajo=stock_bajo,
+                         ventas_hoy=totales_ventas(hoy, hoy),
+                         ventas_semana=totales_ventas(hoy - timedelta(days=6), hoy),
+                         platos_mas_vendidos=reporte_ventas('plato', hoy - timedelta(days=29), hoy, limite=5))
+
+# Gestión de pedidos
+@admin.route('/admin/pedidos')
+@login_required
+def admin_pedidos():
+    estado = request.args.get('estado', 'pendiente')
+    if estado != 'todos' and estado not in ESTADOS_PEDIDO:
+        estado = 'pendiente'
+    query, error = filtrar_pedidos(Pedido.query, request.args)
+    if error:
+        flash(error, 'error')
+        query, _ = filtrar_pedidos(Pedido.query, {'estado': estado})
+    pagina = paginar(query, [Pedido.fecha_creacion, Pedido.id], descendente=True)
+    return render_template('admin/pedidos.html', pedidos=pagina.filas, pagina=pagina,
+                           estado_actual=estado)
+
+@admin.route('/admin/api/pedidos')
+@login_required
+def admin_api_pedidos():
+    """Variante JSON del listado para el scroll infinito"""
+    query, error = filtrar_pedidos(Pedido.query, request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    pagina = paginar(query, [Pedido.fecha_creacion, Pedido.id], descendente=True)
+    return jsonify({'pedidos': [resumen_pedido(p) for p in pagina.filas],
+                    'siguiente': pagina.siguiente})
+
+@admin.route('/admin/api/reportes/ventas')
+@login_required
+def admin_api_reporte_ventas():
+    """Ventas por día, hora o plato leídas de los resúmenes (?agrupar=&dias= o ?desde=&hasta=)"""
+    agrupar = request.args.get('agrupar', 'dia')
+    if agrupar not in ('dia', 'hora', 'plato'):
+        return jsonify({'error': 'agrupar debe ser dia, hora o plato'}), 400
+    desde, hasta, error = rango_reporte(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'agrupar': agrupar,
+        'filas': reporte_ventas(agrupar, desde, hasta),
+    })
+
+@admin.route('/admin/exportar/<tabla>.<formato>')
+@login_required
+def admin_exportar(tabla, formato):
+    """Descarga pedidos, items o extras con los filtros del listado (?desde=&hasta=&estado=)
+
+    XLSX y Parquet se arman completos antes de enviarse; para rangos de
+    meses conviene `flask exportar`, que no ocupa un worker.
+    """
+    if tabla not in EXPORTACIONES or formato not in FORMATOS_EXPORTACION:
+        abort(404)
+    if not formato_disponible(formato):
+        return jsonify({'error': f'El formato {formato} no está disponible en este servidor'}), 501
+    args = request.args.to_dict()
+    _, error = filtrar_pedidos(Pedido.query, {'estado': 'todos', **args})
+    if error:
+        return jsonify({'error': error}), 400
+    nombre = '_'.join(filter(None, [tabla, args.get('estado'), args.get('desde'), args.get('hasta')]))
+    return Response(stream_with_context(generar_exportacion(tabla, formato, args)),
+                    mimetype=FORMATOS_EXPORTACION[formato],
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}.{formato}"'})
+
+@admin.route('/admin/api/rendimiento')
+@login_required
+def admin_api_rendimiento():
+    """Histograma de duraciones por endpoint de este worker (requiere PERFILADO=1)"""
+    return jsonify({
+        'activo': current_app.config['PERFILADO'],
+        'pid': os.getpid(),
+        'ventana_segundos': histograma_peticiones.duracion * histograma_peticiones.ventanas,
+        'endpoints': histograma_peticiones.resumen(),
+    })
+
+@admin.route('/admin/pedido/<int:pedido_id>')
+@login_required
+def ver_pedido(pedido_id):
+    pedido = con_perfil(Pedido.query, 'detalle_pedido').get_or_404(pedido_id)
+    return render_template('admin/ver_pedido.html', pedido=pedido)
+
+@admin.route('/admin/cambiar_estado_pedido/<int:pedido_id>', methods=['POST'])
+@login_required
+def cambiar_estado_pedido(pedido_id):
+    pedido = Pedido.query.get_or_404(pedido_id)
+    nuevo_estado = request.form.get('estado')
+    
+    if nuevo_estado in ESTADOS_PEDIDO:
+        estado_anterior = pedido.estado
+        pedido.estado = nuevo_estado
+        cambiado = nuevo_estado != estado_anterior
+        if cambiado:
+            registrar_evento('estado_cambiado', pedido.id, {
+                'codigo': pedido.codigo,
+                'estado_anterior': estado_anterior,
+                'estado': nuevo_estado,
+            })
+            if 'cancelado' in (estado_anterior, nuevo_estado) and pedido.fecha_creacion:
+                signo = -1 if nuevo_estado == 'cancelado' else 1
+                acumular_ventas(variacion_pedido(pedido, ventas=signo, cancelaciones=-signo))
+        cambio = None
+        descontar = descuenta_inventario(nuevo_estado)
+        if descontar != bool(pedido.inventario_descontado):
+            cambio = mover_inventario(pedido.id, lineas_pedido(pedido.id), 1 if descontar else -1)
+            pedido.inventario_descontado = descontar
+        db.session.commit()
+        if cambiado:
+            METRICA_CAMBIOS_ESTADO.labels(estado=nuevo_estado).inc()
+        if cambiado or cambio:
+            notificar_eventos()
+        if cambio:
+            publicar_cambio_inventario(cambio)
+            if cambio.bajos:
+                flash('Stock bajo: ' + ', '.join(p['nombre'] for p in cambio.bajos), 'warning')
+            if cambio.desactivados:
+                flash(f'Se desactivaron {len(cambio.desactivados)} platos por falta de ingredientes.', 'warning')
+        flash('Estado del pedido actualizado correctamente.', 'success')
+    else:
+        flash('Estado no válido.', 'error')
+    return redirect(url_for('admin.ver_pedido', pedido_id=pedido_id))
+
+@admin.route('/admin/eventos')
+@login_required
+def admin_eventos():
+    """Canal SSE con los pedidos nuevos y los cambios de estado"""
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    if ultimo_id is None:
+        ultimo_id = request.args.get('ultimo_id', type=int)
+    # Se pide aquí y no dentro de generar(): el generador corre sin contexto de app
+    eventos = difusor_eventos().escuchar(ultimo_id)
+
+    def generar():
+        yield 'retry: 3000\n\n'
+        for evento in eventos:
+            yield formato_sse(evento)
+
+    return Response(generar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@admin.route('/admin/cocina')
+@login_required
+def admin_cocina():
+    categoria_id = request.args.get('categoria_id', type=int)
+    return render_template('admin/cocina.html', tablero=tablero_cocina().vista(categoria_id),
+                           categorias=obtener_menu().categorias, categoria_actual=categoria_id)
+
+@admin.route('/admin/api/cocina')
+@login_required
+def admin_api_cocina():
+    """Tablero de cocina en JSON; no consulta la base de datos una vez armado"""
+    return jsonify(tablero_cocina().vista(request.args.get('categoria_id', type=int)))
+
+# Gestión de productos
+@admin.route('/admin/productos')
+@login_required
+def admin_productos():
+    pagina = paginar(Producto.query, [Producto.nombre, Producto.id])
+    return render_template('admin/productos.html', productos=pagina.filas, pagina=pagina)
+
+@admin.route('/admin/producto/nuevo', methods=['GET', 'POST'])
+@login_required
+def nuevo_producto():
+    if request.method == 'POST':
+        nombre = request.form.get('nombre')
+        precio_compra = float(request.form.get('precio_compra', 0))
+        unidad_medida = request.form.get('unidad_medida')
+        cantidad = float(request.form.get('cantidad', 0))
+        existencia = request.form.get('existencia')
+        
+        nuevo_producto = Producto(
+            nombre=nombre,
+            precio_compra=precio_compra,
+            unidad_medida=unidad_medida,
+            cantidad=cantidad,
+            existencia=float(existencia) if existencia else None,
+            stock_minimo=float(request.form.get('stock_minimo') or 0)
+        )
+        
+        db.session.add(nuevo_producto)
+        db.session.commit()
+        
+        flash('Producto creado correctamente.', 'success')
+        return redirect(url_for('admin.admin_productos'))
+    return render_template('admin/editar_producto.html')
+
+@admin.route('/admin/producto/editar/<int:producto_id>', methods=['GET', 'POST'])
+@login_required
+def editar_producto(producto_id):
+    producto = Producto.query.get_or_404(producto_id)
+    
+    if request.method == 'POST':
+        anterior = (producto.precio_compra, producto.cantidad, producto.unidad_medida, producto.activo)
+        existencia_anterior = producto.existencia
+        producto.nombre = request.form.get('nombre')
+        producto.precio_compra = float(request.form.get('precio_compra', 0))
+        producto.unidad_medida = request.form.get('unidad_medida')
+        producto.cantidad = float(request.form.get('cantidad', 0))
+        existencia = request.form.get('existencia')
+        producto.existencia = float(existencia) if existencia else None
+        producto.stock_minimo = float(request.form.get('stock_minimo') or 0)
+        producto.activo = 'activo' in request.form
+        
+        cambio = None
+        if producto.existencia is not None and producto.existencia != existencia_anterior:
+            db.session.flush()
+            # Pasar de sin controlar (NULL) a un valor también es un cambio de stock
+            variacion = None if existencia_anterior is None else producto.existencia - existencia_anterior
+            cambio = evaluar_existencias(None, {producto.id: variacion})
+        db.session.commit()
+        invalidar_menu()
+        if (producto.precio_compra, producto.cantidad, producto.unidad_medida, producto.activo) != anterior:
+            invalidar_costos()
+        if cambio:
+            publicar_cambio_inventario(cambio)
+        
+        flash('Producto actualizado correctamente.', 'success')
+        return redirect(url_for('admin.admin_productos'))
+    return render_template('admin/editar_producto.html', producto=producto)
+
+@admin.route('/admin/producto/eliminar/<int:producto_id>', methods=['POST'])
+@login_required
+def eliminar_producto(producto_id):
+    producto = Producto.query.get_or_404(producto_id)
+    
+    # Verificar si el producto está siendo usado en algún plato
+    ingredientes = IngredientePlato.query.filter_by(producto_id=producto_id).count()
+    if ingredientes > 0:
+        flash('No se puede eliminar el producto porque está siendo utilizado en uno o más platos.', 'error')
+        return redirect(url_for('admin.admin_productos'))
+    
+    db.session.delete(producto)
+    db.session.commit()
+    
+    flash('Producto eliminado correctamente.', 'success')
+    return redirect(url_for('admin.admin_productos'))
+
+# Gestión de platos
+@admin.route('/admin/platos')
+@login_required
+def admin_platos():
+    pagina = paginar(con_perfil(Plato.query, 'carta'), [Plato.id])
+    return render_template('admin/platos.html', platos=pagina.filas, pagina=pagina,
+                           costos=obtener_costos(),
+                           food_cost_objetivo=current_app.config['FOOD_COST_OBJETIVO'])
+
+@admin.route('/admin/plato/nuevo', methods=['GET', 'POST'])
+@login_required
+def nuevo_plato():
+    categorias = Categoria.query.filter_by(activa=True).all()
+    productos = Producto.query.filter_by(activo=True).all()
+    
+    if request.method == 'POST':
+        nombre = request.form.get('nombre')
+        descripcion = request.form.get('descripcion')
+        precio_venta = float(request.form.get('precio_venta', 0))
+        categoria_id = int(request.form.get('categoria_id', 0))
+        
+        # Manejar la imagen
+        imagen = None
+        if 'imagen' in request.files:
+            archivo = request.files['imagen']
+            if archivo and archivo.filename:
+                imagen = guardar_imagen(archivo)
+        
+        nuevo_plato = Plato(
+            nombre=nombre,
+            descripcion=descripcion,
+            precio_venta=precio_venta,
+            imagen=imagen,
+            categoria_id=categoria_id
+        )
+        
+        db.session.add(nuevo_plato)
+        db.session.flush()  # Para obtener el ID del plato
+        
+        # Procesar ingredientes
+        ingredientes_data = []
+        i = 0
+        while f'producto_id_{i}' in request.form:
+            producto_id = int(request.form.get(f'producto_id_{i}'))
+            cantidad = float(request.form.get(f'cantidad_{i}', 0))
+            
+            ingrediente = IngredientePlato(
+                plato_id=nuevo_plato.id,
+                producto_id=producto_id,
+                cantidad=cantidad
+            )
+            db.session.add(ingrediente)
+            ingredientes_data.append((producto_id, cantidad))
+            i += 1
+        
+        indexar_platos([nuevo_plato.id])
+        db.session.commit()
+        invalidar_menu()
+        invalidar_costos()
+        
+        flash('Plato creado correctamente.', 'success')
+        return redirect(url_for('admin.admin_platos'))
+    return render_template('admin/editar_plato.html', categorias=categorias, productos=productos)
+
+@admin.route('/admin/plato/editar/<int:plato_id>', methods=['GET', 'POST'])
+@login_required
+def editar_plato(plato_id):
+    plato = Plato.query.get_or_404(plato_id)
+    categorias = Categoria.query.filter_by(activa=True).all()
+    productos = Producto.query.filter_by(activo=True).all()
+    
+    if request.method == 'POST':
+        plato.nombre = request.form.get('nombre')
+        plato.descripcion = request.form.get('descripcion')
+        plato.precio_venta = float(request.form.get('precio_venta', 0))
+        plato.categoria_id = int(request.form.get('categoria_id', 0))
+        plato.activo = 'activo' in request.form
+        
+        # Manejar la imagen
+        if 'imagen' in request.files:
+            archivo = request.files['imagen']
+            if archivo and archivo.filename:
+                # La imagen anterior la borra gc-uploads si ya nadie la usa
+                plato.imagen = guardar_imagen(archivo)
+        
+        # Eliminar ingredientes existentes
+        IngredientePlato.query.filter_by(plato_id=plato_id).delete()
+        
+        # Procesar nuevos ingredientes
+        i = 0
+        while f'producto_id_{i}' in request.form:
+            producto_id = int(request.form.get(f'producto_id_{i}'))
+            cantidad = float(request.form.get(f'cantidad_{i}', 0))
+            
+            ingrediente = IngredientePlato(
+                plato_id=plato_id,
+                producto_id=producto_id,
+                cantidad=cantidad
+            )
+            db.session.add(ingrediente)
+            i += 1
+        
+        # Con un ingrediente en cero el plato sigue agotado aunque se marque
+        # activo; evaluar_existencias lo reactiva cuando se reponga
+        db.session.flush()
+        sin_stock = db.session.query(IngredientePlato.id).join(
+            Producto, Producto.id == IngredientePlato.producto_id
+        ).filter(IngredientePlato.plato_id == plato_id, Producto.existencia <= 0).first() is not None
+        if sin_stock and (plato.activo or plato.agotado):
+            if plato.activo:
+                flash('El plato queda agotado hasta que se repongan sus ingredientes.', 'warning')
+            plato.activo = False
+            plato.agotado = True
+        else:
+            plato.agotado = False
+        
+        indexar_platos([plato_id])
+        db.session.commit()
+        invalidar_menu()
+        invalidar_costos()
+        
+        flash('Plato actualizado correctamente.', 'success')
+        return redirect(url_for('admin.admin_platos'))
+    return render_template('admin/editar_plato.html', plato=plato, categorias=categorias, productos=productos)
+
+@admin.route('/admin/plato/eliminar/<int:plato_id>', methods=['POST'])
+@login_required
+def eliminar_plato(plato_id):
+    plato = Plato.query.get_or_404(plato_id)
+    
+    # Verificar si el plato está en algún pedido
+    items_pedido = ItemPedido.query.filter_by(plato_id=plato_id).count()
+    if items_pedido > 0:
+        flash('No se puede eliminar el plato porque está incluido en uno o más pedidos.', 'error')
+        return redirect(url_for('admin.admin_platos'))
+    
+    # Eliminar ingredientes (la imagen la borra gc-uploads si ya nadie la usa)
+    IngredientePlato.query.filter_by(plato_id=plato_id).delete()
+    
+    db.session.delete(plato)
+    indexar_platos([plato_id])
+    db.session.commit()
+    invalidar_menu()
+    invalidar_costos()
+    
+    flash('Plato eliminado correctamente.', 'success')
+    return redirect(url_for('admin.admin_platos'))
+
+@admin.route('/admin/calcular_costo_plato', methods=['POST'])
+@login_required
+def calcular_costo_plato():
+    data = request.get_json(silent=True) or {}
+    ingredientes = []
+    for ingrediente in data.get('ingredientes', []):
+        try:
+            ingredientes.append((int(ingrediente.get('producto_id')),
+                                 float(ingrediente.get('cantidad', 0))))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    costo, incompleto = obtener_costos().costo_receta(ingredientes)
+    return jsonify({'costo': round(costo, 2), 'incompleto': incompleto})
+
+# Gestión de categorías
+@admin.route('/admin/categorias')
+@login_required
+def admin_categorias():
+    pagina = paginar(con_perfil(Categoria.query, 'categorias'), [Categoria.id])
+    return render_template('admin/categorias.html', categorias=pagina.filas, pagina=pagina)
+
+@admin.route('/admin/categoria/nueva', methods=['GET', 'POST'])
+@login_required
+def nueva_categoria():
+    if request.method == 'POST':
+        nombre = request.form.get('nombre')
+        descripcion = request.form.get('descripcion')
+        
+        nueva_categoria = Categoria(
+            nombre=nombre,
+            descripcion=descripcion,
+            activa='activa' in request.form
+        )
+        
+        db.session.add(nueva_categoria)
+        db.session.commit()
+        invalidar_menu()
+        
+        flash('Categoría creada correctamente.', 'success')
+        return redirect(url_for('admin.admin_categorias'))
+    return render_template('admin/editar_categoria.html')
+
+@admin.route('/admin/categoria/editar/<int:categoria_id>', methods=['GET', 'POST'])
+@login_required
+def editar_categoria(categoria_id):
+    categoria = Categoria.query.get_or_404(categoria_id)
+    
+    if request.method == 'POST':
+        categoria.nombre = request.form.get('nombre')
+        categoria.descripcion = request.form.get('descripcion')
+        categoria.activa = 'activa' in request.form
+        
+        indexar_platos([plato.id for plato in categoria.platos])
+        db.session.commit()
+        invalidar_menu()
+        
+        flash('Categoría actualizada correctamente.', 'success')
+        return redirect(url_for('admin.admin_categorias'))
+    return render_template('admin/editar_categoria.html', categoria=categoria)
+
+@admin.route('/admin/categoria/eliminar/<int:categoria_id>', methods=['POST'])
+@login_required
+def eliminar_categoria(categoria_id):
+    categoria = Categoria.query.get_or_404(categoria_id)
+    
+    # Verificar si la categoría tiene platos asociados
+    if categoria.platos:
+        flash('No se puede eliminar la categoría porque tiene platos asociados.', 'error')
+        return redirect(url_for('admin.admin_categorias'))
+    
+    db.session.delete(categoria)
+    db.session.commit()
+    invalidar_menu()
+    
+    flash('Categoría eliminada correctamente.', 'success')
+    return redirect(url_for('admin.admin_categorias'))
+
+# Gestión de extras
+@admin.route('/admin/extras')
+@login_required
+def admin_extras():
+    pagina = paginar(Extra.query, [Extra.id])
+    return render_template('admin/extras.html', extras=pagina.filas, pagina=pagina)
+
+@admin.route('/admin/extra/nuevo', methods=['GET', 'POST'])
+@login_required
+def nuevo_extra():
+    if request.method == 'POST':
+        nombre = request.form.get('nombre')
+        precio = float(request.form.get('precio', 0))
+        
+        nuevo_extra = Extra(
+            nombre=nombre,
+            precio=precio,
+            activo='activo' in request.form
+        )
+        
+        db.session.add(nuevo_extra)
+        db.session.commit()
+        invalidar_menu()
+        
+        flash('Extra creado correctamente.', 'success')
+        return redirect(url_for('admin.admin_extras'))
+    return render_template('admin/editar_extra.html')
+
+@admin.route('/admin/extra/editar/<int:extra_id>', methods=['GET', 'POST'])
+@login_required
+def editar_extra(extra_id):
+    extra = Extra.query.get_or_404(extra_id)
+    
+    if request.method == 'POST':
+        extra.nombre = request.form.get('nombre')
+        extra.precio = float(request.form.get('precio', 0))
+        extra.activo = 'activo' in request.form
+        
+        db.session.commit()
+        invalidar_menu()
+        
+        flash('Extra actualizado correctamente.', 'success')
+        return redirect(url_for('admin.admin_extras'))
+    return render_template('admin/editar_extra.html', extra=extra)
+
+@admin.route('/admin/extra/eliminar/<int:extra_id>', methods=['POST'])
+@login_required
+def eliminar_extra(extra_id):
+    extra = Extra.query.get_or_404(extra_id)
+    
+    # Verificar si el extra está en algún pedido
+    extras_pedido = ExtraPedido.query.filter_by(extra_id=extra_id).count()
+    if extras_pedido > 0:
+        flash('No se puede eliminar el extra porque está incluido en uno o más pedidos.', 'error')
+        return redirect(url_for('admin.admin_extras'))
+    
+    db.session.delete(extra)
+    db.session.commit()
+    invalidar_menu()
+    
+    flash('Extra eliminado correctamente.', 'success')
+    return redirect(url_for('admin.admin_extras'))
+
+# Configuración del restaurante
+@admin.route('/admin/configuracion', methods=['GET', 'POST'])
+@admin_required
+def admin_configuracion():
+    if request.method == 'POST':
+        config = asegurar_configuracion()
+        config.nombre_restaurante = request.form.get('nombre_restaurante')
+        config.telefono = request.form.get('telefono')
+        config.direccion = request.form.get('direccion')
+        config.impuesto = float(request.form.get('impuesto', 0))
+        config.max_extras = int(request.form.get('max_extras', 5))
+        
+        # Manejar el logo
+        if 'logo' in request.files:
+            archivo = request.files['logo']
+            if archivo and archivo.filename:
+                config.logo = guardar_imagen(archivo)
+        
+        db.session.commit()
+        invalidar_configuracion()
+        invalidar_menu()
+        flash('Configuración actualizada correctamente.', 'success')
+        return redirect(url_for('admin.admin_configuracion'))
+    return render_template('admin/configuracion.html')
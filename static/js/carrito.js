@@ -0,0 +1,28 @@
+// Sincronizacion del carrito de localStorage con el carrito del servidor
+let sincronizacionCarrito;
+
+function sincronizarCarrito(alTerminar) {
+    clearTimeout(sincronizacionCarrito);
+    sincronizacionCarrito = setTimeout(() => {
+        const enviado = localStorage.getItem('carrito');
+        // Sin carrito local (otra pestana, almacenamiento borrado) se recupera el del servidor
+        const peticion = enviado === null
+            ? fetch('/api/carrito')
+            : fetch('/api/carrito/sincronizar', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ carrito: JSON.parse(enviado) })
+            });
+
+        peticion
+            .then(response => response.json())
+            .then(data => {
+                // Si el cliente cambio el carrito mientras tanto, gana el cambio local
+                if (!data.items || localStorage.getItem('carrito') !== enviado) return;
+                if (enviado === null && data.items.length === 0) return;
+                localStorage.setItem('carrito', JSON.stringify(data.items));
+                if (alTerminar) alTerminar(data.items);
+            })
+            .catch(error => console.error('Error:', error));
+    }, 300);
+}
@@ -0,0 +1,93 @@
+"""Base SQLite temporal sembrada, compartida por las pruebas"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, RAIZ)
+import app as yekka  # noqa: E402
+
+
+def sembrar():
+    """Productos, platos con receta, extras y algunos pedidos"""
+    db = yekka.db
+    productos = [yekka.Producto(nombre=f'Producto {i}', precio_compra=10 + i, unidad_medida='kg',
+                                 cantidad=1)
+                 for i in range(6)]
+    db.session.add_all(productos)
+    db.session.flush()
+    categorias = [yekka.Categoria(nombre=nombre, descripcion='')
+                  for nombre in ('Entradas', 'Fondos', 'Postres')]
+    extra = yekka.Extra(nombre='Queso extra', precio=1.5)
+    db.session.add_all(categorias + [extra])
+    db.session.flush()
+    platos = []
+    for i in range(12):
+        plato = yekka.Plato(nombre=f'Plato {i}', descripcion='Con queso', precio_venta=5 + i,
+                            categoria_id=categorias[i % len(categorias)].id)
+        db.session.add(plato)
+        db.session.flush()
+        platos.append(plato)
+        for producto in productos[:3]:
+            db.session.add(yekka.IngredientePlato(plato_id=plato.id, producto_id=producto.id, cantidad=0.1))
+    for n in range(5):
+        pedido = yekka.Pedido(codigo=f'T{n:05d}', cliente_telefono='5550000', cliente_direccion='Calle 1',
+                              total=10)
+        db.session.add(pedido)
+        db.session.flush()
+        for plato in platos[:4]:
+            db.session.add(yekka.ItemPedido(pedido_id=pedido.id, plato_id=plato.id, cantidad=1,
+                                            precio_unitario=plato.precio_venta, personalizaciones='{}'))
+        db.session.add(yekka.ExtraPedido(pedido_id=pedido.id, extra_id=extra.id, cantidad=1,
+                                         precio_unitario=extra.precio))
+    db.session.commit()
+    yekka.indexar_platos()
+    db.session.commit()
+    yekka.invalidar_menu()
+
+
+@pytest.fixture(scope='session')
+def aplicacion(tmp_path_factory):
+    """App sobre una base temporal; los archivos de versión y las subidas tampoco tocan el checkout"""
+    carpeta = tmp_path_factory.mktemp('yekka')
+    aplicacion = yekka.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(carpeta / 'test.db'),
+        'VERSIONES_DIR': str(carpeta / 'versiones'),
+        'UPLOAD_FOLDER': str(carpeta / 'uploads'),
+    }, panel_admin=True, calentar=False)
+    with aplicacion.app_context():
+        yekka.inicializar_base_datos()
+        sembrar()
+    yekka.calentar_caches(aplicacion)
+    return aplicacion
+
+
+@pytest.fixture
+def cliente(aplicacion):
+    """Cliente de pruebas con la sesión del usuario admin"""
+    cliente = aplicacion.test_client()
+    with aplicacion.app_context():
+        admin = yekka.Usuario.query.filter_by(username='admin').first()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = admin.id
+        sesion['username'] = admin.username
+        sesion['rol'] = admin.rol
+    return cliente
+
+
+@pytest.fixture
+def pedir(aplicacion, cliente):
+    """Función que hace un pedido por /realizar_pedido y devuelve el Pedido guardado"""
+    def pedir(carrito, extras=()):
+        respuesta = cliente.post('/realizar_pedido', json={
+            'form': {'nombre': 'Prueba', 'telefono': '5551234', 'direccion': 'Calle 2'},
+            'carrito': carrito,
+            'extras': list(extras),
+        })
+        assert respuesta.status_code == 200, respuesta.data[:200]
+        codigo = respuesta.get_data(as_text=True).rsplit('/', 1)[-1]
+        with aplicacion.app_context():
+            return yekka.Pedido.query.filter_by(codigo=codigo).one()
+    return pedir
@@ -0,0 +1,36 @@
+"""Tablero de cocina de /admin/api/cocina"""
+import app as yekka
+
+
+def platos_por_categoria(cliente):
+    tablero = cliente.get('/admin/api/cocina').get_json()
+    return {plato['plato_id']: categoria['id']
+            for categoria in tablero['categorias'] for plato in categoria['platos']}
+
+
+def test_plato_desactivado_sigue_en_su_estacion(aplicacion, cliente):
+    with aplicacion.app_context():
+        plato = yekka.db.session.get(yekka.Plato, 5)
+        categoria_id = plato.categoria_id
+    platos_por_categoria(cliente)  # arma el tablero antes del pedido
+
+    respuesta = cliente.post('/realizar_pedido', json={
+        'form': {'nombre': 'Cocina', 'telefono': '5554321', 'direccion': 'Calle 3'},
+        'carrito': [{'plato_id': 5, 'cantidad': 1}],
+    })
+    assert respuesta.status_code == 200
+    assert platos_por_categoria(cliente)[5] == categoria_id
+
+    with aplicacion.app_context():
+        yekka.db.session.get(yekka.Plato, 5).activo = False
+        yekka.db.session.commit()
+    with aplicacion.test_request_context():
+        yekka.invalidar_menu()
+    try:
+        assert platos_por_categoria(cliente)[5] == categoria_id
+    finally:
+        with aplicacion.app_context():
+            yekka.db.session.get(yekka.Plato, 5).activo = True
+            yekka.db.session.commit()
+        with aplicacion.test_request_context():
+            yekka.invalidar_menu()
@@ -0,0 +1,54 @@
+"""/admin/eventos servido por un servidor HTTP real
+
+El cliente de pruebas de Flask recorre la respuesta con el contexto de la app
+todavía abierto; werkzeug y gunicorn no, así que solo un servidor real muestra
+si el stream depende de ese contexto.
+"""
+import http.client
+import threading
+from urllib.parse import urlencode
+
+import pytest
+from werkzeug.serving import make_server
+
+import app as yekka
+
+
+@pytest.fixture
+def servidor(aplicacion):
+    """App nueva, como la de un worker recién creado, y el puerto del servidor werkzeug que la sirve"""
+    nueva = yekka.create_app(aplicacion.config, calentar=False)
+    servidor = make_server('127.0.0.1', 0, nueva, threaded=True)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield nueva, servidor.server_port
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_eventos_primera_conexion(servidor):
+    aplicacion, puerto = servidor
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=10)
+    conexion.request('POST', '/login', urlencode({'username': 'admin', 'password': 'admin123'}),
+                     {'Content-Type': 'application/x-www-form-urlencoded'})
+    respuesta = conexion.getresponse()
+    respuesta.read()
+    cookie = respuesta.getheader('Set-Cookie').split(';')[0]
+    conexion.close()
+
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=10)
+    conexion.request('GET', '/admin/eventos', headers={'Cookie': cookie})
+    respuesta = conexion.getresponse()
+    try:
+        assert respuesta.status == 200
+        assert respuesta.readline() == b'retry: 3000\n'
+        assert respuesta.readline() == b'\n'
+        with aplicacion.app_context():
+            yekka.registrar_evento('estado_cambiado', 1, {'estado': 'confirmado'})
+            yekka.db.session.commit()
+            yekka.notificar_eventos()
+        lineas = [respuesta.readline() for _ in range(3)]
+    finally:
+        conexion.close()
+    assert lineas[0].startswith(b'id: ')
+    assert lineas[1] == b'event: estado_cambiado\n'
@@ -0,0 +1,85 @@
+"""Existencias de productos y platos agotados"""
+import pytest
+
+import app as yekka
+
+
+@pytest.fixture
+def plato_con_producto(aplicacion):
+    """Crea un producto y un plato que lo usa; devuelve una función (existencia, **plato) -> (producto_id, plato_id)"""
+    creados = []
+
+    def crear(existencia, **plato):
+        with aplicacion.app_context():
+            producto = yekka.Producto(nombre=f'Insumo {len(creados)}', precio_compra=2, unidad_medida='kg',
+                                      cantidad=1, existencia=existencia)
+            nuevo = yekka.Plato(nombre=f'Plato de insumo {len(creados)}', precio_venta=9, categoria_id=1,
+                                **plato)
+            yekka.db.session.add_all([producto, nuevo])
+            yekka.db.session.flush()
+            yekka.db.session.add(yekka.IngredientePlato(plato_id=nuevo.id, producto_id=producto.id,
+                                                        cantidad=0.2))
+            yekka.db.session.commit()
+            yekka.invalidar_menu()
+            creados.append((producto.id, nuevo.id))
+        return creados[-1]
+    return crear
+
+
+def estado_plato(aplicacion, plato_id):
+    with aplicacion.app_context():
+        plato = yekka.db.session.get(yekka.Plato, plato_id)
+        return plato.activo, plato.agotado
+
+
+def existencia(aplicacion, producto_id):
+    with aplicacion.app_context():
+        return yekka.db.session.get(yekka.Producto, producto_id).existencia
+
+
+def editar_producto(cliente, producto_id, existencia):
+    return cliente.post(f'/admin/producto/editar/{producto_id}', data={
+        'nombre': f'Insumo editado {producto_id}', 'precio_compra': '2', 'unidad_medida': 'kg',
+        'cantidad': '1', 'existencia': existencia, 'stock_minimo': '0', 'activo': 'on'})
+
+
+def test_producto_que_empieza_a_controlarse_en_cero_agota_sus_platos(aplicacion, cliente, plato_con_producto):
+    producto_id, plato_id = plato_con_producto(None)
+    assert estado_plato(aplicacion, plato_id) == (True, False)
+
+    assert editar_producto(cliente, producto_id, '0').status_code == 302
+    assert estado_plato(aplicacion, plato_id) == (False, True)
+
+
+def test_editar_plato_agotado_no_lo_vuelve_a_ofrecer(aplicacion, cliente, plato_con_producto):
+    producto_id, plato_id = plato_con_producto(0, activo=False, agotado=True)
+
+    respuesta = cliente.post(f'/admin/plato/editar/{plato_id}', data={
+        'nombre': 'Plato con precio nuevo', 'descripcion': '', 'precio_venta': '11', 'categoria_id': '1',
+        'activo': 'on', 'producto_id_0': str(producto_id), 'cantidad_0': '0.2'})
+    assert respuesta.status_code == 302
+    assert estado_plato(aplicacion, plato_id) == (False, True)
+
+    # Al reponer el ingrediente vuelve solo
+    editar_producto(cliente, producto_id, '5')
+    assert estado_plato(aplicacion, plato_id) == (True, False)
+
+
+def test_repetir_un_estado_no_descuenta_dos_veces(aplicacion, cliente, pedir, plato_con_producto):
+    producto_id, plato_id = plato_con_producto(10)
+    pedido = pedir([{'plato_id': plato_id, 'cantidad': 2}])
+    # Con INVENTARIO_ESTADO=confirmado un pedido pendiente todavía no consume
+    assert existencia(aplicacion, producto_id) == 10
+
+    def cambiar(estado):
+        respuesta = cliente.post(f'/admin/cambiar_estado_pedido/{pedido.id}', data={'estado': estado})
+        assert respuesta.status_code == 302
+        return existencia(aplicacion, producto_id)
+
+    # La receta lleva 0.2 g por plato y el producto se mide en kg
+    descontada = pytest.approx(10 - yekka.convert_units(2 * 0.2, 'g', 'kg'))
+    assert cambiar('confirmado') == descontada
+    assert cambiar('confirmado') == descontada
+    assert cambiar('preparando') == descontada
+    assert cambiar('cancelado') == pytest.approx(10)
+    assert cambiar('cancelado') == pytest.approx(10)
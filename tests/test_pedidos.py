@@ -0,0 +1,47 @@
+"""Cotización del carrito contra el pedido que se guarda"""
+import pytest
+from sqlalchemy import func
+
+import app as yekka
+
+CARRITO = [{'plato_id': 1, 'cantidad': 2}, {'plato_id': 2, 'cantidad': 1}]
+
+
+@pytest.fixture
+def impuesto(aplicacion):
+    """Impuesto del 10 % en la configuración mientras dura la prueba"""
+    with aplicacion.app_context():
+        config = yekka.asegurar_configuracion()
+        anterior, config.impuesto = config.impuesto, 10
+        yekka.db.session.commit()
+        yekka.invalidar_configuracion()
+    yield 10
+    with aplicacion.app_context():
+        yekka.asegurar_configuracion().impuesto = anterior
+        yekka.db.session.commit()
+        yekka.invalidar_configuracion()
+
+
+def test_total_del_pedido_igual_a_la_cotizacion(aplicacion, cliente, pedir, impuesto):
+    with aplicacion.app_context():
+        extra_id = yekka.Extra.query.filter_by(nombre='Queso extra').one().id
+
+    cotizacion = cliente.post('/api/cotizar', json={'carrito': CARRITO, 'extras': [extra_id]}).get_json()
+    # Plato 1 a 5, plato 2 a 6 y el extra a 1.5
+    assert cotizacion['subtotal'] == pytest.approx(2 * 5 + 6 + 1.5)
+    assert cotizacion['impuesto'] == pytest.approx(cotizacion['subtotal'] * impuesto / 100)
+    assert cotizacion['total'] == pytest.approx(cotizacion['subtotal'] + cotizacion['impuesto'])
+
+    pedido = pedir(CARRITO, [extra_id])
+    assert pedido.total == pytest.approx(cotizacion['total'])
+    with aplicacion.app_context():
+        lineas = yekka.db.session.query(func.sum(yekka.ItemPedido.cantidad * yekka.ItemPedido.precio_unitario)
+                                        ).filter_by(pedido_id=pedido.id).scalar()
+        extras = yekka.db.session.query(func.sum(yekka.ExtraPedido.cantidad * yekka.ExtraPedido.precio_unitario)
+                                        ).filter_by(pedido_id=pedido.id).scalar()
+    assert lineas + extras == pytest.approx(cotizacion['subtotal'])
+
+
+def test_cotizacion_rechaza_extras_desconocidos(cliente):
+    respuesta = cliente.post('/api/cotizar', json={'carrito': CARRITO, 'extras': [9999]})
+    assert respuesta.status_code == 400
@@ -0,0 +1,68 @@
+"""Sentencias SQL por endpoint contra PRESUPUESTO_SQL
+
+Uso:
+    python -m pytest -q tests
+
+Con el restaurante chico que siembra conftest.py, llama cada endpoint
+de PRESUPUESTO_SQL con el cliente de pruebas y falla si alguno ejecuta más
+sentencias que su presupuesto. Cada endpoint se mide dos veces: justo después
+de invalidar menú, configuración y costos (la petición que reconstruye las
+cachés) y otra vez con las cachés llenas, que es la que paga el cliente
+habitual. El presupuesto vale para las dos.
+"""
+import pytest
+
+import app as yekka
+
+CARRITO = [{'plato_id': 1, 'cantidad': 2}, {'plato_id': 2, 'cantidad': 1}]
+
+
+@pytest.fixture(scope='module')
+def contador(aplicacion):
+    """Lista de un elemento con las sentencias ejecutadas desde la última puesta a cero"""
+    total = [0]
+
+    def contar(*args):
+        total[0] += 1
+    with aplicacion.app_context():
+        yekka.event.listen(yekka.db.engine, 'before_cursor_execute', contar)
+    yield total
+    with aplicacion.app_context():
+        yekka.event.remove(yekka.db.engine, 'before_cursor_execute', contar)
+
+
+def peticion(endpoint):
+    """(método, URL, cuerpo JSON) con que se llama el endpoint"""
+    argumentos = {
+        'publico.confirmacion_pedido': {'codigo': 'T00000'},
+        'admin.ver_pedido': {'pedido_id': 1},
+    }.get(endpoint, {})
+    if endpoint == 'publico.api_platos':
+        argumentos = {'categoria_id': 1}
+    elif endpoint == 'publico.api_buscar_platos':
+        argumentos = {'q': 'plato'}
+    if endpoint == 'publico.api_cotizar':
+        return 'POST', yekka.url_for(endpoint), {'carrito': CARRITO}
+    if endpoint == 'publico.realizar_pedido':
+        return 'POST', yekka.url_for(endpoint), {
+            'form': {'nombre': 'Prueba', 'telefono': '5551234', 'direccion': 'Calle 2'},
+            'carrito': CARRITO,
+        }
+    return 'GET', yekka.url_for(endpoint, **argumentos), None
+
+
+@pytest.mark.parametrize('endpoint', sorted(yekka.PRESUPUESTO_SQL))
+def test_presupuesto_sql(aplicacion, contador, cliente, endpoint):
+    with aplicacion.test_request_context():
+        metodo, url, cuerpo = peticion(endpoint)
+        yekka.invalidar_menu()
+        yekka.invalidar_configuracion()
+        yekka.invalidar_costos()
+
+    limite = yekka.PRESUPUESTO_SQL[endpoint]
+    for cache in ('vacía', 'llena'):
+        contador[0] = 0
+        respuesta = cliente.open(url, method=metodo, json=cuerpo)
+        assert respuesta.status_code == 200, respuesta.data[:200]
+        assert contador[0] <= limite, \
+            f'{endpoint} con la caché {cache} ejecutó {contador[0]} sentencias (presupuesto: {limite})'
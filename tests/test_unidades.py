@@ -0,0 +1,41 @@
+"""Matriz de factores de conversión de unidades"""
+import pytest
+
+import app as yekka
+
+
+@pytest.mark.parametrize('unidad, otra, factor', [
+    ('kg', 'g', 1000),
+    ('g', 'kg', 0.001),
+    ('lt', 'ml', 1000),
+    ('ml', 'lt', 0.001),
+    ('gal', 'ml', 3785.411784),
+    ('lb', 'g', 453.59237),
+    ('docena', 'un', 12),
+])
+def test_factores(unidad, otra, factor):
+    assert yekka.convert_units(1, unidad, otra) == pytest.approx(factor)
+
+
+@pytest.mark.parametrize('unidad, otra', [('kg', 'g'), ('lt', 'ml'), ('oz', 'kg'), ('gal', 'ml')])
+def test_ida_y_vuelta(unidad, otra):
+    cantidad = 2.375
+    ida = yekka.convert_units(cantidad, unidad, otra)
+    assert yekka.convert_units(ida, otra, unidad) == pytest.approx(cantidad)
+
+
+def test_magnitudes_distintas():
+    with pytest.raises(yekka.UnidadIncompatible):
+        yekka.convert_units(1, 'kg', 'ml')
+    with pytest.raises(yekka.UnidadDesconocida):
+        yekka.convert_units(1, 'kg', 'taza')
+
+
+def test_convertir_lote():
+    assert yekka.convertir_lote([1.5, 250, 2], ['kg', 'ml', 'lt']) == pytest.approx([1500, 250, 2000])
+    assert yekka.convertir_lote([1, 2], 'kg', 'g') == pytest.approx([1000, 2000])
+    assert yekka.convertir_lote([1, 1, None], ['kg', 'taza', 'g'], 'g', estricto=False) == [1000, None, None]
+    with pytest.raises(yekka.UnidadIncompatible):
+        yekka.convertir_lote([1, 1], ['kg', 'lt'], 'g')
+    with pytest.raises(ValueError):
+        yekka.convertir_lote([1, 2], ['kg'], 'g')
@@ -0,0 +1,53 @@
+"""Resúmenes de ventas por hora, día y plato"""
+from datetime import datetime
+
+import pytest
+
+import app as yekka
+
+
+def leer_resumenes():
+    """Filas de cada resumen, ordenadas y con los importes redondeados"""
+    return {
+        modelo.__tablename__: sorted(
+            tuple(round(valor, 6) if isinstance(valor, float) else valor for valor in fila)
+            for fila in yekka.db.session.execute(modelo.__table__.select()))
+        for modelo in yekka.RESUMENES_VENTAS
+    }
+
+
+def test_dos_pedidos_en_la_misma_hora(aplicacion):
+    hora = datetime(2020, 3, 4, 13)
+    with aplicacion.app_context():
+        yekka.acumular_ventas(yekka.variacion_ventas(
+            hora.replace(minute=5), 20.0, 1.5, [(1, 2, 10.0), (2, 1, 8.5)]))
+        yekka.acumular_ventas(yekka.variacion_ventas(
+            hora.replace(minute=40), 12.0, 0.0, [(1, 1, 5.0), (3, 1, 7.0)]))
+        yekka.db.session.commit()
+
+        por_hora = yekka.db.session.get(yekka.VentaHora, hora)
+        por_dia = yekka.db.session.get(yekka.VentaDia, hora.date())
+        platos = {fila.plato_id: (fila.unidades, fila.ingresos)
+                  for fila in yekka.VentaPlatoDia.query.filter_by(fecha=hora.date())}
+    for fila in (por_hora, por_dia):
+        assert (fila.pedidos, fila.unidades, fila.cancelados) == (2, 5, 0)
+        assert fila.ingresos == pytest.approx(32.0)
+        assert fila.ingresos_extras == pytest.approx(1.5)
+    assert platos == {1: (3, pytest.approx(15.0)), 2: (1, pytest.approx(8.5)), 3: (1, pytest.approx(7.0))}
+
+
+def test_resumenes_incrementales_igual_a_recalcular(aplicacion, cliente, pedir):
+    with aplicacion.app_context():
+        yekka.recalcular_ventas()
+        yekka.db.session.commit()
+
+    pedir([{'plato_id': 1, 'cantidad': 2}, {'plato_id': 3, 'cantidad': 1}])
+    cancelado = pedir([{'plato_id': 1, 'cantidad': 1}])
+    respuesta = cliente.post(f'/admin/cambiar_estado_pedido/{cancelado.id}', data={'estado': 'cancelado'})
+    assert respuesta.status_code == 302
+
+    with aplicacion.app_context():
+        incrementales = leer_resumenes()
+        yekka.recalcular_ventas()
+        yekka.db.session.commit()
+        assert leer_resumenes() == incrementales